@@ -1,55 +1,383 @@
+import asyncio
+import hmac
 import os
+import threading
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, BackgroundTasks
-from slack_bolt import App as SlackApp
-from slack_bolt.adapter.fastapi import SlackRequestHandler
-from app.routes import slack_commands
-from app.services.reminder_service import ReminderService
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from app.utils.export import MEDIA_TYPES, export_ledger, parse_time_bound
+from app.utils.import_parser import ImportRowError
+from app.utils.metrics import REGISTRY
 
 # Load environment variables
 load_dotenv()
 
-# Create FastAPI app
-app = FastAPI(title="SplitBot", description="A Slack bot for splitting expenses")
+# Persist expenses and queued Slack messages to SQLite when a database path is configured
+db_path = os.environ.get("SPLITBOT_DB_PATH")
+
+# With SPLITBOT_SHARED_STATE, several worker processes share the database: writes are
+# committed at once, reads pick up the other workers' changes, and a lease elects the
+# one worker that sends automatic reminders
+shared_state = db_path is not None and os.environ.get("SPLITBOT_SHARED_STATE", "").lower() in ("1", "true", "yes")
+
+# Import expenses in bulk through /import and export the ledger through /export,
+# each enabled by setting its bearer token
+import_token = os.environ.get("SPLITBOT_IMPORT_TOKEN")
+export_token = os.environ.get("SPLITBOT_EXPORT_TOKEN")
 
-# Initialize Slack app
-slack_app = SlackApp(
-    token=os.environ.get("SLACK_BOT_TOKEN"),
-    signing_secret=os.environ.get("SLACK_SIGNING_SECRET")
+# The clients and services below are built by build_components on first use, so importing
+# this module does not import the Slack SDK and Bolt, or open the database. Each one can
+# also be read as an attribute of the module, e.g. main.delivery, which builds them.
+COMPONENTS = (
+    "slack_client", "slack_auth", "request_keys", "idempotency_guard", "slack_app", "handler",
+    "slack_commands", "archive", "leader_lease", "outbox", "settlement_store", "delivery",
+    "slack_directory", "outbox_worker", "reminder_service", "importer"
 )
+_components: Optional[SimpleNamespace] = None
+_build_lock = threading.Lock()
+
+# The lifespan's startup task, see start_up
+_startup: Optional[asyncio.Task] = None
+
+
+def build_components() -> SimpleNamespace:
+    """Import the Slack stack and build the clients and services from the environment.
+    
+    Nothing here calls Slack: the bot token is verified by SlackAuth the
+    first time it is needed.
+    """
+    from slack_bolt.async_app import AsyncApp
+    from slack_bolt.adapter.fastapi.async_handler import AsyncSlackRequestHandler
+    from slack_sdk.web.async_client import AsyncWebClient
+    from app.routes import slack_commands
+    from app.services.expense_service import DEBTS, ExpenseService
+    from app.services.idempotency import IdempotencyGuard
+    from app.services.import_service import ExpenseImporter
+    from app.services.outbox_worker import OUTBOX_QUEUED, OutboxWorker
+    from app.services.reminder_service import ReminderService
+    from app.services.slack_auth import SlackAuth
+    from app.services.slack_delivery import SlackDelivery
+    from app.services.slack_directory import SlackDirectory
+    from app.storage.archive import ARCHIVED_EXPENSES, ExpenseArchive
+    from app.storage.lease import SQLiteLease
+    from app.storage.outbox import InMemoryOutbox, SQLiteOutbox
+    from app.storage.request_keys import SQLiteRequestKeys
+    from app.storage.settlements import InMemorySettlementStore, SQLiteSettlementStore
+    from app.storage.sqlite import SQLiteExpenseStore
+    
+    # Share one async Web API client, pointed at SLACK_API_URL when set (e.g. a test server)
+    slack_client = AsyncWebClient(
+        token=os.environ.get("SLACK_BOT_TOKEN"),
+        base_url=os.environ.get("SLACK_API_URL", AsyncWebClient.BASE_URL)
+    )
+    
+    # Verify the token once, in the background at startup or on the first request
+    slack_auth = SlackAuth(slack_client)
+    
+    # Acknowledge Slack's retries and repeated button clicks without handling them again,
+    # remembering requests for SPLITBOT_IDEMPOTENCY_TTL seconds; with shared state they are
+    # remembered in the database, as a retry is usually sent to another worker
+    request_keys = SQLiteRequestKeys(db_path) if shared_state else None
+    idempotency_guard = IdempotencyGuard(
+        ttl=float(os.environ.get("SPLITBOT_IDEMPOTENCY_TTL", "600")),
+        shared_keys=request_keys
+    )
+    
+    # Initialize Slack app; duplicates are dropped right after the request signature is
+    # verified, and requests are authorized from the cached auth.test result
+    slack_app = AsyncApp(
+        client=slack_client,
+        signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),
+        before_authorize=idempotency_guard,
+        authorize=slack_auth
+    )
+    
+    # Move settled expenses out of the database into an append-only archive file, by default
+    # next to it, SPLITBOT_ARCHIVE_AFTER seconds after they are settled. An empty
+    # SPLITBOT_ARCHIVE_PATH keeps them in the database.
+    archive = None
+    leader_lease = None
+    if db_path:
+        archive_path = os.environ.get("SPLITBOT_ARCHIVE_PATH", f"{db_path}.archive")
+        archive = ExpenseArchive(archive_path) if archive_path else None
+        slack_commands.expense_service = ExpenseService(
+            SQLiteExpenseStore(db_path, max_batch_size=1 if shared_state else 500),
+            shared=shared_state,
+            archive=archive,
+            archive_after=float(os.environ.get("SPLITBOT_ARCHIVE_AFTER", "60"))
+        )
+        if shared_state:
+            leader_lease = SQLiteLease(db_path, "reminder_scheduler")
+    outbox = SQLiteOutbox(db_path) if db_path else InMemoryOutbox()
+    # Settlement plans live in the database too, so any worker can handle a settle button
+    settlement_store = SQLiteSettlementStore(db_path) if db_path else InMemorySettlementStore()
+    
+    # Merge the summary refreshes and payer notifications of payments made within this many seconds
+    coalesce_window = float(os.environ.get("SPLITBOT_COALESCE_WINDOW", "2"))
+    slack_commands.summary_refreshes.window = coalesce_window
+    slack_commands.payment_notifications.window = coalesce_window
+    
+    # Send outgoing messages concurrently, capped at SLACK_MAX_CONCURRENCY calls in flight
+    delivery = SlackDelivery(
+        slack_client,
+        max_concurrency=int(os.environ.get("SLACK_MAX_CONCURRENCY", "10"))
+    )
+    
+    # Cache DM channel IDs and user profiles, shared by the handlers and the reminder service
+    slack_directory = SlackDirectory(
+        delivery,
+        channel_ttl=float(os.environ.get("SPLITBOT_DM_CHANNEL_TTL", str(24 * 3600))),
+        profile_ttl=float(os.environ.get("SPLITBOT_USER_PROFILE_TTL", "3600"))
+    )
+    
+    # Deliver queued messages with SPLITBOT_OUTBOX_WORKERS workers
+    outbox_worker = OutboxWorker(
+        outbox,
+        delivery,
+        workers=int(os.environ.get("SPLITBOT_OUTBOX_WORKERS", "4"))
+    )
+    
+    # Initialize the reminder service
+    reminder_service = ReminderService(
+        slack_app, delivery=delivery, outbox_worker=outbox_worker, leader_lease=leader_lease,
+        directory=slack_directory
+    )
+    
+    importer = ExpenseImporter(slack_commands.expense_service, outbox_worker, slack_directory)
+    
+    # Report the store and outbox sizes, read when /metrics is scraped
+    DEBTS.labels("open").set_function(lambda: slack_commands.expense_service.count_debts()["open"])
+    DEBTS.labels("settled").set_function(lambda: slack_commands.expense_service.count_debts()["settled"])
+    OUTBOX_QUEUED.set_function(outbox.count)
+    if archive is not None:
+        ARCHIVED_EXPENSES.set_function(lambda: len(archive))
+    
+    # Register the slash command handlers
+    slack_commands.register_commands(slack_app, reminder_service, outbox_worker, slack_directory, settlement_store)
+    
+    # Create an AsyncSlackRequestHandler for handling Slack events via FastAPI
+    handler = AsyncSlackRequestHandler(slack_app)
+    
+    return SimpleNamespace(
+        slack_client=slack_client,
+        slack_auth=slack_auth,
+        request_keys=request_keys,
+        idempotency_guard=idempotency_guard,
+        slack_app=slack_app,
+        handler=handler,
+        slack_commands=slack_commands,
+        archive=archive,
+        leader_lease=leader_lease,
+        outbox=outbox,
+        settlement_store=settlement_store,
+        delivery=delivery,
+        slack_directory=slack_directory,
+        outbox_worker=outbox_worker,
+        reminder_service=reminder_service,
+        importer=importer
+    )
+
+
+def components() -> SimpleNamespace:
+    """The clients and services, built on first use."""
+    global _components
+    if _components is None:
+        with _build_lock:
+            if _components is None:
+                _components = build_components()
+    return _components
+
+
+async def get_components() -> SimpleNamespace:
+    """The clients and services, built on first use in a thread so the event loop keeps serving."""
+    if _components is not None:
+        return _components
+    return await asyncio.to_thread(components)
+
 
-# Initialize the reminder service
-reminder_service = ReminderService(slack_app)
+def __getattr__(name: str):
+    """Build the components the first time one of them is read, e.g. main.delivery."""
+    if name in COMPONENTS:
+        return getattr(components(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Register the slash command handlers
-slack_commands.register_commands(slack_app, reminder_service)
 
-# Create a SlackRequestHandler for handling Slack events via FastAPI
-handler = SlackRequestHandler(slack_app)
+async def archive_settled_expenses():
+    """Archive the settled expenses left in the database, a batch at a time, then
+    every SPLITBOT_ARCHIVE_AFTER seconds those settled since."""
+    expense_service = components().slack_commands.expense_service
+    while expense_service.compact(limit=500):
+        await asyncio.sleep(0)
+    
+    while True:
+        await asyncio.sleep(max(expense_service.archive_after, 1))
+        expense_service.archive_settled()
+
+
+async def start_up() -> SimpleNamespace:
+    """Build the components and start the background work, returning its tasks.
+    
+    The Slack token is verified in the background, retried until it succeeds.
+    """
+    c = await get_components()
+    c.outbox_worker.start()
+    return SimpleNamespace(
+        scheduler=asyncio.create_task(c.reminder_service.start_reminder_scheduler()),
+        archiver=asyncio.create_task(archive_settled_expenses()) if c.archive is not None else None,
+        verification=asyncio.create_task(c.slack_auth.verify_in_background())
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start up in the background, and run the outbox workers and the reminder
+    scheduler while the application is up.
+    
+    The server accepts requests at once: /health answers straight away, and
+    /ready once the components are built and the Slack token is verified.
+    Slack requests arriving before then wait for the components.
+    
+    On shutdown, background deliveries finish and buffered writes are flushed
+    to the stores. Messages the outbox workers have not sent yet are sent on
+    the next start.
+    """
+    global _startup
+    startup = _startup = asyncio.create_task(start_up())
+    
+    yield
+    
+    tasks = await startup
+    c = components()
+    tasks.verification.cancel()
+    if tasks.archiver is not None:
+        tasks.archiver.cancel()
+    c.reminder_service.stop_reminder_scheduler()
+    try:
+        await asyncio.wait_for(tasks.scheduler, timeout=10)
+    except asyncio.TimeoutError:
+        pass  # wait_for cancels a scheduler stuck in a reminder cycle
+    
+    await c.slack_commands.summary_refreshes.drain()
+    await c.slack_commands.payment_notifications.drain()
+    await c.outbox_worker.stop()
+    await c.slack_directory.drain()
+    c.outbox.close()
+    c.settlement_store.close()
+    if c.request_keys is not None:
+        c.request_keys.close()
+    if c.leader_lease is not None:
+        c.leader_lease.close()
+    c.slack_commands.expense_service.close()
+    if _startup is startup:
+        _startup = None
+
+
+# Create FastAPI app
+app = FastAPI(title="SplitBot", description="A Slack bot for splitting expenses", lifespan=lifespan)
 
 @app.post("/slack/events")
-async def slack_events(request: Request, background_tasks: BackgroundTasks):
+async def slack_events(request: Request):
     """Endpoint for handling Slack events and interactions."""
-    return await handler.handle(request)
+    return await (await get_components()).handler.handle(request)
 
 @app.post("/slack/commands")
-async def slack_commands_endpoint(request: Request, background_tasks: BackgroundTasks):
+async def slack_commands_endpoint(request: Request):
     """Endpoint for handling Slack slash commands."""
-    # Process the command in the background so we can respond quickly to Slack
-    return await handler.handle(request)
+    return await (await get_components()).handler.handle(request)
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Liveness probe, answered as soon as the server accepts requests."""
     return {"status": "ok"}
 
-# Start background task for sending reminders
-@app.on_event("startup")
-async def startup_event():
-    """Start the reminder service on application startup."""
-    background_tasks = BackgroundTasks()
-    background_tasks.add_task(reminder_service.start_reminder_scheduler)
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the services are running and the Slack token is verified, 503 until then."""
+    started = _startup is not None and _startup.done() and not _startup.cancelled() and _startup.exception() is None
+    checks = {
+        "services": started,
+        "slack_auth": started and components().slack_auth.verified
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "starting", "checks": checks},
+        status_code=200 if ready else 503
+    )
+
+def check_bearer_token(request: Request, token: str, feature: str) -> None:
+    """Reject a request unless it carries the bearer token that enables a feature."""
+    if not token:
+        raise HTTPException(status_code=404, detail=f"{feature} is disabled")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail=f"Invalid {feature.lower()} token")
+
+@app.post("/import")
+async def import_expenses(
+    request: Request,
+    format: str = "csv",
+    channel_id: str = "",
+    created_by: str = "",
+    notify: bool = False
+):
+    """Import expenses from a CSV or JSONL request body, streamed a batch at a time.
+    
+    Requires an "Authorization: Bearer <SPLITBOT_IMPORT_TOKEN>" header.
+    channel_id and created_by apply to rows without them; with notify, each
+    debtor gets one DM listing their unpaid debts.
+    """
+    check_bearer_token(request, import_token, "Import")
+    importer = (await get_components()).importer
+    
+    try:
+        return await importer.import_stream(
+            request.stream(), format, {"channel_id": channel_id, "created_by": created_by}, notify
+        )
+    except (ImportRowError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/export")
+async def export_expenses(
+    request: Request,
+    format: str = "ndjson",
+    channel_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    paid: Optional[bool] = None
+):
+    """Stream the debt ledger as NDJSON or CSV, one row per debt, oldest expense first.
+    
+    Requires an "Authorization: Bearer <SPLITBOT_EXPORT_TOKEN>" header.
+    Filters by channel, by the date range the expenses were created in
+    (since inclusive, until inclusive of a whole day given as a date) and
+    by whether the debts are paid.
+    """
+    check_bearer_token(request, export_token, "Export")
+    expense_service = (await get_components()).slack_commands.expense_service
+    
+    try:
+        rows = expense_service.iter_debt_rows(
+            channel_id, parse_time_bound(since), parse_time_bound(until, end=True), paid
+        )
+        chunks = export_ledger(rows, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="splitbot-ledger.{format}"'
+    })
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics endpoint in the Prometheus text format.
+    
+    Each worker process keeps its own metrics.
+    """
+    await get_components()  # Every metric is registered once its module is imported
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,29 +1,111 @@
 from datetime import datetime
-from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, GetCoreSchemaHandler
+from pydantic_core import core_schema
 
+from app.utils.money import compute_debts
 
-class Payment(BaseModel):
-    """Represents a payment made by a payer for the expense."""
+
+class PaymentModel(BaseModel):
+    """Validated form of a Payment, used when payments cross the API boundary."""
     user_id: str
-    amount: float
+    amount: int
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
-class Debt(BaseModel):
-    """Represents a debt owed by a debtor to a payer."""
+class DebtModel(BaseModel):
+    """Validated form of a Debt, used when debts cross the API boundary."""
     debtor_id: str
     payer_id: str
-    amount: float
+    amount: int
     is_paid: bool = False
     paid_timestamp: Optional[datetime] = None
     last_reminder_sent: Optional[datetime] = None
 
 
+class _Slotted:
+    """Base for the compact records that hold an expense's payments and debts.
+    
+    Expenses can carry hundreds of these, so they are plain slotted objects
+    rather than pydantic models. Inside an Expense they validate through
+    their pydantic model and serialize back to plain dictionaries.
+    """
+    __slots__ = ()
+    _model = None
+    
+    def __eq__(self, other: Any) -> bool:
+        """Compare records field by field."""
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+    
+    def __repr__(self) -> str:
+        """Show the record's fields."""
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the record to a dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    @classmethod
+    def from_model(cls, model: BaseModel):
+        """Build a record from its validated pydantic model."""
+        return cls(**dict(model))
+    
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler):
+        """Accept instances as they are, and validate anything else through the pydantic model."""
+        from_model = core_schema.no_info_after_validator_function(
+            cls.from_model, handler.generate_schema(cls._model)
+        )
+        return core_schema.union_schema(
+            [core_schema.is_instance_schema(cls), from_model],
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda record: cls._model.model_validate(record, from_attributes=True)
+            )
+        )
+
+
+class Payment(_Slotted):
+    """Represents a payment made by a payer for the expense, in minor units."""
+    __slots__ = ("user_id", "amount", "timestamp")
+    _model = PaymentModel
+    
+    def __init__(self, user_id: str, amount: int, timestamp: Optional[datetime] = None):
+        """Initialize the payment, timestamped now by default."""
+        self.user_id = user_id
+        self.amount = amount
+        self.timestamp = timestamp or datetime.now()
+
+
+class Debt(_Slotted):
+    """Represents a debt owed by a debtor to a payer, in minor units."""
+    __slots__ = ("debtor_id", "payer_id", "amount", "is_paid", "paid_timestamp", "last_reminder_sent")
+    _model = DebtModel
+    
+    def __init__(
+        self,
+        debtor_id: str,
+        payer_id: str,
+        amount: int,
+        is_paid: bool = False,
+        paid_timestamp: Optional[datetime] = None,
+        last_reminder_sent: Optional[datetime] = None
+    ):
+        """Initialize the debt."""
+        self.debtor_id = debtor_id
+        self.payer_id = payer_id
+        self.amount = amount
+        self.is_paid = is_paid
+        self.paid_timestamp = paid_timestamp
+        self.last_reminder_sent = last_reminder_sent
+
+
 class Expense(BaseModel):
-    """Represents an expense to be split among attendees."""
+    """Represents an expense to be split among attendees, with amounts in minor units."""
     id: str
-    total_amount: float
+    total_amount: int
     payers: List[Payment]
     attendees: List[str]
     description: str
@@ -31,55 +113,22 @@ class Expense(BaseModel):
     created_by: str
     created_at: datetime = Field(default_factory=datetime.now)
     debts: List[Debt] = []
+    summary_ts: Optional[str] = None  # ts of the summary message posted in channel_id
     
     def calculate_shares(self) -> None:
-        """Calculate how much each attendee owes."""
-        if not self.attendees:
-            return
-            
-        # Calculate the share per person
-        share_per_person = self.total_amount / len(self.attendees)
-        
-        # Create a dictionary to track how much each payer has paid
-        payer_amounts = {}
-        for payment in self.payers:
-            payer_amounts[payment.user_id] = payment.amount
-            
-        # Create a dictionary to track how much each person owes
-        debts = []
+        """Calculate how much each attendee owes.
         
-        # For each attendee who is not a payer, or who paid less than their share
-        for attendee in self.attendees:
-            # How much did this attendee pay (if anything)
-            paid_amount = payer_amounts.get(attendee, 0)
-            
-            # How much does this attendee still owe
-            remaining_to_pay = share_per_person - paid_amount
-            
-            # If they still owe money, create a debt for each payer who paid more than their share
-            if remaining_to_pay > 0:
-                for payer_id, payer_amount in payer_amounts.items():
-                    payer_excess = payer_amount - share_per_person
-                    
-                    # If this payer paid more than their share, they are owed money
-                    if payer_excess > 0 and payer_id != attendee:
-                        # Calculate how much this attendee should pay this payer
-                        amount_to_pay = min(remaining_to_pay, payer_excess)
-                        
-                        # Create a debt object
-                        debt = Debt(
-                            debtor_id=attendee,
-                            payer_id=payer_id,
-                            amount=amount_to_pay,
-                            is_paid=False
-                        )
-                        debts.append(debt)
-                        
-                        # Update the remaining amount to pay
-                        remaining_to_pay -= amount_to_pay
-                        
-                        # If nothing left to pay, break out of the loop
-                        if remaining_to_pay <= 0:
-                            break
+        The total is split into equal integer shares, with any remainder going
+        to the first attendees, and the attendees who owe are matched to the
+        payers who are owed so each payer receives exactly their excess.
+        """
+        debts = compute_debts(
+            self.total_amount,
+            [(payment.user_id, payment.amount) for payment in self.payers],
+            self.attendees
+        )
         
-        self.debts = debts 
\ No newline at end of file
+        self.debts = [
+            Debt(debtor_id=debtor_id, payer_id=payer_id, amount=amount, is_paid=False)
+            for debtor_id, payer_id, amount in debts
+        ]
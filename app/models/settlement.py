@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+from pydantic import BaseModel, Field
+
+
+class Transfer(BaseModel):
+    """Represents a netted payment from a debtor to a payer, in minor units."""
+    debtor_id: str
+    payer_id: str
+    amount: int
+    is_paid: bool = False
+    paid_timestamp: Optional[datetime] = None
+
+
+class Settlement(BaseModel):
+    """Represents a plan that settles all pending debts of a channel with few transfers."""
+    id: str
+    channel_id: str
+    created_by: str
+    created_at: datetime = Field(default_factory=datetime.now)
+    transfers: List[Transfer] = []
+    debt_keys: List[Tuple[str, str, str]] = []  # (expense_id, debtor_id, payer_id) of the netted debts
+    is_replaced: bool = False
+    
+    def settled_debtors(self) -> Set[str]:
+        """Get the debtors whose underlying debts this plan has settled.
+        
+        A debtor who makes payments in the plan is settled once all of them
+        are paid. One who only receives payments, or none, had their debts
+        netted against what they are owed, and is settled once every payment
+        to them is paid.
+        """
+        paying = {transfer.debtor_id for transfer in self.transfers}
+        unsettled = set()
+        for transfer in self.transfers:
+            if not transfer.is_paid:
+                unsettled.add(transfer.debtor_id)
+                if transfer.payer_id not in paying:
+                    unsettled.add(transfer.payer_id)
+        return {key[1] for key in self.debt_keys} - unsettled
+    
+    @property
+    def is_settled(self) -> bool:
+        """Whether every transfer in the plan has been paid."""
+        return all(transfer.is_paid for transfer in self.transfers)
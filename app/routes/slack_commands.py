@@ -1,36 +1,223 @@
 import logging
-from typing import Dict
+import re
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List
 
-from slack_bolt import App as SlackApp
-from slack_bolt.adapter.fastapi import SlackRequestHandler
+from slack_bolt.async_app import AsyncApp
 
+from app.models.expense import Expense
+from app.services.coalescer import Coalescer
 from app.services.expense_service import ExpenseService
+from app.services.outbox_worker import OutboxWorker
 from app.services.reminder_service import ReminderService
+from app.services.settlement_service import SettlementService
+from app.services.slack_directory import SlackDirectory
+from app.storage.outbox import OutboxMessage
+from app.storage.settlements import SettlementStore
+from app.utils.cache import TTLCache
 from app.utils.command_parser import parse_split_command
 from app.utils.message_builder import (
+    build_debt_paid_block,
     build_expense_summary_message,
     build_payment_confirmation_message,
     build_payment_notification_message,
-    build_manual_reminder_summary
+    build_payments_notification_message,
+    build_manual_reminder_summary,
+    build_settlement_message,
+    build_status_message,
+    format_currency,
+    update_expense_summary_message
 )
+from app.utils.metrics import Histogram
 
 logger = logging.getLogger(__name__)
 
+COMMAND_DURATION = Histogram(
+    "splitbot_command_duration_seconds",
+    "Time to handle a slash command or button click after acknowledging it",
+    ["command"]
+)
+
+# Slack accepts at most five uses of a response_url: /split remind reports its
+# progress this many times and keeps one use for the final summary
+PROGRESS_UPDATES = 3
+
 # Create a global instance of the expense service
 expense_service = ExpenseService()
 
+# Blocks of the summaries rendered lately, by expense ID, so a payment only re-renders its payer's section
+summary_blocks = TTLCache(24 * 3600, name="summary_blocks")
+
+# IDs of the expenses whose first summary is queued in the outbox but not posted yet
+pending_summaries = TTLCache(3600, name="pending_summaries")
+
+
+def post_expense_summary(outbox_worker: OutboxWorker, expense: Expense) -> None:
+    """Queue the first summary of a new expense in its channel, keeping its ts so payments can update it."""
+    blocks = build_expense_summary_message(expense)
+    summary_blocks.set(expense.id, blocks)
+    pending_summaries.set(expense.id, True)
+    outbox_worker.enqueue("chat_postMessage", {
+        "channel": expense.channel_id,
+        "text": f"{expense.description} - Total: {format_currency(expense.total_amount)}",
+        "blocks": blocks
+    }, callback="summary_sent", context={"expense_id": expense.id})
+
+
+def refresh_expense_summary(outbox_worker: OutboxWorker, expense: Expense, payer_ids: Iterable[str]) -> None:
+    """Queue an update of an expense's channel summary after payments to the given payers.
+    
+    The summary message is edited in place. While the first summary is
+    still queued, only the rendered blocks are updated, and summary_sent
+    edits the summary once it is posted. A new summary is posted when there
+    is no message to edit, or by summary_sent when the edit fails, e.g.
+    because the message was deleted.
+    """
+    blocks = update_expense_summary_message(expense, payer_ids, summary_blocks.get(expense.id))
+    summary_blocks.set(expense.id, blocks)
+    if not expense.summary_ts and expense.id in pending_summaries:
+        return
+    
+    context = {"expense_id": expense.id}
+    if expense.summary_ts:
+        outbox_worker.enqueue("chat_update", {
+            "channel": expense.channel_id,
+            "ts": expense.summary_ts,
+            "text": f"{expense.description} - Total: {format_currency(expense.total_amount)}",
+            "blocks": blocks
+        }, callback="summary_sent", context=context)
+    else:
+        outbox_worker.enqueue("chat_postMessage", {
+            "channel": expense.channel_id,
+            "text": f"Payment update for {expense.description}",
+            "blocks": blocks
+        }, callback="summary_sent", context=context)
+
+
+def report_in_steps(report: Callable[[Dict[str, int]], Awaitable[None]], steps: int = PROGRESS_UPDATES):
+    """Wrap a progress callback so it runs at most steps times, as each 1/(steps + 1) of the work is done."""
+    reported = 0
+    
+    async def report_progress(progress: Dict[str, int]) -> None:
+        nonlocal reported
+        done = progress["sent"] + progress["failed"]
+        if reported >= steps or done * (steps + 1) < progress["total"] * (reported + 1):
+            return
+        reported = done * (steps + 1) // progress["total"]
+        await report(progress)
+    
+    return report_progress
+
+
+async def summary_sent(outbox_worker: OutboxWorker, message: OutboxMessage, response) -> None:
+    """Outbox callback keeping the ts of an expense's summary message."""
+    expense_id = message.context["expense_id"]
+    first_summary = message.method == "chat_postMessage" and expense_id in pending_summaries
+    if first_summary:
+        pending_summaries.discard(expense_id)
+    
+    if response is not None:
+        expense_service.set_summary_ts(expense_id, response["ts"])
+        # Payments made while the first summary was queued only updated the rendered blocks
+        blocks = summary_blocks.get(expense_id)
+        if first_summary and blocks is not None and blocks != message.kwargs["blocks"]:
+            outbox_worker.enqueue("chat_update", {
+                **message.kwargs, "ts": response["ts"], "blocks": blocks
+            }, callback="summary_sent", context=message.context)
+    elif message.method == "chat_update":
+        # The summary could not be edited, so post it again and keep the new ts
+        logger.warning(f"Could not update summary of expense {expense_id}, posting a new one")
+        kwargs = {key: value for key, value in message.kwargs.items() if key != "ts"}
+        outbox_worker.enqueue("chat_postMessage", kwargs, callback="summary_sent", context=message.context)
+
+
+async def flush_summary_refreshes(expense_id: str, items: List) -> None:
+    """Refresh an expense's summary once for every payment made within the window."""
+    outbox_worker = items[-1][0]
+    expense = expense_service.get_expense(expense_id)
+    if expense:
+        refresh_expense_summary(outbox_worker, expense, {payer_id for _, payer_id in items})
+
 
-def register_commands(slack_app: SlackApp, reminder_service: ReminderService):
-    """Register all Slack commands with the app."""
+async def flush_payment_notifications(payer_id: str, items: List) -> None:
+    """Tell a payer about every payment they received within the window in one message."""
+    outbox_worker, directory = items[-1][:2]
+    paid_debts = [paid_debt for _, _, paid_debt in items]
+    channel = await directory.dm_channel(payer_id)
     
-    # Set the expense service on the reminder service
+    if len(paid_debts) == 1:
+        expense, debt = paid_debts[0]["expense"], paid_debts[0]["debt"]
+        outbox_worker.enqueue("chat_postMessage", {
+            "channel": channel,
+            "text": f"<@{debt.debtor_id}> has paid {format_currency(debt.amount)} for {expense.description}",
+            "blocks": build_payment_notification_message(expense, debt)
+        })
+        return
+    
+    total = sum(paid_debt["debt"].amount for paid_debt in paid_debts)
+    outbox_worker.enqueue("chat_postMessage", {
+        "channel": channel,
+        "text": f"{len(paid_debts)} payments adding up to {format_currency(total)} have been confirmed",
+        "blocks": build_payments_notification_message(paid_debts)
+    })
+
+
+def build_status_response(user_id: str, page: int = 0) -> Dict:
+    """Build the ephemeral response showing one page of a user's ledger."""
+    try:
+        blocks = build_status_message(expense_service.get_user_ledger(user_id), page)
+    except Exception as e:
+        logger.error(f"Error building status for {user_id}: {e}")
+        return {"text": f"Error: {str(e)}"}
+    
+    return {"text": "Your balance", "blocks": blocks}
+
+
+# Payments confirmed in quick succession share one summary refresh per expense
+# and one notification per payer; main sets the window from SPLITBOT_COALESCE_WINDOW
+summary_refreshes = Coalescer(flush_summary_refreshes, name="summary_refreshes")
+payment_notifications = Coalescer(flush_payment_notifications, name="payment_notifications")
+
+
+def register_commands(
+    slack_app: AsyncApp,
+    reminder_service: ReminderService,
+    outbox_worker: OutboxWorker,
+    directory: SlackDirectory = None,
+    settlement_store: SettlementStore = None
+):
+    """Register all Slack commands with the app.
+    
+    Handlers queue their Slack calls in the outbox worker's outbox instead
+    of calling Slack while Slack waits for the request to be acknowledged.
+    DMs go to the channels cached by the directory, which the reminder
+    service shares. Settlement plans are kept in settlement_store, in
+    memory by default.
+    """
+    outbox_worker.register_callback("summary_sent", summary_sent)
+    directory = directory or SlackDirectory(outbox_worker.delivery)
+    
+    # Set the expense and directory services on the reminder service
     reminder_service.expense_service = expense_service
+    reminder_service.directory = directory
+    settlement_service = SettlementService(expense_service, settlement_store)
     
     # Handle the /split command
     @slack_app.command("/split")
-    async def handle_split_command(ack, command, client):
+    async def handle_split_command(ack, command, respond):
         """Handle the /split command."""
+        started = time.perf_counter()
+        subcommand = command["text"].strip().lower()
+        
+        # Answer /split status in the acknowledgement itself, without another Slack call
+        if subcommand == "status":
+            await ack(**build_status_response(command["user_id"]))
+            COMMAND_DURATION.labels("status").observe(time.perf_counter() - started)
+            return
+        
         await ack()  # Acknowledge the command
+        if subcommand not in ("remind", "settle"):
+            subcommand = "split"
         
         try:
             # Parse the command text
@@ -38,15 +225,42 @@ def register_commands(slack_app: SlackApp, reminder_service: ReminderService):
             
             # If the command is just "remind", send reminders
             if command_text.strip().lower() == "remind":
-                result = await reminder_service.send_manual_reminders()
+                # Keep replacing a single ephemeral message with the progress so far
+                async def report_progress(progress):
+                    await respond(
+                        text=f"Sent {progress['sent']} of {progress['total']} reminders",
+                        blocks=build_manual_reminder_summary(progress),
+                        replace_original=True
+                    )
+                
+                result = await reminder_service.send_manual_reminders(on_progress=report_in_steps(report_progress))
                 blocks = build_manual_reminder_summary(result)
                 
-                await client.chat_postEphemeral(
-                    channel=command["channel_id"],
-                    user=command["user_id"],
+                await respond(
                     text=f"Sent {result['sent']} reminders",
-                    blocks=blocks
+                    blocks=blocks,
+                    replace_original=True
+                )
+                return
+            
+            # If the command is just "settle", net the channel's pending debts
+            if command_text.strip().lower() == "settle":
+                settlement = settlement_service.create_settlement(
+                    command["channel_id"], command["user_id"]
                 )
+                if settlement is None:
+                    outbox_worker.enqueue("chat_postEphemeral", {
+                        "channel": command["channel_id"],
+                        "user": command["user_id"],
+                        "text": "Nothing to settle: there are no pending debts in this channel"
+                    })
+                    return
+                
+                outbox_worker.enqueue("chat_postMessage", {
+                    "channel": command["channel_id"],
+                    "text": f"Settle up: {len(settlement.transfers)} payments settle {len(settlement.debt_keys)} debts",
+                    "blocks": build_settlement_message(settlement)
+                })
                 return
             
             # Parse the split command
@@ -54,27 +268,27 @@ def register_commands(slack_app: SlackApp, reminder_service: ReminderService):
             
             # Validate the required fields
             if not parsed["total_amount"]:
-                await client.chat_postEphemeral(
-                    channel=command["channel_id"],
-                    user=command["user_id"],
-                    text="Error: Total amount is required"
-                )
+                outbox_worker.enqueue("chat_postEphemeral", {
+                    "channel": command["channel_id"],
+                    "user": command["user_id"],
+                    "text": "Error: Total amount is required"
+                })
                 return
             
             if not parsed["payers"]:
-                await client.chat_postEphemeral(
-                    channel=command["channel_id"],
-                    user=command["user_id"],
-                    text="Error: At least one payer is required"
-                )
+                outbox_worker.enqueue("chat_postEphemeral", {
+                    "channel": command["channel_id"],
+                    "user": command["user_id"],
+                    "text": "Error: At least one payer is required"
+                })
                 return
             
             if not parsed["attendees"]:
-                await client.chat_postEphemeral(
-                    channel=command["channel_id"],
-                    user=command["user_id"],
-                    text="Error: At least one attendee is required"
-                )
+                outbox_worker.enqueue("chat_postEphemeral", {
+                    "channel": command["channel_id"],
+                    "user": command["user_id"],
+                    "text": "Error: At least one attendee is required"
+                })
                 return
             
             # Create the expense
@@ -87,41 +301,42 @@ def register_commands(slack_app: SlackApp, reminder_service: ReminderService):
                 created_by=command["user_id"]
             )
             
-            # Build the expense summary message
-            blocks = build_expense_summary_message(expense)
-            
             # Post the expense summary in the channel
-            await client.chat_postMessage(
-                channel=command["channel_id"],
-                text=f"{parsed['description']} - Total: ${parsed['total_amount']:,.0f}",
-                blocks=blocks
-            )
+            post_expense_summary(outbox_worker, expense)
             
             # Send payment confirmation messages to each debtor
             for debt in expense.debts:
                 if not debt.is_paid:
-                    confirmation_blocks = build_payment_confirmation_message(expense, debt)
-                    
-                    await client.chat_postMessage(
-                        channel=debt.debtor_id,
-                        text=f"You owe ${debt.amount:,.0f} for {expense.description}",
-                        blocks=confirmation_blocks
-                    )
+                    outbox_worker.enqueue("chat_postMessage", {
+                        "channel": directory.channel_for(debt.debtor_id),
+                        "text": f"You owe {format_currency(debt.amount)} for {expense.description}",
+                        "blocks": build_payment_confirmation_message(expense, debt)
+                    })
+            
+            # Open everyone's DM channel now, so reminders and payment notifications find them cached.
+            # Profiles are left out: nothing reads them yet, and users.info shares the DMs' rate limits.
+            directory.prefetch_in_background(
+                [payment.user_id for payment in expense.payers] + expense.attendees, profiles=False
+            )
             
         except Exception as e:
             logger.error(f"Error handling split command: {e}")
             
-            await client.chat_postEphemeral(
-                channel=command["channel_id"],
-                user=command["user_id"],
-                text=f"Error: {str(e)}"
-            )
+            outbox_worker.enqueue("chat_postEphemeral", {
+                "channel": command["channel_id"],
+                "user": command["user_id"],
+                "text": f"Error: {str(e)}"
+            })
+        
+        finally:
+            COMMAND_DURATION.labels(subcommand).observe(time.perf_counter() - started)
     
     # Handle the payment confirmation button click
     @slack_app.action("confirm_payment")
-    async def handle_confirm_payment(ack, body, client):
+    async def handle_confirm_payment(ack, body):
         """Handle the payment confirmation button click."""
         await ack()  # Acknowledge the action
+        started = time.perf_counter()
         
         try:
             # Parse the value
@@ -138,60 +353,116 @@ def register_commands(slack_app: SlackApp, reminder_service: ReminderService):
                     return
                 
                 # Find the debt
-                debt = next(
-                    (d for d in expense.debts 
-                     if d.debtor_id == debtor_id and d.payer_id == payer_id and d.is_paid),
-                    None
-                )
+                debt = expense_service.get_debt(expense_id, debtor_id, payer_id)
                 
                 if not debt:
                     return
                 
-                # Update the message
-                await client.chat_update(
-                    channel=body["channel"]["id"],
-                    ts=body["message"]["ts"],
-                    text=f"You have paid ${debt.amount:,.0f} for {expense.description}",
-                    blocks=[
-                        {
-                            "type": "section",
-                            "text": {
-                                "type": "mrkdwn",
-                                "text": f"You have paid <@{debt.payer_id}> ${debt.amount:,.0f} for *{expense.description}*. Thank you! :tada:"
-                            }
-                        }
+                # Update the message, keeping the other debts of a consolidated reminder
+                action = body["actions"][0]
+                if action.get("block_id", "").startswith("debt|"):
+                    blocks = [
+                        build_debt_paid_block(expense, debt)
+                        if block.get("block_id") == action["block_id"] else block
+                        for block in body["message"]["blocks"]
                     ]
-                )
-                
-                # Notify the payer
-                notification_blocks = build_payment_notification_message(expense, debt)
+                else:
+                    blocks = [build_debt_paid_block(expense, debt)]
                 
-                await client.chat_postMessage(
-                    channel=payer_id,
-                    text=f"<@{debt.debtor_id}> has paid ${debt.amount:,.0f} for {expense.description}",
-                    blocks=notification_blocks
-                )
+                outbox_worker.enqueue("chat_update", {
+                    "channel": body["channel"]["id"],
+                    "ts": body["message"]["ts"],
+                    "text": f"You have paid {format_currency(debt.amount)} for {expense.description}",
+                    "blocks": blocks
+                })
                 
-                # Post an updated summary in the original channel
-                blocks = build_expense_summary_message(expense)
-                
-                # Instead of updating the original message, post a new one
-                # This is because the original message might be too old
-                await client.chat_postMessage(
-                    channel=expense.channel_id,
-                    text=f"Payment update for {expense.description}",
-                    blocks=blocks
-                )
+                # Notify the payer and update the summary, merging bursts of payments
+                payment_notifications.submit(payer_id, (outbox_worker, directory, {"expense": expense, "debt": debt}))
+                summary_refreshes.submit(expense_id, (outbox_worker, payer_id))
         
         except Exception as e:
             logger.error(f"Error handling payment confirmation: {e}")
             
             # Respond with an error message
             try:
-                await client.chat_postEphemeral(
-                    channel=body["channel"]["id"],
-                    user=body["user"]["id"],
-                    text=f"Error confirming payment: {str(e)}"
-                )
+                outbox_worker.enqueue("chat_postEphemeral", {
+                    "channel": body["channel"]["id"],
+                    "user": body["user"]["id"],
+                    "text": f"Error confirming payment: {str(e)}"
+                })
             except:
-                pass  # Ignore errors here 
\ No newline at end of file
+                pass  # Ignore errors here
+        
+        finally:
+            COMMAND_DURATION.labels("confirm_payment").observe(time.perf_counter() - started)
+    
+    # Handle the page buttons of /split status
+    @slack_app.action(re.compile("^status_(previous|next)_page$"))
+    async def handle_status_page(ack, body, respond):
+        """Replace a /split status response with another page of the ledger."""
+        await ack()  # Acknowledge the action
+        started = time.perf_counter()
+        
+        try:
+            page = int(body["actions"][0]["value"])
+            await respond(replace_original=True, **build_status_response(body["user"]["id"], page))
+        except Exception as e:
+            logger.error(f"Error handling status page: {e}")
+        
+        finally:
+            COMMAND_DURATION.labels("status_page").observe(time.perf_counter() - started)
+    
+    # Handle the settlement transfer button click
+    @slack_app.action("settle_transfer")
+    async def handle_settle_transfer(ack, body):
+        """Handle a click on a settlement transfer's "Mark as paid" button."""
+        await ack()  # Acknowledge the action
+        started = time.perf_counter()
+        
+        try:
+            # Parse the value
+            settlement_id, transfer_index = body["actions"][0]["value"].split("|")
+            settlement = settlement_service.get_settlement(settlement_id)
+            if not settlement or settlement.is_replaced:
+                outbox_worker.enqueue("chat_postEphemeral", {
+                    "channel": body["channel"]["id"],
+                    "user": body["user"]["id"],
+                    "text": "This settlement has expired, run /split settle again"
+                })
+                return
+            
+            # Only the two people involved can confirm a transfer
+            transfer = settlement.transfers[int(transfer_index)]
+            if body["user"]["id"] not in (transfer.debtor_id, transfer.payer_id):
+                outbox_worker.enqueue("chat_postEphemeral", {
+                    "channel": body["channel"]["id"],
+                    "user": body["user"]["id"],
+                    "text": "Only the people in this payment can mark it as paid"
+                })
+                return
+            
+            settlement = settlement_service.mark_transfer_as_paid(settlement_id, int(transfer_index))
+            if settlement:
+                # Update the settlement message
+                outbox_worker.enqueue("chat_update", {
+                    "channel": body["channel"]["id"],
+                    "ts": body["message"]["ts"],
+                    "text": f"<@{transfer.debtor_id}> has paid <@{transfer.payer_id}>",
+                    "blocks": build_settlement_message(settlement)
+                })
+        
+        except Exception as e:
+            logger.error(f"Error handling settlement transfer: {e}")
+            
+            # Respond with an error message
+            try:
+                outbox_worker.enqueue("chat_postEphemeral", {
+                    "channel": body["channel"]["id"],
+                    "user": body["user"]["id"],
+                    "text": f"Error settling payment: {str(e)}"
+                })
+            except:
+                pass  # Ignore errors here
+        
+        finally:
+            COMMAND_DURATION.labels("settle_transfer").observe(time.perf_counter() - started)
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+COALESCER_CALLS_SAVED = Counter(
+    "splitbot_coalescer_calls_saved_total",
+    "Items merged into another item's flush instead of costing their own call",
+    ["coalescer"]
+)
+
+
+class Coalescer:
+    """Merge work submitted under the same key within a time window into one flush.
+
+    The first item submitted for a key opens a window of window seconds.
+    Every item submitted for that key before the window closes is handed to
+    a single call of flush(key, items), so a burst of payments to one
+    expense costs one summary refresh instead of one per payment.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[str, List[Any]], Awaitable[None]],
+        window: float = 2.0,
+        name: Optional[str] = None
+    ):
+        """Initialize the coalescer around the coroutine function that does the work.
+
+        A named coalescer reports its calls_saved in the metrics.
+        """
+        self.flush = flush
+        self.window = window
+        self.submitted = 0  # Items submitted
+        self.flushes = 0  # Calls to flush
+        self._pending: Dict[str, List[Any]] = {}
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()
+
+        if name:
+            COALESCER_CALLS_SAVED.labels(name).set_function(lambda: self.calls_saved)
+
+    @property
+    def calls_saved(self) -> int:
+        """Number of items that were merged into another item's flush."""
+        return self.submitted - self.flushes - sum(len(items) for items in self._pending.values())
+
+    def submit(self, key: str, item: Any) -> None:
+        """Queue an item for the next flush of its key."""
+        self.submitted += 1
+        self._pending.setdefault(key, []).append(item)
+
+        if key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: str) -> None:
+        """Wait for the window to close, then flush the key."""
+        await asyncio.sleep(self.window)
+        del self._timers[key]
+
+        task = asyncio.current_task()
+        self._running.add(task)
+        try:
+            await self._flush_key(key)
+        finally:
+            self._running.discard(task)
+
+    async def _flush_key(self, key: str) -> None:
+        """Flush every item queued for a key."""
+        items = self._pending.pop(key)
+        self.flushes += 1
+        if len(items) > 1:
+            logger.debug(f"Coalesced {len(items)} items for {key} into one call")
+
+        try:
+            await self.flush(key, items)
+        except Exception as e:
+            logger.error(f"Error flushing {len(items)} items for {key}: {e}")
+
+    async def drain(self) -> None:
+        """Flush every open window now and wait for flushes in progress."""
+        for key, timer in list(self._timers.items()):
+            timer.cancel()
+            del self._timers[key]
+            await self._flush_key(key)
+
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
@@ -1,39 +1,99 @@
+import heapq
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 from app.models.expense import Expense, Payment, Debt
+from app.storage.archive import ExpenseArchive
+from app.storage.base import ExpenseStore
+from app.storage.memory import InMemoryExpenseStore
+from app.utils.metrics import Gauge
+from app.utils.money import Amount, compute_debts_batch, format_amount, to_minor
+
+# A debt is uniquely identified by the expense it belongs to plus its debtor and payer
+DebtKey = Tuple[str, str, str]
+
+# Read from the store when metrics are collected, see ExpenseService.count_debts
+DEBTS = Gauge("splitbot_debts", "Debts in the store by state (open or settled)", ["state"])
+
+
+def _check_payments(total_minor: int, paid_minor: List[int]) -> None:
+    """Raise ValueError unless the payments add up to the total once rounded to minor units."""
+    if sum(paid_minor) != total_minor:
+        raise ValueError(
+            f"Sum of paid amounts ({format_amount(sum(paid_minor))}) does not equal "
+            f"total amount ({format_amount(total_minor)}) in whole cents"
+        )
 
 
 class ExpenseService:
     """Service to manage expense data."""
     
-    def __init__(self):
-        """Initialize the expense service with an in-memory database."""
-        self.expenses: Dict[str, Expense] = {}
+    def __init__(
+        self,
+        store: Optional[ExpenseStore] = None,
+        shared: bool = False,
+        archive: Optional[ExpenseArchive] = None,
+        archive_after: float = 0
+    ):
+        """Initialize the expense service, using an in-memory store by default.
+        
+        Nothing is read from the store up front: expenses are loaded the first
+        time they are looked up, and the pending debts the first time they are
+        listed.
+        
+        With shared, other processes write to the same store, so every read
+        first checks the store for the expenses they changed and reloads
+        those, see sync.
+        
+        With an archive, an expense is moved out of the store and the cache
+        into the archive archive_after seconds after its last debt is paid,
+        so both only hold open obligations. Archived expenses are still
+        found by get_expense and included in exports and counts.
+        """
+        self.store = store or InMemoryExpenseStore()
+        self.shared = shared
+        self.archive = archive
+        self.archive_after = archive_after
+        self._reset_cache()
+        
+        # IDs of the expenses settled in this process, in order, with when they were settled
+        self._settled: "OrderedDict[str, float]" = OrderedDict()
+        
+        # Objects notified when debts are created or paid, see add_listener
+        self._listeners: List = []
     
     def create_expense(
         self, 
-        total_amount: float, 
-        payers: List[Dict[str, float]], 
+        total_amount: Amount, 
+        payers: List[Dict[str, Amount]], 
         attendees: List[str], 
         description: str, 
         channel_id: str,
         created_by: str
     ) -> Expense:
-        """Create a new expense."""
+        """Create a new expense from amounts in major units (e.g. dollars).
+        
+        Raises ValueError if the payments do not add up to the total once
+        rounded to minor units.
+        """
         expense_id = str(uuid.uuid4())
         
         # Convert the payers list to Payment objects
         payment_objects = [
-            Payment(user_id=payer["user_id"], amount=payer["amount"])
+            Payment(user_id=payer["user_id"], amount=to_minor(payer["amount"]))
             for payer in payers
         ]
         
+        total_minor = to_minor(total_amount)
+        _check_payments(total_minor, [payment.amount for payment in payment_objects])
+        
         # Create the expense
         expense = Expense(
             id=expense_id,
-            total_amount=total_amount,
+            total_amount=total_minor,
             payers=payment_objects,
             attendees=attendees,
             description=description,
@@ -46,56 +106,472 @@ class ExpenseService:
         expense.calculate_shares()
         
         # Save the expense
-        self.expenses[expense_id] = expense
+        self._add_expense(expense)
         
         return expense
     
+    def create_expenses(self, expenses: List[Dict]) -> List[Expense]:
+        """Create many expenses at once, computing all of their shares in one batch.
+        
+        Each item holds the keyword arguments of create_expense, and may add
+        a created_at datetime (e.g. when backfilling) and settled=True to
+        record every debt as already paid. The batch is saved to the store
+        in one commit. Expenses are only kept in memory if they have unpaid
+        debts and the pending debts are already loaded; the others are loaded
+        from the store if they are looked up.
+        """
+        now = datetime.now()
+        specs = [
+            (
+                to_minor(item["total_amount"]),
+                [(payer["user_id"], to_minor(payer["amount"])) for payer in item["payers"]],
+                item["attendees"]
+            )
+            for item in expenses
+        ]
+        for total_amount, payers, _ in specs:
+            _check_payments(total_amount, [amount for _, amount in payers])
+        
+        created = []
+        for item, (total_amount, payers, attendees), debts in zip(
+            expenses, specs, compute_debts_batch(specs)
+        ):
+            created_at = item.get("created_at") or now
+            settled = item.get("settled", False)
+            expense = Expense(
+                id=str(uuid.uuid4()),
+                total_amount=total_amount,
+                payers=[
+                    Payment(user_id=user_id, amount=amount, timestamp=created_at)
+                    for user_id, amount in payers
+                ],
+                attendees=attendees,
+                description=item["description"],
+                channel_id=item["channel_id"],
+                created_by=item["created_by"],
+                created_at=created_at,
+                debts=[
+                    Debt(
+                        debtor_id=debtor_id,
+                        payer_id=payer_id,
+                        amount=amount,
+                        is_paid=settled,
+                        paid_timestamp=created_at if settled else None
+                    )
+                    for debtor_id, payer_id, amount in debts
+                ]
+            )
+            created.append(expense)
+        
+        # Settled expenses go straight to the archive when there is one
+        open_expenses = [expense for expense in created if any(not debt.is_paid for debt in expense.debts)]
+        if self.archive is None:
+            self.store.save_expenses(created)
+        else:
+            self.archive.append([expense for expense in created if all(debt.is_paid for debt in expense.debts)])
+            self.store.save_expenses(open_expenses)
+        
+        # Until the pending debts are loaded, nothing is scheduled from memory either:
+        # the new debts are read from the store along with the others
+        if self._pending_loaded:
+            for expense in open_expenses:
+                self._track_expense(expense)
+        
+        return created
+    
+    def _add_expense(self, expense: Expense) -> None:
+        """Save a new expense, index its debts and notify the listeners."""
+        self.store.save_expense(expense)
+        self._track_expense(expense)
+    
+    def _track_expense(self, expense: Expense) -> None:
+        """Cache and index a new expense, and notify the listeners of its unpaid debts."""
+        self.expenses[expense.id] = expense
+        self._index_expense(expense)
+        
+        for listener in self._listeners:
+            for debt in expense.debts:
+                if not debt.is_paid:
+                    listener.on_debt_created((expense.id, debt.debtor_id, debt.payer_id), expense, debt)
+    
+    def _untrack_expense(self, expense: Expense) -> None:
+        """Drop an expense from the cache and the indexes."""
+        self.expenses.pop(expense.id, None)
+        for debt in expense.debts:
+            key = (expense.id, debt.debtor_id, debt.payer_id)
+            self._debts.pop(key, None)
+            self._pending.pop(key, None)
+            for index, user_id in ((self._debts_by_debtor, debt.debtor_id), (self._debts_by_payer, debt.payer_id)):
+                keys = index.get(user_id)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[user_id]
+    
+    def _reset_cache(self) -> None:
+        """Forget every loaded expense and index."""
+        self.expenses: Dict[str, Expense] = {}  # Expenses loaded from or saved to the store
+        self._pending_loaded = False
+        
+        # Indexes over the debts of every expense, kept in sync on create and on paid
+        self._debts: Dict[DebtKey, Debt] = {}
+        self._debts_by_debtor: Dict[str, Set[DebtKey]] = {}
+        self._debts_by_payer: Dict[str, Set[DebtKey]] = {}
+        self._pending: Dict[DebtKey, None] = {}  # Insertion-ordered set of unpaid debts
+    
+    def sync(self) -> bool:
+        """In shared mode, apply the changes other processes made to the store.
+        
+        Only the expenses they changed are dropped from the cache and the
+        indexes, and loaded again if they were cached or have unpaid debts.
+        Listeners are told of the debts that were paid through on_debt_paid()
+        and of every unpaid debt of those expenses through on_debt_created(),
+        so they can reschedule them. When the store cannot tell which
+        expenses changed, the whole cache is dropped and listeners are told
+        through on_store_changed(). Returns whether anything changed.
+        """
+        if not self.shared:
+            return False
+        
+        changed = self.store.external_changes()
+        if changed is None:
+            self._reset_cache()
+            for listener in self._listeners:
+                listener.on_store_changed()
+            return True
+        
+        for expense_id in changed:
+            self._reload_expense(expense_id)
+        return bool(changed)
+    
+    def _reload_expense(self, expense_id: str) -> None:
+        """Replace the cached copy of an expense another process changed, and notify the listeners."""
+        cached = self.expenses.get(expense_id)
+        was_pending = []
+        if cached is not None:
+            was_pending = [
+                (expense_id, debt.debtor_id, debt.payer_id) for debt in cached.debts
+                if (expense_id, debt.debtor_id, debt.payer_id) in self._pending
+            ]
+            self._untrack_expense(cached)
+        
+        # Uncached expenses only matter once the pending debts are loaded, if they have some
+        expense = None
+        if cached is not None or self._pending_loaded:
+            expense = self.store.load_expense(expense_id)
+        pending = [] if expense is None else [debt for debt in expense.debts if not debt.is_paid]
+        if expense is not None and (cached is not None or pending):
+            self.expenses[expense_id] = expense
+            self._index_expense(expense)
+        
+        for listener in self._listeners:
+            for key in was_pending:
+                if key not in self._pending:
+                    listener.on_debt_paid(key)
+            for debt in pending:
+                listener.on_debt_created((expense_id, debt.debtor_id, debt.payer_id), expense, debt)
+    
+    def add_listener(self, listener) -> None:
+        """Register an object with on_debt_created(key, expense, debt), on_debt_paid(key)
+        and on_store_changed() methods.
+        
+        on_debt_created is also called for an unpaid debt that another process
+        changed, e.g. by reminding it, with its new state.
+        """
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener) -> None:
+        """Stop notifying a listener."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _index_expense(self, expense: Expense) -> None:
+        """Add the debts of an expense to the lookup indexes."""
+        for debt in expense.debts:
+            key = (expense.id, debt.debtor_id, debt.payer_id)
+            self._debts[key] = debt
+            self._debts_by_debtor.setdefault(debt.debtor_id, set()).add(key)
+            self._debts_by_payer.setdefault(debt.payer_id, set()).add(key)
+            if not debt.is_paid:
+                self._pending[key] = None
+    
+    def _load_pending(self) -> None:
+        """Load every expense with unpaid debts from the store, once."""
+        self.sync()
+        if self._pending_loaded:
+            return
+        
+        for expense in self.store.iter_pending_expenses():
+            if expense.id not in self.expenses:
+                self.expenses[expense.id] = expense
+                self._index_expense(expense)
+        
+        self._pending_loaded = True
+    
     def get_expense(self, expense_id: str) -> Optional[Expense]:
-        """Get an expense by ID."""
-        return self.expenses.get(expense_id)
+        """Get an expense by ID.
+        
+        Archived expenses are read from the archive every time, not cached.
+        """
+        self.sync()
+        expense = self.expenses.get(expense_id)
+        if expense is None:
+            expense = self.store.load_expense(expense_id)
+            if expense is not None:
+                self.expenses[expense_id] = expense
+                self._index_expense(expense)
+            elif self.archive is not None:
+                expense = self.archive.get(expense_id)
+        return expense
     
     def get_all_expenses(self) -> List[Expense]:
-        """Get all expenses."""
-        return list(self.expenses.values())
+        """Get all expenses, archived ones included."""
+        self.sync()
+        expenses = [
+            self.expenses.get(expense.id, expense)
+            for expense in self.store.iter_expenses()
+            if self.archive is None or expense.id not in self.archive
+        ]
+        if self.archive is not None:
+            expenses.extend(self.archive.iter_expenses())
+            expenses.sort(key=lambda expense: expense.created_at)
+        return expenses
+    
+    def get_debt(self, expense_id: str, debtor_id: str, payer_id: str) -> Optional[Debt]:
+        """Get a single debt by expense, debtor and payer."""
+        self.sync()
+        key = (expense_id, debtor_id, payer_id)
+        if key in self._debts or expense_id in self.expenses:
+            return self._debts.get(key)
+        
+        # Debts of archived expenses are not indexed
+        expense = self.get_expense(expense_id)
+        if expense is None:
+            return None
+        return next(
+            (debt for debt in expense.debts if debt.debtor_id == debtor_id and debt.payer_id == payer_id),
+            None
+        )
+    
+    def get_pending_debt(self, expense_id: str, debtor_id: str, payer_id: str) -> Optional[Debt]:
+        """Get a debt by expense, debtor and payer if it is still unpaid."""
+        debt = self.get_debt(expense_id, debtor_id, payer_id)
+        if debt is None or (expense_id, debtor_id, payer_id) not in self._pending:
+            return None
+        return debt
     
     def mark_debt_as_paid(self, expense_id: str, debtor_id: str, payer_id: str) -> bool:
         """Mark a debt as paid."""
-        expense = self.get_expense(expense_id)
-        if not expense:
+        debt = self.get_pending_debt(expense_id, debtor_id, payer_id)
+        if not debt:
             return False
         
-        for debt in expense.debts:
-            if debt.debtor_id == debtor_id and debt.payer_id == payer_id and not debt.is_paid:
-                debt.is_paid = True
-                debt.paid_timestamp = datetime.now()
-                return True
+        debt.is_paid = True
+        debt.paid_timestamp = datetime.now()
+        del self._pending[(expense_id, debtor_id, payer_id)]
+        self.store.mark_debt_paid(expense_id, debtor_id, payer_id, debt.paid_timestamp)
         
-        return False
+        for listener in self._listeners:
+            listener.on_debt_paid((expense_id, debtor_id, payer_id))
+        
+        if self.archive is not None:
+            expense = self.expenses.get(expense_id)
+            if expense is not None and all(debt.is_paid for debt in expense.debts):
+                self._settled[expense_id] = time.monotonic()
+            self.archive_settled()
+        
+        return True
+    
+    def mark_debts_as_paid(self, keys: List[DebtKey]) -> List[DebtKey]:
+        """Mark many debts as paid and return the keys of those that were still pending."""
+        return [key for key in keys if self.mark_debt_as_paid(*key)]
+    
+    def _pending_entry(self, key: DebtKey) -> Dict:
+        """Build the dictionary returned for a pending debt."""
+        expense_id = key[0]
+        return {
+            "expense_id": expense_id,
+            "expense": self.expenses[expense_id],
+            "debt": self._debts[key]
+        }
     
     def get_pending_debts(self) -> List[Dict]:
         """Get all pending debts across all expenses."""
-        pending_debts = []
+        self._load_pending()
+        return [self._pending_entry(key) for key in self._pending]
+    
+    def get_pending_debts_for_debtor(self, debtor_id: str) -> List[Dict]:
+        """Get the pending debts owed by a user."""
+        self._load_pending()
+        keys = self._debts_by_debtor.get(debtor_id, ())
+        return [self._pending_entry(key) for key in keys if key in self._pending]
+    
+    def get_pending_debts_for_payer(self, payer_id: str) -> List[Dict]:
+        """Get the pending debts owed to a user."""
+        self._load_pending()
+        keys = self._debts_by_payer.get(payer_id, ())
+        return [self._pending_entry(key) for key in keys if key in self._pending]
+    
+    def get_user_ledger(self, user_id: str) -> Dict[str, List[Dict]]:
+        """Get the pending debts a user owes ("owes") and is owed ("owed"), newest expense first.
         
-        for expense_id, expense in self.expenses.items():
-            for debt in expense.debts:
-                if not debt.is_paid:
-                    pending_debts.append({
-                        "expense_id": expense_id,
-                        "expense": expense,
-                        "debt": debt
-                    })
+        Both lists come from the per-user indexes, so this costs as much as
+        the user's own debts, not every debt in the store.
+        """
+        def newest_first(pending_debt: Dict):
+            debt = pending_debt["debt"]
+            return (pending_debt["expense"].created_at, pending_debt["expense_id"], debt.debtor_id, debt.payer_id)
+        
+        return {
+            "owes": sorted(self.get_pending_debts_for_debtor(user_id), key=newest_first, reverse=True),
+            "owed": sorted(self.get_pending_debts_for_payer(user_id), key=newest_first, reverse=True)
+        }
+    
+    def get_pending_debts_for_channel(self, channel_id: str) -> List[Dict]:
+        """Get the pending debts of the expenses posted in a channel."""
+        return [
+            pending_debt for pending_debt in self.get_pending_debts()
+            if pending_debt["expense"].channel_id == channel_id
+        ]
+    
+    def iter_debt_rows(
+        self,
+        channel_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        is_paid: Optional[bool] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream the debts matching the filters straight from the store, one row per debt.
+        
+        Nothing is cached, so this suits exports of the whole ledger; see
+        ExpenseStore.iter_debt_rows.
+        """
+        self.sync()
+        rows = self.store.iter_debt_rows(channel_id, since, until, is_paid)
+        if self.archive is None or is_paid is False:
+            return rows
         
-        return pending_debts
+        # Archived debts are all paid; both streams are ordered by expense
+        return heapq.merge(
+            (row for row in rows if row["expense_id"] not in self.archive),
+            self.archive.iter_debt_rows(channel_id, since, until),
+            key=lambda row: (row["created_at"], row["expense_id"])
+        )
+    
+    def count_debts(self) -> Dict[str, int]:
+        """Count the debts that are still open and those that are settled, archived ones included."""
+        counts = self.store.count_debts()
+        if self.archive is not None:
+            counts["settled"] += self.archive.settled_debts
+        return counts
+    
+    def archive_settled(self, grace: Optional[float] = None) -> int:
+        """Archive the expenses settled in this process at least grace seconds ago.
+        
+        grace defaults to archive_after. Returns how many were archived.
+        """
+        if self.archive is None:
+            return 0
+        
+        deadline = time.monotonic() - (self.archive_after if grace is None else grace)
+        expense_ids = []
+        while self._settled:
+            expense_id, settled_at = next(iter(self._settled.items()))
+            if settled_at > deadline:
+                break
+            del self._settled[expense_id]
+            expense_ids.append(expense_id)
+        
+        expenses = [self.expenses.get(expense_id) or self.store.load_expense(expense_id) for expense_id in expense_ids]
+        return self._archive_expenses([
+            expense for expense in expenses
+            if expense is not None and all(debt.is_paid for debt in expense.debts)
+        ])
+    
+    def compact(self, limit: Optional[int] = None) -> int:
+        """Archive the settled expenses left in the store, oldest first, at most limit of them.
+        
+        This covers expenses settled before the archive was set up, or by a
+        process that stopped before archiving them. Expenses whose last debt
+        was paid less than archive_after seconds ago are left for later.
+        Returns how many were archived.
+        """
+        if self.archive is None:
+            return 0
+        
+        self.sync()
+        now = datetime.now()
+        expenses = []
+        for expense in self.store.iter_settled_expenses(limit):
+            settled_at = max(
+                (debt.paid_timestamp or expense.created_at for debt in expense.debts),
+                default=expense.created_at
+            )
+            if (now - settled_at).total_seconds() >= self.archive_after:
+                expenses.append(expense)
+        return self._archive_expenses(expenses)
+    
+    def _archive_expenses(self, expenses: List[Expense]) -> int:
+        """Append settled expenses to the archive, then remove them from the store and the cache."""
+        if not expenses:
+            return 0
+        
+        # One left in the store by a crash after it was archived is not archived twice
+        self.archive.append([expense for expense in expenses if expense.id not in self.archive])
+        for expense in expenses:
+            self.store.delete_expense(expense.id)
+            self._untrack_expense(self.expenses.get(expense.id, expense))
+            self._settled.pop(expense.id, None)
+        return len(expenses)
+    
+    def count_pending_debts(self) -> int:
+        """Get the number of pending debts."""
+        self._load_pending()
+        return len(self._pending)
     
     def update_reminder_timestamp(self, expense_id: str, debtor_id: str, payer_id: str) -> bool:
         """Update the last reminder timestamp for a debt."""
+        debt = self.get_pending_debt(expense_id, debtor_id, payer_id)
+        if not debt:
+            return False
+        
+        debt.last_reminder_sent = datetime.now()
+        self.store.update_reminder_timestamp(
+            expense_id, debtor_id, payer_id, debt.last_reminder_sent
+        )
+        return True
+    
+    def update_reminder_timestamps(self, keys: List[DebtKey]) -> int:
+        """Update the last reminder timestamp for many debts in one store operation.
+        
+        Returns the number of pending debts that were updated.
+        """
+        sent_at = datetime.now()
+        updated = []
+        
+        for key in keys:
+            debt = self.get_pending_debt(*key)
+            if debt:
+                debt.last_reminder_sent = sent_at
+                updated.append(key)
+        
+        if updated:
+            self.store.update_reminder_timestamps(updated, sent_at)
+        return len(updated)
+    
+    def set_summary_ts(self, expense_id: str, summary_ts: str) -> bool:
+        """Record the ts of the channel message summarizing an expense."""
         expense = self.get_expense(expense_id)
         if not expense:
             return False
         
-        for debt in expense.debts:
-            if debt.debtor_id == debtor_id and debt.payer_id == payer_id and not debt.is_paid:
-                debt.last_reminder_sent = datetime.now()
-                return True
-        
-        return False 
\ No newline at end of file
+        expense.summary_ts = summary_ts
+        self.store.set_summary_ts(expense_id, summary_ts)
+        return True
+    
+    def close(self) -> None:
+        """Archive every expense settled so far, flush pending writes and close the store and archive."""
+        self.archive_settled(grace=0)
+        self.store.close()
+        if self.archive is not None:
+            self.archive.close()
@@ -0,0 +1,117 @@
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from slack_bolt.middleware.async_middleware import AsyncMiddleware
+from slack_bolt.request.async_request import AsyncBoltRequest
+from slack_bolt.response import BoltResponse
+
+from app.storage.request_keys import SQLiteRequestKeys
+from app.utils.cache import TTLCache
+from app.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_REQUESTS = Counter(
+    "splitbot_duplicate_requests_total",
+    "Slack requests acknowledged without being handled again, by reason (retry, redelivery or repeated_action)",
+    ["reason"]
+)
+
+# Button clicks that change state, whose repeats within action_window seconds are dropped
+STATEFUL_ACTIONS = ("confirm_payment", "settle_transfer")
+
+
+class IdempotencyGuard(AsyncMiddleware):
+    """Bolt middleware acknowledging repeated Slack requests without handling them again.
+
+    Slack retries a request it did not get a fast enough ack for, with the
+    same trigger_id (or event_id) and an X-Slack-Retry-Num header, and a
+    double click sends a button's action twice with different trigger_ids.
+    Each request is keyed on its trigger_id or event_id, and a click on a
+    stateful action also on the action itself: the user, action, value and
+    message. A request with a key seen within the TTL gets an empty 200
+    response before any listener runs, so nothing is parsed, stored or
+    posted twice.
+
+    Keys are kept per process, in a bounded TTLCache, which only catches the
+    retries that reach the same process. When several workers serve Slack,
+    pass shared_keys so every worker checks the keys the others recorded.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600,
+        action_window: float = 5,
+        max_size: int = 10000,
+        stateful_actions: Iterable[str] = STATEFUL_ACTIONS,
+        shared_keys: Optional[SQLiteRequestKeys] = None
+    ):
+        """Initialize an empty guard; Slack gives up retrying well within the default TTL."""
+        self.ttl = ttl
+        self.action_window = action_window
+        self.stateful_actions = set(stateful_actions)
+        self.seen = TTLCache(ttl, max_size, name="slack_requests")
+        self.shared_keys = shared_keys
+
+    async def async_process(
+        self,
+        *,
+        req: AsyncBoltRequest,
+        resp: BoltResponse,
+        next: Callable[[], Awaitable[BoltResponse]]
+    ) -> BoltResponse:
+        """Acknowledge a duplicate with an empty 200 response, or pass the request on."""
+        keys = self.request_keys(req.body)
+        duplicate = self.claim_keys(keys)
+        if duplicate is None:
+            return await next()
+
+        if req.headers.get("x-slack-retry-num"):
+            reason = "retry"
+        elif duplicate[0] == "action":
+            reason = "repeated_action"
+        else:
+            reason = "redelivery"
+        DUPLICATE_REQUESTS.labels(reason).inc()
+        logger.info(f"Dropping duplicate Slack request {duplicate} ({reason})")
+        return BoltResponse(status=200, body="")
+
+    def claim_keys(self, keys: List[Tuple[Tuple[str, ...], Optional[float]]]) -> Optional[Tuple[str, ...]]:
+        """Record a request's keys, or return the first one already seen within its TTL."""
+        if self.shared_keys is not None:
+            if not keys:
+                return None
+            names = {json.dumps(key): key for key, _ in keys}
+            duplicate = self.shared_keys.claim([
+                (json.dumps(key), self.ttl if ttl is None else ttl) for key, ttl in keys
+            ])
+            return names[duplicate] if duplicate is not None else None
+
+        for key, _ in keys:
+            if self.seen.get(key) is not None:
+                return key
+        for key, ttl in keys:
+            self.seen.set(key, True, ttl)
+        return None
+
+    def request_keys(self, body: Dict[str, Any]) -> List[Tuple[Tuple[str, ...], Optional[float]]]:
+        """The (key, ttl) pairs identifying a request; a ttl of None means the guard's TTL."""
+        keys = []
+        if body.get("trigger_id"):
+            keys.append((("trigger", body["trigger_id"]), None))
+        if body.get("event_id"):
+            keys.append((("event", body["event_id"]), None))
+
+        if body.get("type") == "block_actions":
+            user_id = (body.get("user") or {}).get("id", "")
+            message_ts = (body.get("message") or body.get("container") or {}).get("ts", "")
+            for action in body.get("actions") or ():
+                if action.get("action_id") in self.stateful_actions:
+                    key = ("action", user_id, action["action_id"], action.get("value", ""), message_ts)
+                    keys.append((key, self.action_window))
+        return keys
+
+    @property
+    def name(self) -> str:
+        return "IdempotencyGuard"
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from app.services.expense_service import ExpenseService
+from app.services.outbox_worker import OutboxWorker
+from app.services.slack_directory import SlackDirectory
+from app.utils.import_parser import ImportRowError, iter_lines, iter_records, parse_import_row
+from app.utils.message_builder import build_consolidated_reminder_message, build_reminder_message
+from app.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+IMPORTED_ROWS = Counter(
+    "splitbot_imported_rows_total",
+    "Rows of expense imports by outcome (imported or failed)",
+    ["outcome"]
+)
+
+
+class ExpenseImporter:
+    """Import expenses from a CSV or JSONL stream, a batch at a time.
+
+    Rows are parsed and validated as they arrive, and every batch_size
+    valid rows become expenses through ExpenseService.create_expenses, in
+    one store commit. The importer only holds the current batch; the
+    service keeps the imported expenses with unpaid debts in memory once
+    its pending debts are loaded, e.g. for reminders. Nothing is posted per
+    row: with notify, each debtor gets one DM listing their unpaid debts
+    once the import is done.
+    """
+
+    def __init__(
+        self,
+        expense_service: ExpenseService,
+        outbox_worker: Optional[OutboxWorker] = None,
+        directory: Optional[SlackDirectory] = None,
+        batch_size: int = 500,
+        max_errors: int = 100
+    ):
+        """Initialize the importer; at most max_errors row errors are reported in detail."""
+        self.expense_service = expense_service
+        self.outbox_worker = outbox_worker
+        self.directory = directory
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+
+    async def import_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        format: str,
+        defaults: Optional[Dict[str, str]] = None,
+        notify: bool = False
+    ) -> Dict[str, Any]:
+        """Import every row of a stream of bytes, e.g. request.stream().
+
+        Invalid rows are skipped and reported. Raises ImportRowError for a
+        CSV header without the required columns, and ValueError for an
+        unknown format.
+        """
+        defaults = defaults or {}
+        report = {"imported": 0, "failed": 0, "batches": 0, "notified": 0, "errors": []}
+        debtor_ids: Set[str] = set()
+        batch: List[Dict[str, Any]] = []
+
+        async for line, record in iter_records(iter_lines(chunks), format):
+            try:
+                if isinstance(record, ImportRowError):
+                    raise record
+                batch.append(parse_import_row(record, line, defaults))
+            except ImportRowError as e:
+                report["failed"] += 1
+                IMPORTED_ROWS.labels("failed").inc()
+                if len(report["errors"]) < self.max_errors:
+                    report["errors"].append({"line": e.line, "error": e.message})
+                continue
+
+            if len(batch) >= self.batch_size:
+                self._create_batch(batch, report, debtor_ids)
+                batch = []
+                await asyncio.sleep(0)  # Let other requests in between batches
+
+        if batch:
+            self._create_batch(batch, report, debtor_ids)
+
+        if notify:
+            report["notified"] = self._notify(debtor_ids)
+
+        logger.info(
+            f"Imported {report['imported']} expenses in {report['batches']} batches, "
+            f"{report['failed']} rows failed"
+        )
+        return report
+
+    def _create_batch(self, batch: List[Dict[str, Any]], report: Dict[str, Any], debtor_ids: Set[str]) -> None:
+        """Create a batch of expenses and note who owes money in them."""
+        for expense in self.expense_service.create_expenses(batch):
+            debtor_ids.update(debt.debtor_id for debt in expense.debts if not debt.is_paid)
+
+        report["imported"] += len(batch)
+        report["batches"] += 1
+        IMPORTED_ROWS.labels("imported").inc(len(batch))
+
+    def _notify(self, debtor_ids: Set[str]) -> int:
+        """Queue one DM per debtor listing their unpaid debts, and return how many were queued.
+
+        The DM counts as a reminder, so the debts are next reminded a full
+        interval later.
+        """
+        if self.outbox_worker is None:
+            return 0
+
+        notified = 0
+        for debtor_id in sorted(debtor_ids):
+            pending_debts = self.expense_service.get_pending_debts_for_debtor(debtor_id)
+            if not pending_debts:
+                continue
+
+            if len(pending_debts) == 1:
+                expense, debt = pending_debts[0]["expense"], pending_debts[0]["debt"]
+                text = f"You owe money for {expense.description}"
+                blocks = build_reminder_message(expense, debt)
+            else:
+                text = f"You have {len(pending_debts)} unpaid debts"
+                blocks = build_consolidated_reminder_message(pending_debts)
+
+            self.outbox_worker.enqueue("chat_postMessage", {
+                "channel": self.directory.channel_for(debtor_id) if self.directory else debtor_id,
+                "text": text,
+                "blocks": blocks
+            })
+            self.expense_service.update_reminder_timestamps([
+                (pending_debt["expense_id"], debtor_id, pending_debt["debt"].payer_id)
+                for pending_debt in pending_debts
+            ])
+            notified += 1
+
+        return notified
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from slack_sdk.errors import SlackApiError
+
+from app.services.slack_delivery import SlackDelivery
+from app.storage.outbox import Outbox, OutboxMessage
+from app.utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DELIVERIES = Counter(
+    "splitbot_outbox_deliveries_total",
+    "Outbox delivery attempts by outcome (sent, retried or failed)",
+    ["outcome"]
+)
+OUTBOX_QUEUED = Gauge("splitbot_outbox_queued_messages", "Messages waiting in the outbox")
+
+# Called with the worker, the message and the Slack response, or None when delivery was given up
+OutboxCallback = Callable[["OutboxWorker", OutboxMessage, Optional[Any]], Awaitable[None]]
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Whether retrying a failed call cannot help, e.g. channel_not_found."""
+    if not isinstance(error, SlackApiError):
+        return False  # Network errors and timeouts are worth retrying
+    status = error.response.status_code
+    return status != 429 and status < 500
+
+
+class OutboxWorker:
+    """Deliver the messages queued in an outbox with a pool of asyncio workers.
+
+    Handlers queue their Slack calls with enqueue and return straight away.
+    Each worker claims the next due message, delivers it through
+    SlackDelivery and removes it, or schedules a retry with exponential
+    backoff. Messages left in a durable outbox at shutdown or after a crash
+    are delivered on the next start, so a message may be sent twice if the
+    process dies mid-call.
+
+    When a message has a callback, the function registered under that name
+    is awaited after the message is delivered or given up on, e.g. to record
+    the ts of a posted message.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        delivery: SlackDelivery,
+        workers: int = 4,
+        lease: float = 60.0,
+        max_attempts: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        poll_interval: float = 1.0
+    ):
+        """Initialize the worker pool."""
+        self.outbox = outbox
+        self.delivery = delivery
+        self.workers = workers
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.callbacks: Dict[str, OutboxCallback] = {}
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+        self._loop = None
+        self._wakeup = None
+
+    def register_callback(self, name: str, callback: OutboxCallback) -> None:
+        """Register a function that messages can name as their callback."""
+        self.callbacks[name] = callback
+
+    def enqueue(
+        self,
+        method: str,
+        kwargs: Dict[str, Any],
+        callback: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Queue a Web API call, e.g. enqueue("chat_postMessage", {"channel": ..., "text": ...})."""
+        message_id = self.outbox.enqueue(method, kwargs, callback, context)
+        self._wake()
+        return message_id
+
+    def _wake(self) -> None:
+        """Wake idle workers so they claim new messages straight away."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self) -> None:
+        """Start the workers on the running event loop."""
+        self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Started {self.workers} outbox workers, {self.outbox.count()} messages queued")
+
+    async def stop(self) -> None:
+        """Stop the workers once their current messages are delivered.
+
+        Messages still queued stay in the outbox for the next start.
+        """
+        self._running = False
+        self._wake()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.outbox.release(self.worker_id)
+        logger.info(f"Stopped outbox workers, {self.outbox.count()} messages queued")
+
+    async def _run(self) -> None:
+        """Claim and deliver messages until stopped."""
+        while self._running:
+            try:
+                messages = self.outbox.claim(self.worker_id, 1, self.lease)
+            except Exception as e:
+                logger.error(f"Error claiming outbox messages: {e}")
+                messages = []
+
+            if messages:
+                await self.deliver(messages[0])
+                continue
+
+            # Nothing is due, so wait for a new message or for a retry to come due
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def deliver(self, message: OutboxMessage) -> bool:
+        """Deliver a claimed message and record the outcome in the outbox."""
+        try:
+            response = await self.delivery.call(message.method, **message.kwargs)
+        except Exception as e:
+            if _is_permanent(e) or message.attempts + 1 >= self.max_attempts:
+                logger.error(f"Giving up on {message} after {message.attempts + 1} attempts: {e}")
+                self.outbox.fail(message.id, str(e))
+                self.failed += 1
+                OUTBOX_DELIVERIES.labels("failed").inc()
+                await self._run_callback(message, None)
+            else:
+                delay = min(self.base_delay * 2 ** message.attempts, self.max_delay)
+                logger.warning(f"Error delivering {message}, retrying in {delay}s: {e}")
+                self.outbox.retry(message.id, delay, str(e))
+                self.retried += 1
+                OUTBOX_DELIVERIES.labels("retried").inc()
+            return False
+
+        self.outbox.complete(message.id)
+        self.sent += 1
+        OUTBOX_DELIVERIES.labels("sent").inc()
+        await self._run_callback(message, response)
+        return True
+
+    async def _run_callback(self, message: OutboxMessage, response: Optional[Any]) -> None:
+        """Await the callback a message names, if any."""
+        if not message.callback:
+            return
+
+        callback = self.callbacks.get(message.callback)
+        if callback is None:
+            logger.error(f"No outbox callback registered as {message.callback}")
+            return
+
+        try:
+            await callback(self, message, response)
+        except Exception as e:
+            logger.error(f"Error in outbox callback {message.callback} for {message}: {e}")
@@ -0,0 +1,68 @@
+import heapq
+import itertools
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional
+
+
+class ReminderQueue:
+    """Priority queue of debts ordered by when their next reminder is due.
+    
+    Entries are removed lazily: discarding a debt only marks its heap entry,
+    which is dropped once it reaches the top of the heap.
+    """
+    
+    _REMOVED = None
+    
+    def __init__(self):
+        """Initialize an empty queue."""
+        self._heap: List[list] = []
+        self._entries: Dict[Hashable, list] = {}
+        self._counter = itertools.count()
+    
+    def __len__(self) -> int:
+        """Return the number of scheduled debts."""
+        return len(self._entries)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        """Return whether a debt is scheduled."""
+        return key in self._entries
+    
+    def push(self, key: Hashable, due_at: datetime) -> bool:
+        """Schedule a debt, replacing any earlier schedule for it.
+        
+        Returns True if the debt is now the first one due.
+        """
+        self.discard(key)
+        
+        entry = [due_at, next(self._counter), key]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        
+        self.next_due_time()  # Drop removed entries sitting above the new one
+        return self._heap[0] is entry
+    
+    def discard(self, key: Hashable) -> None:
+        """Remove a debt from the queue if it is scheduled."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[-1] = self._REMOVED
+    
+    def next_due_time(self) -> Optional[datetime]:
+        """Return when the first scheduled debt is due, if any."""
+        heap = self._heap
+        while heap and heap[0][-1] is self._REMOVED:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+    
+    def pop_due(self, now: datetime) -> List[Hashable]:
+        """Remove and return every debt due at or before now, earliest first."""
+        due = []
+        heap = self._heap
+        
+        while heap and heap[0][0] <= now:
+            _, _, key = heapq.heappop(heap)
+            if key is not self._REMOVED:
+                del self._entries[key]
+                due.append(key)
+        
+        return due
@@ -1,66 +1,270 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
-from slack_bolt import App as SlackApp
+from slack_bolt.async_app import AsyncApp
 
-from app.services.expense_service import ExpenseService
-from app.utils.message_builder import build_reminder_message
+from app.models.expense import Expense, Debt
+from app.services.expense_service import DebtKey, ExpenseService
+from app.services.outbox_worker import OutboxWorker
+from app.services.reminder_queue import ReminderQueue
+from app.services.slack_delivery import SlackDelivery
+from app.services.slack_directory import SlackDirectory
+from app.storage.lease import SQLiteLease
+from app.utils.message_builder import build_consolidated_reminder_message, build_reminder_message
+from app.utils.metrics import Counter, Histogram
 
 logger = logging.getLogger(__name__)
 
+REMINDER_CYCLE_DURATION = Histogram(
+    "splitbot_reminder_cycle_duration_seconds",
+    "Time spent in each automatic reminder cycle"
+)
+REMINDER_DEBTS = Counter(
+    "splitbot_reminder_debts_total",
+    "Debts looked at by automatic reminder cycles (scanned) and those reminded",
+    ["stage"]
+)
+REMINDER_MESSAGES = Counter(
+    "splitbot_reminder_messages_total",
+    "Reminder DMs sent or queued, by trigger (automatic or manual)",
+    ["trigger"]
+)
+
 class ReminderService:
     """Service to handle automated reminders for unpaid debts."""
     
-    def __init__(self, slack_app: SlackApp, expense_service: ExpenseService = None):
-        """Initialize the reminder service."""
+    def __init__(
+        self,
+        slack_app: AsyncApp,
+        expense_service: ExpenseService = None,
+        delivery: SlackDelivery = None,
+        outbox_worker: OutboxWorker = None,
+        leader_lease: SQLiteLease = None,
+        directory: SlackDirectory = None
+    ):
+        """Initialize the reminder service.
+        
+        With an outbox worker, automatic reminders are queued in its outbox
+        rather than delivered by the scheduler itself. With a leader lease,
+        only the process holding the lease sends automatic reminders, so
+        several workers can run the scheduler. With a directory, reminders
+        go to the debtors' cached DM channels instead of their user IDs.
+        """
         self.slack_app = slack_app
-        self.expense_service = expense_service or ExpenseService()
+        self.delivery = delivery or SlackDelivery(slack_app.client)
+        self.outbox_worker = outbox_worker
+        self.leader_lease = leader_lease
+        self.directory = directory
+        self.is_leader = leader_lease is None
         self.reminder_interval = timedelta(hours=24)
+        self.batch_reminders = True  # Send one DM per debtor instead of one per debt
+        self.queue = ReminderQueue()
+        self._expense_service = None
         self._running = False
+        self._loop = None
+        self._wakeup = None
+        self.expense_service = expense_service or ExpenseService()
+    
+    @property
+    def expense_service(self) -> ExpenseService:
+        """The expense service whose debts are reminded."""
+        return self._expense_service
+    
+    @expense_service.setter
+    def expense_service(self, expense_service: ExpenseService):
+        """Switch to another expense service and reschedule its pending debts."""
+        if self._expense_service is not None:
+            self._expense_service.remove_listener(self)
+        
+        self._expense_service = expense_service
+        expense_service.add_listener(self)
+        
+        self.queue = ReminderQueue()
+        self._queue_seeded = False
+        self._wake()
+    
+    def _next_due_time(self, debt: Debt, expense: Expense) -> datetime:
+        """Return when the next reminder for a debt is due."""
+        return (debt.last_reminder_sent or expense.created_at) + self.reminder_interval
+    
+    def _seed_queue(self):
+        """Schedule every pending debt already in the store, once."""
+        if self._queue_seeded:
+            return
+        
+        for pending_debt in self.expense_service.get_pending_debts():
+            debt = pending_debt["debt"]
+            key = (pending_debt["expense_id"], debt.debtor_id, debt.payer_id)
+            if key not in self.queue:
+                self.queue.push(key, self._next_due_time(debt, pending_debt["expense"]))
+        
+        self._queue_seeded = True
+    
+    def on_debt_created(self, key: DebtKey, expense: Expense, debt: Debt):
+        """Schedule the first reminder for a new debt."""
+        if self.queue.push(key, self._next_due_time(debt, expense)):
+            self._wake()
+    
+    def on_debt_paid(self, key: DebtKey):
+        """Stop reminding a debt once it has been paid."""
+        self.queue.discard(key)
+    
+    def on_store_changed(self):
+        """Reschedule every pending debt after the store lost track of what other processes changed."""
+        self.queue = ReminderQueue()
+        self._queue_seeded = False
+        self._wake()
+    
+    def _hold_leadership(self) -> bool:
+        """Take or renew the leader lease, returning whether this process leads."""
+        if self.leader_lease is None:
+            return True
+        
+        is_leader = self.leader_lease.acquire()
+        if is_leader != self.is_leader:
+            # Debts reminded or paid while another process led reach the queue through sync()
+            logger.info("Became the reminder scheduler leader" if is_leader else "Lost the reminder scheduler lease")
+            self.is_leader = is_leader
+        return is_leader
+    
+    def _wake(self):
+        """Wake the scheduler so it recomputes how long to sleep."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
     
     async def start_reminder_scheduler(self):
-        """Start the reminder scheduler."""
+        """Start the reminder scheduler.
+        
+        The scheduler sleeps until the next reminder is due, or until an
+        earlier reminder is scheduled, instead of polling every debt. With a
+        leader lease it also wakes up every third of the lease's ttl, to
+        renew the lease or to take over from a leader that died.
+        """
         self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
         logger.info("Starting reminder scheduler")
         
         while self._running:
             try:
-                await self.send_automatic_reminders()
+                if self._hold_leadership():
+                    self.expense_service.sync()  # Pick up debts created by other processes
+                    self._seed_queue()
+                    await self.send_automatic_reminders()
             except Exception as e:
                 logger.error(f"Error sending automatic reminders: {e}")
             
-            # Sleep for 1 hour before checking again
-            await asyncio.sleep(3600)
+            # Sleep until the next reminder is due or the queue changes
+            due_at = self.queue.next_due_time() if self.is_leader else None
+            timeout = None if due_at is None else max(
+                (due_at - datetime.now()).total_seconds(), 0
+            )
+            if self.leader_lease is not None:
+                renew_in = self.leader_lease.ttl / 3
+                timeout = renew_in if timeout is None else min(timeout, renew_in)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
     
     def stop_reminder_scheduler(self):
-        """Stop the reminder scheduler."""
+        """Stop the reminder scheduler, handing the leader lease to another process."""
         self._running = False
+        self._wake()
+        if self.leader_lease is not None and self.is_leader:
+            self.leader_lease.release()
+            self.is_leader = False
         logger.info("Stopping reminder scheduler")
     
     async def send_automatic_reminders(self):
-        """Send automatic reminders for all pending debts."""
-        pending_debts = self.expense_service.get_pending_debts()
-        
+        """Send automatic reminders for the pending debts that are due."""
+        with REMINDER_CYCLE_DURATION.time():
+            await self._send_automatic_reminders()
+    
+    async def _send_automatic_reminders(self):
+        """Send automatic reminders for the pending debts that are due, untimed."""
         now = datetime.now()
+        due_debts = []
+        due_keys = self.queue.pop_due(now)
+        REMINDER_DEBTS.labels("scanned").inc(len(due_keys))
         
-        for pending_debt in pending_debts:
-            expense = pending_debt["expense"]
+        for key in due_keys:
+            expense_id, debtor_id, payer_id = key
+            expense = self.expense_service.get_expense(expense_id)
+            debt = self.expense_service.get_pending_debt(expense_id, debtor_id, payer_id)
+            if not expense or not debt:
+                continue
+            
+            # A manual reminder may have been sent since this one was scheduled
+            due_at = self._next_due_time(debt, expense)
+            if due_at > now:
+                self.queue.push(key, due_at)
+                continue
+            
+            due_debts.append({"expense_id": expense_id, "expense": expense, "debt": debt})
+        
+        if self.batch_reminders:
+            # Remind each debtor of everything they owe, not only what is due now
+            debtor_ids = dict.fromkeys(pending_debt["debt"].debtor_id for pending_debt in due_debts)
+            due_debts = [
+                pending_debt
+                for debtor_id in debtor_ids
+                for pending_debt in self.expense_service.get_pending_debts_for_debtor(debtor_id)
+            ]
+        
+        reminders = self._build_reminder_calls(due_debts)
+        if self.outbox_worker:
+            for (method, kwargs), _ in reminders:
+                self.outbox_worker.enqueue(method, kwargs)
+        else:
+            await self.delivery.deliver_all(call for call, _ in reminders)
+        
+        REMINDER_MESSAGES.labels("automatic").inc(len(reminders))
+        
+        # Update the reminder timestamps and schedule the next reminders
+        keys = [key for _, reminder_keys in reminders for key in reminder_keys]
+        REMINDER_DEBTS.labels("reminded").inc(len(keys))
+        self.expense_service.update_reminder_timestamps(keys)
+        for pending_debt in due_debts:
             debt = pending_debt["debt"]
-            expense_id = pending_debt["expense_id"]
+            self.queue.push(
+                (pending_debt["expense_id"], debt.debtor_id, debt.payer_id),
+                self._next_due_time(debt, pending_debt["expense"])
+            )
+    
+    def _build_reminder_calls(self, pending_debts: List[Dict]) -> List[Tuple[Tuple[str, Dict], List[DebtKey]]]:
+        """Build the reminder DMs for pending debts, with the debts each one covers.
+        
+        With batch_reminders each debtor gets a single DM listing all of their
+        debts; otherwise every debt gets its own DM.
+        """
+        debts_by_debtor: Dict[str, List[Dict]] = {}
+        for pending_debt in pending_debts:
+            debtor_id = pending_debt["debt"].debtor_id
+            group_key = debtor_id if self.batch_reminders else len(debts_by_debtor)
+            debts_by_debtor.setdefault(group_key, []).append(pending_debt)
+        
+        reminders = []
+        for debtor_debts in debts_by_debtor.values():
+            if len(debtor_debts) == 1:
+                call = self._build_reminder_call(debtor_debts[0]["expense"], debtor_debts[0]["debt"])
+            else:
+                call = {
+                    "channel": self._dm_channel(debtor_debts[0]["debt"].debtor_id),
+                    "text": f"Reminder: You have {len(debtor_debts)} unpaid debts",
+                    "blocks": build_consolidated_reminder_message(debtor_debts)
+                }
             
-            # If we haven't sent a reminder yet, or it's been more than the reminder interval
-            if (debt.last_reminder_sent is None or 
-                (now - debt.last_reminder_sent) >= self.reminder_interval):
-                
-                # Send the reminder
-                await self.send_reminder(expense_id, debt.debtor_id, debt.payer_id)
-                
-                # Update the reminder timestamp
-                self.expense_service.update_reminder_timestamp(
-                    expense_id, debt.debtor_id, debt.payer_id
-                )
+            keys = [
+                (pending_debt["expense_id"], pending_debt["debt"].debtor_id, pending_debt["debt"].payer_id)
+                for pending_debt in debtor_debts
+            ]
+            reminders.append((("chat_postMessage", call), keys))
+        
+        return reminders
     
     async def send_reminder(self, expense_id: str, debtor_id: str, payer_id: str) -> bool:
         """Send a reminder to a debtor."""
@@ -69,24 +273,15 @@ class ReminderService:
             return False
         
         # Find the specific debt
-        debt = next(
-            (d for d in expense.debts 
-             if d.debtor_id == debtor_id and d.payer_id == payer_id and not d.is_paid),
-            None
-        )
+        debt = self.expense_service.get_pending_debt(expense_id, debtor_id, payer_id)
         
         if not debt:
             return False
         
         try:
-            # Build the reminder message
-            blocks = build_reminder_message(expense, debt)
-            
             # Send a DM to the debtor
-            response = self.slack_app.client.chat_postMessage(
-                channel=debtor_id,
-                text=f"Reminder: You owe money for {expense.description}",
-                blocks=blocks
+            response = await self.delivery.call(
+                "chat_postMessage", **self._build_reminder_call(expense, debt)
             )
             
             return response["ok"]
@@ -94,32 +289,47 @@ class ReminderService:
             logger.error(f"Error sending reminder: {e}")
             return False
     
-    async def send_manual_reminders(self) -> Dict[str, int]:
-        """Send manual reminders for all pending debts."""
+    def _dm_channel(self, user_id: str) -> str:
+        """The channel to DM a user in: their cached DM channel, or their user ID."""
+        if self.directory is None:
+            return user_id
+        return self.directory.channel_for(user_id)
+    
+    def _build_reminder_call(self, expense: Expense, debt: Debt) -> Dict:
+        """Build the chat_postMessage arguments for a reminder DM."""
+        return {
+            "channel": self._dm_channel(debt.debtor_id),
+            "text": f"Reminder: You owe money for {expense.description}",
+            "blocks": build_reminder_message(expense, debt)
+        }
+    
+    async def send_manual_reminders(
+        self, on_progress: Optional[Callable[[Dict[str, int]], Awaitable[None]]] = None
+    ) -> Dict[str, int]:
+        """Send manual reminders for all pending debts.
+        
+        Reminders are delivered concurrently; on_progress is awaited
+        periodically with the sent/failed/total counts so far. With
+        batch_reminders the counts are of DMs, one per debtor.
+        """
         pending_debts = self.expense_service.get_pending_debts()
         
-        sent_count = 0
-        failed_count = 0
+        reminders = self._build_reminder_calls(pending_debts)
+        results = await self.delivery.deliver_all(
+            (call for call, _ in reminders), on_progress=on_progress
+        )
         
-        for pending_debt in pending_debts:
-            expense = pending_debt["expense"]
-            debt = pending_debt["debt"]
-            expense_id = pending_debt["expense_id"]
-            
-            # Send the reminder
-            success = await self.send_reminder(expense_id, debt.debtor_id, debt.payer_id)
-            
-            if success:
-                sent_count += 1
-                # Update the reminder timestamp
-                self.expense_service.update_reminder_timestamp(
-                    expense_id, debt.debtor_id, debt.payer_id
-                )
-            else:
-                failed_count += 1
+        # Update the reminder timestamps of every debt that was reminded
+        self.expense_service.update_reminder_timestamps([
+            key
+            for (_, keys), success in zip(reminders, results) if success
+            for key in keys
+        ])
         
+        sent_count = sum(results)
+        REMINDER_MESSAGES.labels("manual").inc(sent_count)
         return {
             "sent": sent_count,
-            "failed": failed_count,
-            "total": sent_count + failed_count
-        } 
\ No newline at end of file
+            "failed": len(results) - sent_count,
+            "total": len(results)
+        }
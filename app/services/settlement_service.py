@@ -0,0 +1,98 @@
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from app.models.settlement import Settlement, Transfer
+from app.services.expense_service import DebtKey, ExpenseService
+from app.storage.settlements import InMemorySettlementStore, SettlementStore
+from app.utils.settlement import minimize_transfers, net_balances
+
+
+class SettlementService:
+    """Service to net the pending debts of a channel into as few transfers as possible."""
+    
+    def __init__(self, expense_service: ExpenseService, store: Optional[SettlementStore] = None):
+        """Initialize the settlement service, keeping plans in memory by default.
+        
+        With a SQLiteSettlementStore every worker sharing the database can
+        act on a plan, whichever of them created it.
+        """
+        self.expense_service = expense_service
+        self.store = store or InMemorySettlementStore()
+    
+    def create_settlement(self, channel_id: str, created_by: str) -> Optional[Settlement]:
+        """Create a settlement plan for every pending debt in a channel.
+        
+        A new plan replaces the channel's previous one. The debts of users
+        with nothing to pay or receive in it, e.g. because the pending debts
+        cancel out, are marked as paid right away. Returns None, storing
+        nothing, if the channel has no pending debts.
+        """
+        pending_debts = self.expense_service.get_pending_debts_for_channel(channel_id)
+        if not pending_debts:
+            return None
+        
+        debt_keys = [
+            (pending_debt["expense_id"], pending_debt["debt"].debtor_id, pending_debt["debt"].payer_id)
+            for pending_debt in pending_debts
+        ]
+        
+        balances = net_balances(
+            (pending_debt["debt"].debtor_id, pending_debt["debt"].payer_id, pending_debt["debt"].amount)
+            for pending_debt in pending_debts
+        )
+        transfers = [
+            Transfer(debtor_id=debtor_id, payer_id=payer_id, amount=amount)
+            for debtor_id, payer_id, amount in minimize_transfers(balances)
+        ]
+        
+        settlement = Settlement(
+            id=str(uuid.uuid4()),
+            channel_id=channel_id,
+            created_by=created_by,
+            created_at=datetime.now(),
+            transfers=transfers,
+            debt_keys=debt_keys
+        )
+        
+        self.store.add(settlement)
+        self._settle_debts(settlement)
+        
+        return settlement
+    
+    def get_settlement(self, settlement_id: str) -> Optional[Settlement]:
+        """Get a settlement plan by ID."""
+        return self.store.get(settlement_id)
+    
+    def get_active_settlement(self, channel_id: str) -> Optional[Settlement]:
+        """Get the settlement plan currently in effect for a channel."""
+        settlement = self.store.get_latest(channel_id)
+        return settlement if settlement and not settlement.is_settled else None
+    
+    def mark_transfer_as_paid(self, settlement_id: str, transfer_index: int) -> Optional[Settlement]:
+        """Mark a netted transfer as paid and return the updated plan.
+        
+        Every underlying debt of a debtor whose transfers are now all paid is
+        marked as paid at once, see Settlement.settled_debtors. Returns None
+        if the plan was replaced or the transfer was already paid.
+        """
+        settlement = self.get_settlement(settlement_id)
+        if not settlement or settlement.is_replaced:
+            return None
+        
+        if not 0 <= transfer_index < len(settlement.transfers):
+            return None
+        
+        if not self.store.mark_transfer_paid(settlement_id, transfer_index, datetime.now()):
+            return None
+        
+        # Reload, to see the transfers other workers marked as paid meanwhile
+        settlement = self.get_settlement(settlement_id)
+        self._settle_debts(settlement)
+        return settlement
+    
+    def _settle_debts(self, settlement: Settlement) -> List[DebtKey]:
+        """Mark the underlying debts of the settled debtors as paid."""
+        settled_debtors = settlement.settled_debtors()
+        keys = [key for key in settlement.debt_keys if key[1] in settled_debtors]
+        return self.expense_service.mark_debts_as_paid(keys)
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from slack_bolt.authorization import AuthorizeResult
+from slack_bolt.authorization.async_authorize import AsyncAuthorize
+from slack_sdk.web.async_client import AsyncWebClient
+
+logger = logging.getLogger(__name__)
+
+
+class SlackAuth(AsyncAuthorize):
+    """Verify the bot token with auth.test once, when first needed, and cache the result.
+
+    Nothing is called when the app starts, so it serves /health without
+    network access. The first verification is shared by everyone waiting
+    on it; a failed one is not cached, so the next caller tries again.
+
+    It is also Bolt's authorize function, answering every request from the
+    cached result instead of a call of its own.
+    """
+
+    def __init__(self, client: AsyncWebClient):
+        """Initialize without calling Slack."""
+        self.client = client
+        self.auth_test: Optional[Dict[str, Any]] = None
+        self.verified_at: Optional[float] = None
+        self._verifying: Optional[asyncio.Task] = None
+
+    @property
+    def verified(self) -> bool:
+        """Whether the token has been verified."""
+        return self.auth_test is not None
+
+    async def verify(self) -> Dict[str, Any]:
+        """Call auth.test unless it already succeeded, and return its response."""
+        if self.auth_test is not None:
+            return self.auth_test
+
+        if self._verifying is None:
+            self._verifying = asyncio.create_task(self._call_auth_test())
+        task = self._verifying
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done() and self._verifying is task:
+                self._verifying = None
+
+    async def verify_in_background(self, retry_interval: float = 5) -> None:
+        """Keep trying to verify the token until it succeeds, retry_interval seconds apart."""
+        while not self.verified:
+            try:
+                await self.verify()
+            except Exception as e:
+                logger.warning(f"Could not verify the Slack token, retrying in {retry_interval}s: {e}")
+                await asyncio.sleep(retry_interval)
+
+    async def __call__(self, *, user_id: Optional[str], **kwargs) -> AuthorizeResult:
+        """Authorize a request for the single workspace the token belongs to."""
+        auth_test = await self.verify()
+        return AuthorizeResult(
+            enterprise_id=auth_test.get("enterprise_id"),
+            team_id=auth_test.get("team_id"),
+            bot_id=auth_test.get("bot_id"),
+            bot_user_id=auth_test.get("user_id"),
+            bot_token=self.client.token,
+            user_id=user_id
+        )
+
+    async def _call_auth_test(self) -> Dict[str, Any]:
+        """Call auth.test and cache the response."""
+        response = await self.client.auth_test()
+        self.auth_test = response.data
+        self.verified_at = time.time()
+        logger.info(f"Verified the Slack token for team {self.auth_test.get('team_id')}")
+        return self.auth_test
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from slack_sdk.errors import SlackApiError
+
+from app.utils.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+SLACK_CALLS = Counter(
+    "splitbot_slack_api_calls_total",
+    "Slack Web API calls by method and outcome (ok, error or rate_limited)",
+    ["method", "outcome"]
+)
+SLACK_CALL_DURATION = Histogram(
+    "splitbot_slack_api_call_duration_seconds",
+    "Time waiting for Slack Web API responses",
+    ["method"]
+)
+
+# Sustained calls per minute and burst size for each Web API method, based on
+# Slack's published tiers. chat.postMessage is limited per channel rather than
+# per method, so it gets a generous workspace-wide budget.
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "chat_postMessage": (600, 20),
+    "chat_postEphemeral": (100, 10),
+    "chat_update": (50, 5),
+    "conversations_open": (50, 5),
+    "users_info": (100, 10),
+}
+FALLBACK_RATE_LIMIT: Tuple[float, int] = (50, 5)
+
+
+class TokenBucket:
+    """Token bucket limiting how often a Slack API method is called."""
+
+    def __init__(self, per_minute: float, burst: int):
+        """Initialize a full bucket."""
+        self.rate = per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for a while, e.g. after a 429 response."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SlackDelivery:
+    """Deliver Slack Web API calls concurrently within Slack's rate limits.
+
+    Calls share a concurrency cap and a token bucket per API method. A 429
+    response pauses the method's bucket for the Retry-After period and the
+    call is retried.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_concurrency: int = 10,
+        rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        max_retries: int = 3
+    ):
+        """Initialize the delivery engine around an async Web API client."""
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.rate_limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        self.max_retries = max_retries
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._semaphore = None
+
+    def _bucket(self, method: str) -> TokenBucket:
+        """Get the token bucket for an API method."""
+        bucket = self._buckets.get(method)
+        if bucket is None:
+            bucket = TokenBucket(*self.rate_limits.get(method, FALLBACK_RATE_LIMIT))
+            self._buckets[method] = bucket
+        return bucket
+
+    async def call(self, method: str, **kwargs) -> Any:
+        """Call a Web API method, e.g. call("chat_postMessage", channel=...)."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        bucket = self._bucket(method)
+        attempt = 0
+
+        while True:
+            await bucket.acquire()
+            try:
+                async with self._semaphore:
+                    with SLACK_CALL_DURATION.labels(method).time():
+                        response = await getattr(self.client, method)(**kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429:
+                    SLACK_CALLS.labels(method, "error").inc()
+                    raise
+
+                SLACK_CALLS.labels(method, "rate_limited").inc()
+                if attempt >= self.max_retries:
+                    raise
+
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+                logger.warning(f"Rate limited on {method}, retrying in {retry_after}s")
+                bucket.pause(retry_after)
+                attempt += 1
+                continue
+            except Exception:
+                SLACK_CALLS.labels(method, "error").inc()
+                raise
+
+            SLACK_CALLS.labels(method, "ok").inc()
+            return response
+
+    async def deliver_all(
+        self,
+        calls: Iterable[Tuple[str, Dict[str, Any]]],
+        on_progress: Optional[Callable[[Dict[str, int]], Awaitable[None]]] = None,
+        progress_interval: float = 2.0
+    ) -> List[bool]:
+        """Run many calls concurrently and return whether each one succeeded.
+
+        on_progress is awaited with sent/failed/total counts at most once per
+        progress_interval seconds while calls are in flight. An error it
+        raises is logged and does not stop the delivery.
+        """
+        calls = list(calls)
+        progress = {"sent": 0, "failed": 0, "total": len(calls)}
+        last_report = time.monotonic()
+
+        async def deliver(method: str, kwargs: Dict[str, Any]) -> bool:
+            nonlocal last_report
+            try:
+                response = await self.call(method, **kwargs)
+                ok = bool(response["ok"])
+            except Exception as e:
+                logger.error(f"Error calling {method}: {e}")
+                ok = False
+
+            progress["sent" if ok else "failed"] += 1
+
+            now = time.monotonic()
+            if on_progress and now - last_report >= progress_interval:
+                last_report = now
+                try:
+                    await on_progress(dict(progress))
+                except Exception as e:
+                    logger.warning(f"Error reporting delivery progress: {e}")
+
+            return ok
+
+        return list(await asyncio.gather(*(deliver(method, kwargs) for method, kwargs in calls)))
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from app.services.slack_delivery import SlackDelivery
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SlackDirectory:
+    """Cache users' DM channel IDs and profiles, looked up through the Web API.
+
+    Messages to a user are sent to their DM channel, opened once with
+    conversations.open, instead of to their user ID, which Slack resolves
+    to the channel again on every call. Profiles come from users.info and
+    carry e.g. the user's time zone and display name.
+
+    Handlers never wait on a lookup: channel_for falls back to the user ID
+    and opens the channel in the background, and the attendees of a new
+    expense are prefetched in bulk, so later messages find them cached.
+    """
+
+    def __init__(
+        self,
+        delivery: SlackDelivery,
+        channel_ttl: float = 24 * 3600,
+        profile_ttl: float = 3600,
+        max_size: int = 10000
+    ):
+        """Initialize empty caches; DM channel IDs rarely change, profiles more often."""
+        self.delivery = delivery
+        self.channels = TTLCache(channel_ttl, max_size, name="dm_channels")
+        self.profiles = TTLCache(profile_ttl, max_size, name="user_profiles")
+        self._in_flight: Dict[tuple, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    def channel_for(self, user_id: str) -> str:
+        """The channel to DM a user in, without waiting on Slack.
+
+        Falls back to the user ID, and opens the DM channel in the background
+        so the next message to the user finds it.
+        """
+        channel = self.channels.get(user_id)
+        if channel is None:
+            self.prefetch_in_background([user_id], profiles=False)
+            return user_id
+        return channel
+
+    async def dm_channel(self, user_id: str) -> str:
+        """The channel to DM a user in, opening it if it is not cached.
+
+        Falls back to the user ID if the channel cannot be opened.
+        """
+        channel = self.channels.get(user_id)
+        if channel is None:
+            channel = await self._lookup(self.channels, "conversations_open", user_id, self._open_channel)
+        return channel or user_id
+
+    async def user_info(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """A user's users.info profile, or None if it cannot be fetched."""
+        profile = self.profiles.get(user_id)
+        if profile is None:
+            profile = await self._lookup(self.profiles, "users_info", user_id, self._fetch_profile)
+        return profile
+
+    async def prefetch(self, user_ids: Iterable[str], profiles: bool = True) -> None:
+        """Look up the DM channels, and the profiles, of many users concurrently.
+
+        Users already cached are skipped; failed lookups are left for later.
+        """
+        lookups = []
+        for user_id in dict.fromkeys(user_ids):
+            if user_id not in self.channels:
+                lookups.append(self._lookup(self.channels, "conversations_open", user_id, self._open_channel))
+            if profiles and user_id not in self.profiles:
+                lookups.append(self._lookup(self.profiles, "users_info", user_id, self._fetch_profile))
+
+        if lookups:
+            await asyncio.gather(*lookups)
+
+    def prefetch_in_background(self, user_ids: Iterable[str], profiles: bool = True) -> Optional[asyncio.Task]:
+        """Start a prefetch without waiting for it, unless every user is cached already."""
+        user_ids = [
+            user_id for user_id in user_ids
+            if user_id not in self.channels or (profiles and user_id not in self.profiles)
+        ]
+        if not user_ids:
+            return None
+
+        task = asyncio.create_task(self.prefetch(user_ids, profiles))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def drain(self) -> None:
+        """Wait for every background prefetch to finish."""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    async def _lookup(
+        self,
+        cache: TTLCache,
+        method: str,
+        user_id: str,
+        fetch: Callable[[str], Awaitable[Any]]
+    ) -> Optional[Any]:
+        """Fetch a value into the cache, sharing the call with concurrent lookups of the same user."""
+        key = (method, user_id)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(cache, method, user_id, fetch))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await task
+
+    async def _fetch(
+        self,
+        cache: TTLCache,
+        method: str,
+        user_id: str,
+        fetch: Callable[[str], Awaitable[Any]]
+    ) -> Optional[Any]:
+        """Call Slack for one value and cache it; failures are logged and not cached."""
+        try:
+            value = await fetch(user_id)
+        except Exception as e:
+            logger.warning(f"Error calling {method} for {user_id}: {e}")
+            return None
+
+        cache.set(user_id, value)
+        return value
+
+    async def _open_channel(self, user_id: str) -> str:
+        """Open (or find) the DM channel with a user."""
+        response = await self.delivery.call("conversations_open", users=user_id)
+        return response["channel"]["id"]
+
+    async def _fetch_profile(self, user_id: str) -> Dict[str, Any]:
+        """Fetch a user's profile."""
+        response = await self.delivery.call("users_info", user=user_id)
+        return response["user"]
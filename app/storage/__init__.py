@@ -0,0 +1 @@
+"""Storage backends for the SplitBot application."""
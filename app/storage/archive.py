@@ -0,0 +1,213 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.models.expense import Expense
+from app.storage.base import debt_row
+from app.utils.metrics import Gauge
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX: appends are only serialized within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_EXPENSES = Gauge("splitbot_archived_expenses", "Settled expenses moved to the archive")
+
+MAGIC = b"SPLTARC1"
+# Each record is a header, the expense ID and the zlib-compressed JSON of the expense.
+# The header holds the ID and body lengths, the number of debts, a CRC32 of the body
+# and the expense's created_at as seconds, so the index can be rebuilt, and exports
+# ordered and filtered by date, without decompressing anything.
+RECORD_HEADER = struct.Struct("<HHIId")
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _created_seconds(created_at: datetime) -> float:
+    """created_at as seconds, comparable across naive datetimes without a time zone lookup."""
+    if created_at.tzinfo is not None:
+        return created_at.timestamp()
+    return (created_at - EPOCH).total_seconds()
+
+
+class ExpenseArchive:
+    """Append-only file of settled expenses, read through a memory map.
+
+    Records are only ever appended, and the index of expense ID to record
+    offset lives in memory, built by scanning the record headers when the
+    file is opened. Several processes can append to the same file; each
+    one indexes the others' records the first time it misses an ID after
+    the file grew. A record torn by a crash mid-append is cut off when the
+    file is next opened.
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the archive at the given path and index its records."""
+        self.path = path
+        self._lock = threading.RLock()
+        # ID -> (offset of the body, body length, created_at seconds, number of debts)
+        self._index: Dict[str, Tuple[int, int, float, int]] = {}
+        self.settled_debts = 0
+
+        self._file = open(path, "a+b")
+        with self._exclusive():
+            self._file.seek(0, os.SEEK_END)
+            if self._file.tell() == 0:
+                self._file.write(MAGIC)
+                self._file.flush()
+
+            self._file.seek(0)
+            if self._file.read(len(MAGIC)) != MAGIC:
+                self._file.close()
+                raise ValueError(f"{path} is not an expense archive")
+
+            self._indexed_size = len(MAGIC)
+            self._map: Optional[mmap.mmap] = None
+            self._refresh()
+            size = os.fstat(self._file.fileno()).st_size
+            if size > self._indexed_size:
+                logger.warning(f"Truncating {size - self._indexed_size} bytes of a torn record in {path}")
+                self._file.truncate(self._indexed_size)
+                if self._map is not None:
+                    self._map.close()
+                    self._map = mmap.mmap(self._file.fileno(), self._indexed_size, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, expense_id: str) -> bool:
+        """Whether an expense is archived, as far as this process has indexed."""
+        return expense_id in self._index
+
+    def append(self, expenses: List[Expense]) -> None:
+        """Append expenses to the archive, written and indexed together."""
+        records = []
+        for expense in expenses:
+            expense_id = expense.id.encode()
+            body = zlib.compress(expense.model_dump_json().encode())
+            header = RECORD_HEADER.pack(
+                len(expense_id), len(expense.debts), len(body), zlib.crc32(body),
+                _created_seconds(expense.created_at)
+            )
+            records.append(header + expense_id + body)
+
+        with self._exclusive():
+            # Index the records other processes appended first, so ours are read at the right offsets
+            self._refresh()
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(b"".join(records))
+            self._file.flush()
+            self._refresh()
+
+    def get(self, expense_id: str) -> Optional[Expense]:
+        """Read an archived expense, or None if it is not archived."""
+        with self._lock:
+            entry = self._index.get(expense_id)
+            if entry is None and self._refresh():
+                entry = self._index.get(expense_id)
+            if entry is None:
+                return None
+
+            offset, length, _, _ = entry
+            body = self._map[offset:offset + length]
+
+        return Expense.model_validate(json.loads(zlib.decompress(body)))
+
+    def iter_expenses(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[Expense]:
+        """Iterate over the archived expenses, oldest first.
+
+        since and until bound created_at; since is inclusive and until
+        exclusive. Only the expenses in range are decompressed.
+        """
+        low = _created_seconds(since) if since is not None else float("-inf")
+        high = _created_seconds(until) if until is not None else float("inf")
+        with self._lock:
+            self._refresh()
+            entries = sorted(
+                (created, expense_id) for expense_id, (_, _, created, _) in self._index.items()
+                if low <= created < high
+            )
+
+        for _, expense_id in entries:
+            expense = self.get(expense_id)
+            if expense is not None:
+                yield expense
+
+    def iter_debt_rows(
+        self,
+        channel_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over the archived debts matching the filters as debt_row rows, oldest expense first."""
+        for expense in self.iter_expenses(since, until):
+            if channel_id is not None and expense.channel_id != channel_id:
+                continue
+            for debt in expense.debts:
+                yield debt_row(expense, debt)
+
+    def close(self) -> None:
+        """Unmap and close the file."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+
+    def _refresh(self) -> bool:
+        """Index the complete records appended since the last scan and return whether there were any.
+
+        The file is remapped to cover them.
+        """
+        with self._lock:
+            size = os.fstat(self._file.fileno()).st_size
+            if size <= self._indexed_size or (self._map is not None and size == len(self._map)):
+                return False  # Nothing new, or only the same incomplete record as last time
+
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+
+            offset = self._indexed_size
+            while offset + RECORD_HEADER.size <= size:
+                id_length, debt_count, length, crc, created = RECORD_HEADER.unpack_from(self._map, offset)
+                body_offset = offset + RECORD_HEADER.size + id_length
+                if body_offset + length > size or zlib.crc32(self._map[body_offset:body_offset + length]) != crc:
+                    break  # Torn, or still being written by another process
+
+                expense_id = self._map[offset + RECORD_HEADER.size:body_offset].decode()
+                previous = self._index.get(expense_id)
+                if previous is not None:
+                    self.settled_debts -= previous[3]
+                self._index[expense_id] = (body_offset, length, created, debt_count)
+                self.settled_debts += debt_count
+                offset = body_offset + length
+
+            indexed = offset > self._indexed_size
+            self._indexed_size = offset
+            return indexed
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Hold the lock, and an flock on the file against other processes, e.g. while appending."""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
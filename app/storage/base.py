@@ -0,0 +1,125 @@
+import itertools
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.models.expense import Debt, Expense
+
+
+def debt_row(expense: Expense, debt: Debt) -> Dict[str, Any]:
+    """Flatten a debt and the expense it belongs to into one ledger row."""
+    return {
+        "expense_id": expense.id,
+        "created_at": expense.created_at,
+        "channel_id": expense.channel_id,
+        "description": expense.description,
+        "created_by": expense.created_by,
+        "total_amount": expense.total_amount,
+        "debtor_id": debt.debtor_id,
+        "payer_id": debt.payer_id,
+        "amount": debt.amount,
+        "is_paid": debt.is_paid,
+        "paid_timestamp": debt.paid_timestamp
+    }
+
+
+class ExpenseStore(ABC):
+    """Interface for persisting expenses and their debts."""
+    
+    @abstractmethod
+    def save_expense(self, expense: Expense) -> None:
+        """Persist a new expense together with its debts."""
+    
+    def save_expenses(self, expenses: List[Expense]) -> None:
+        """Persist many new expenses with their debts, committed together."""
+        for expense in expenses:
+            self.save_expense(expense)
+    
+    @abstractmethod
+    def load_expense(self, expense_id: str) -> Optional[Expense]:
+        """Load an expense by ID."""
+    
+    @abstractmethod
+    def iter_expenses(self) -> Iterator[Expense]:
+        """Iterate over every stored expense."""
+    
+    @abstractmethod
+    def iter_pending_expenses(self) -> Iterator[Expense]:
+        """Iterate over the expenses that still have at least one unpaid debt."""
+    
+    def iter_settled_expenses(self, limit: Optional[int] = None) -> Iterator[Expense]:
+        """Iterate over the expenses whose debts are all paid, oldest first, at most limit of them."""
+        settled = (
+            expense for expense in sorted(self.iter_expenses(), key=lambda expense: expense.created_at)
+            if all(debt.is_paid for debt in expense.debts)
+        )
+        return itertools.islice(settled, limit)
+    
+    @abstractmethod
+    def delete_expense(self, expense_id: str) -> None:
+        """Remove an expense and its debts, e.g. once it has been archived."""
+    
+    def iter_debt_rows(
+        self,
+        channel_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        is_paid: Optional[bool] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over the debts matching the filters as debt_row rows, oldest expense first.
+        
+        since and until bound the expenses' created_at; since is inclusive
+        and until exclusive.
+        """
+        for expense in sorted(self.iter_expenses(), key=lambda expense: expense.created_at):
+            if channel_id is not None and expense.channel_id != channel_id:
+                continue
+            if (since is not None and expense.created_at < since) or (until is not None and expense.created_at >= until):
+                continue
+            for debt in expense.debts:
+                if is_paid is None or debt.is_paid == is_paid:
+                    yield debt_row(expense, debt)
+    
+    @abstractmethod
+    def mark_debt_paid(
+        self, expense_id: str, debtor_id: str, payer_id: str, paid_timestamp: datetime
+    ) -> None:
+        """Persist that a debt has been paid."""
+    
+    @abstractmethod
+    def update_reminder_timestamp(
+        self, expense_id: str, debtor_id: str, payer_id: str, sent_at: datetime
+    ) -> None:
+        """Persist when the last reminder for a debt was sent."""
+    
+    def update_reminder_timestamps(
+        self, keys: List[Tuple[str, str, str]], sent_at: datetime
+    ) -> None:
+        """Persist the same reminder time for many (expense_id, debtor_id, payer_id) debts."""
+        for expense_id, debtor_id, payer_id in keys:
+            self.update_reminder_timestamp(expense_id, debtor_id, payer_id, sent_at)
+    
+    def set_summary_ts(self, expense_id: str, summary_ts: str) -> None:
+        """Persist the ts of the channel message summarizing an expense."""
+    
+    def count_debts(self) -> Dict[str, int]:
+        """Count the stored debts that are still open and those that are settled."""
+        counts = {"open": 0, "settled": 0}
+        for expense in self.iter_expenses():
+            for debt in expense.debts:
+                counts["settled" if debt.is_paid else "open"] += 1
+        return counts
+    
+    def external_changes(self) -> Optional[Set[str]]:
+        """The IDs of the expenses other processes changed since the last check.
+        
+        None means the store cannot tell which, so everything must be reloaded.
+        """
+        return set()
+    
+    def flush(self) -> None:
+        """Write any buffered changes."""
+    
+    def close(self) -> None:
+        """Flush buffered changes and release any resources."""
+        self.flush()
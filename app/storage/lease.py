@@ -0,0 +1,67 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Take the lease if it is free, expired or already ours, in one atomic statement
+ACQUIRE_LEASE = """
+INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+"""
+SELECT_HOLDER = "SELECT holder FROM leases WHERE name = ?"
+RELEASE_LEASE = "DELETE FROM leases WHERE name = ? AND holder = ?"
+
+
+class SQLiteLease:
+    """A named lease that at most one process holds at a time, kept in SQLite.
+
+    The holder renews the lease by acquiring it again before ttl seconds
+    pass. If the holder dies, the lease expires and the next process to
+    acquire it takes over.
+    """
+
+    def __init__(self, path: str, name: str, ttl: float = 30.0, holder: Optional[str] = None):
+        """Open (or create) the leases table in the database at the given path."""
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+
+    def acquire(self) -> bool:
+        """Take or renew the lease, returning whether this process now holds it."""
+        now = time.time()
+        with self._lock:
+            self.connection.execute(ACQUIRE_LEASE, (self.name, self.holder, now + self.ttl, now))
+            row = self.connection.execute(SELECT_HOLDER, (self.name,)).fetchone()
+        return row is not None and row[0] == self.holder
+
+    def release(self) -> None:
+        """Give up the lease if this process holds it, so another can take over at once."""
+        with self._lock:
+            self.connection.execute(RELEASE_LEASE, (self.name, self.holder))
+
+    def close(self) -> None:
+        """Release the lease and close the database."""
+        self.release()
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from app.models.expense import Expense
+from app.storage.base import ExpenseStore
+
+
+class InMemoryExpenseStore(ExpenseStore):
+    """Expense store that keeps everything in the process heap.
+    
+    The expense objects are shared with ExpenseService, so debt updates are
+    already applied by the time the store is told about them.
+    """
+    
+    def __init__(self):
+        """Initialize an empty store."""
+        self.expenses: Dict[str, Expense] = {}
+    
+    def save_expense(self, expense: Expense) -> None:
+        """Persist a new expense together with its debts."""
+        self.expenses[expense.id] = expense
+    
+    def load_expense(self, expense_id: str) -> Optional[Expense]:
+        """Load an expense by ID."""
+        return self.expenses.get(expense_id)
+    
+    def iter_expenses(self) -> Iterator[Expense]:
+        """Iterate over every stored expense."""
+        return iter(list(self.expenses.values()))
+    
+    def iter_pending_expenses(self) -> Iterator[Expense]:
+        """Iterate over the expenses that still have at least one unpaid debt."""
+        return (
+            expense for expense in self.iter_expenses()
+            if any(not debt.is_paid for debt in expense.debts)
+        )
+    
+    def delete_expense(self, expense_id: str) -> None:
+        """Remove an expense and its debts, e.g. once it has been archived."""
+        self.expenses.pop(expense_id, None)
+    
+    def mark_debt_paid(
+        self, expense_id: str, debtor_id: str, payer_id: str, paid_timestamp: datetime
+    ) -> None:
+        """Persist that a debt has been paid."""
+    
+    def update_reminder_timestamp(
+        self, expense_id: str, debtor_id: str, payer_id: str, sent_at: datetime
+    ) -> None:
+        """Persist when the last reminder for a debt was sent."""
@@ -0,0 +1,311 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxMessage:
+    """A queued Slack Web API call, e.g. method "chat_postMessage" and its kwargs."""
+
+    __slots__ = ("id", "method", "kwargs", "callback", "context", "attempts")
+
+    def __init__(
+        self,
+        id: int,
+        method: str,
+        kwargs: Dict[str, Any],
+        callback: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+        attempts: int = 0
+    ):
+        self.id = id
+        self.method = method
+        self.kwargs = kwargs
+        self.callback = callback
+        self.context = context or {}
+        self.attempts = attempts
+
+    @property
+    def channel(self) -> str:
+        """The channel the call goes to, which messages are ordered by."""
+        return self.kwargs.get("channel", "")
+
+    def __repr__(self) -> str:
+        return f"OutboxMessage(id={self.id}, method={self.method!r}, channel={self.channel!r})"
+
+
+class Outbox(ABC):
+    """Queue of outgoing Slack calls, written before a handler returns.
+
+    Messages to the same channel are delivered in the order they were
+    queued: only the oldest unfinished message of a channel can be claimed.
+    A claim is a lease, so messages claimed by a worker that died are
+    handed out again once the lease runs out.
+    """
+
+    @abstractmethod
+    def enqueue(
+        self,
+        method: str,
+        kwargs: Dict[str, Any],
+        callback: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Queue a call and return its message ID."""
+
+    @abstractmethod
+    def claim(self, worker_id: str, limit: int, lease: float) -> List[OutboxMessage]:
+        """Claim up to limit messages that are due, at most one per channel."""
+
+    @abstractmethod
+    def complete(self, message_id: int) -> None:
+        """Remove a message that was delivered."""
+
+    @abstractmethod
+    def retry(self, message_id: int, delay: float, error: str) -> None:
+        """Release a message so it is tried again after delay seconds."""
+
+    @abstractmethod
+    def fail(self, message_id: int, error: str) -> None:
+        """Give up on a message, letting the next message of its channel go."""
+
+    @abstractmethod
+    def release(self, worker_id: str) -> None:
+        """Release every message claimed by a worker, e.g. when it shuts down."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Get the number of messages waiting to be delivered."""
+
+    def close(self) -> None:
+        """Release any resources."""
+
+
+class InMemoryOutbox(Outbox):
+    """Outbox kept in the process heap, for when no database is configured."""
+
+    def __init__(self):
+        """Initialize an empty outbox."""
+        self._messages: Dict[int, Dict[str, Any]] = {}  # Insertion-ordered by ID
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def enqueue(
+        self,
+        method: str,
+        kwargs: Dict[str, Any],
+        callback: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Queue a call and return its message ID."""
+        with self._lock:
+            message_id = self._next_id
+            self._next_id += 1
+            self._messages[message_id] = {
+                "message": OutboxMessage(message_id, method, kwargs, callback, context),
+                "next_attempt_at": 0.0,
+                "claimed_by": None,
+                "claimed_until": 0.0
+            }
+            return message_id
+
+    def claim(self, worker_id: str, limit: int, lease: float) -> List[OutboxMessage]:
+        """Claim up to limit messages that are due, at most one per channel."""
+        now = time.time()
+        claimed = []
+        seen_channels = set()
+
+        with self._lock:
+            for entry in self._messages.values():
+                channel = entry["message"].channel
+                if channel in seen_channels:
+                    continue
+                seen_channels.add(channel)
+
+                if entry["next_attempt_at"] <= now and entry["claimed_until"] <= now:
+                    entry["claimed_by"] = worker_id
+                    entry["claimed_until"] = now + lease
+                    claimed.append(entry["message"])
+                    if len(claimed) >= limit:
+                        break
+
+        return claimed
+
+    def complete(self, message_id: int) -> None:
+        """Remove a message that was delivered."""
+        with self._lock:
+            self._messages.pop(message_id, None)
+
+    def retry(self, message_id: int, delay: float, error: str) -> None:
+        """Release a message so it is tried again after delay seconds."""
+        with self._lock:
+            entry = self._messages.get(message_id)
+            if entry:
+                entry["message"].attempts += 1
+                entry["next_attempt_at"] = time.time() + delay
+                entry["claimed_by"] = None
+                entry["claimed_until"] = 0.0
+
+    def fail(self, message_id: int, error: str) -> None:
+        """Give up on a message, letting the next message of its channel go."""
+        self.complete(message_id)
+
+    def release(self, worker_id: str) -> None:
+        """Release every message claimed by a worker, e.g. when it shuts down."""
+        with self._lock:
+            for entry in self._messages.values():
+                if entry["claimed_by"] == worker_id:
+                    entry["claimed_by"] = None
+                    entry["claimed_until"] = 0.0
+
+    def count(self) -> int:
+        """Get the number of messages waiting to be delivered."""
+        return len(self._messages)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    method TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    callback TEXT,
+    context TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_channel ON outbox (failed, channel, id);
+"""
+
+INSERT_MESSAGE = """
+INSERT INTO outbox (channel, method, kwargs, callback, context)
+VALUES (?, ?, ?, ?, ?)
+"""
+# The oldest unfinished message of each channel, if it is due and not claimed
+SELECT_CLAIMABLE = """
+SELECT outbox.* FROM outbox
+JOIN (SELECT MIN(id) AS id FROM outbox WHERE failed = 0 GROUP BY channel) AS heads
+    ON outbox.id = heads.id
+WHERE outbox.next_attempt_at <= ? AND outbox.claimed_until <= ?
+ORDER BY outbox.id
+LIMIT ?
+"""
+CLAIM_MESSAGE = "UPDATE outbox SET claimed_by = ?, claimed_until = ? WHERE id = ?"
+DELETE_MESSAGE = "DELETE FROM outbox WHERE id = ?"
+RETRY_MESSAGE = """
+UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?,
+    claimed_by = NULL, claimed_until = 0
+WHERE id = ?
+"""
+FAIL_MESSAGE = """
+UPDATE outbox SET failed = 1, last_error = ?, claimed_by = NULL, claimed_until = 0
+WHERE id = ?
+"""
+RELEASE_MESSAGES = "UPDATE outbox SET claimed_by = NULL, claimed_until = 0 WHERE claimed_by = ?"
+COUNT_MESSAGES = "SELECT COUNT(*) FROM outbox WHERE failed = 0"
+
+
+class SQLiteOutbox(Outbox):
+    """Outbox in a SQLite table, shared by every process using the database.
+
+    Messages that were given up on are kept with failed = 1 and their last
+    error, for inspection.
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the outbox table in the database at the given path."""
+        self.path = path
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+
+    def enqueue(
+        self,
+        method: str,
+        kwargs: Dict[str, Any],
+        callback: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Queue a call and return its message ID."""
+        with self._lock:
+            cursor = self.connection.execute(INSERT_MESSAGE, (
+                kwargs.get("channel", ""),
+                method,
+                json.dumps(kwargs),
+                callback,
+                json.dumps(context) if context else None
+            ))
+            return cursor.lastrowid
+
+    def claim(self, worker_id: str, limit: int, lease: float) -> List[OutboxMessage]:
+        """Claim up to limit messages that are due, at most one per channel."""
+        now = time.time()
+
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock first, so two processes never claim the same row
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.connection.execute(SELECT_CLAIMABLE, (now, now, limit)).fetchall()
+                self.connection.executemany(
+                    CLAIM_MESSAGE, [(worker_id, now + lease, row["id"]) for row in rows]
+                )
+                self.connection.execute("COMMIT")
+            except sqlite3.Error:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        return [
+            OutboxMessage(
+                id=row["id"],
+                method=row["method"],
+                kwargs=json.loads(row["kwargs"]),
+                callback=row["callback"],
+                context=json.loads(row["context"]) if row["context"] else None,
+                attempts=row["attempts"]
+            )
+            for row in rows
+        ]
+
+    def complete(self, message_id: int) -> None:
+        """Remove a message that was delivered."""
+        with self._lock:
+            self.connection.execute(DELETE_MESSAGE, (message_id,))
+
+    def retry(self, message_id: int, delay: float, error: str) -> None:
+        """Release a message so it is tried again after delay seconds."""
+        with self._lock:
+            self.connection.execute(RETRY_MESSAGE, (time.time() + delay, error, message_id))
+
+    def fail(self, message_id: int, error: str) -> None:
+        """Give up on a message, letting the next message of its channel go."""
+        with self._lock:
+            self.connection.execute(FAIL_MESSAGE, (error, message_id))
+
+    def release(self, worker_id: str) -> None:
+        """Release every message claimed by a worker, e.g. when it shuts down."""
+        with self._lock:
+            self.connection.execute(RELEASE_MESSAGES, (worker_id,))
+
+    def count(self) -> int:
+        """Get the number of messages waiting to be delivered."""
+        with self._lock:
+            return self.connection.execute(COUNT_MESSAGES).fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS request_keys (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_request_keys_expires_at ON request_keys (expires_at);
+"""
+
+DELETE_EXPIRED_KEYS = "DELETE FROM request_keys WHERE expires_at <= ?"
+# Inserts nothing when another worker already recorded the key
+INSERT_KEY = "INSERT OR IGNORE INTO request_keys (key, expires_at) VALUES (?, ?)"
+
+
+class SQLiteRequestKeys:
+    """Keys of the Slack requests already handled, kept in SQLite for every worker to check.
+
+    Slack sends a retry to whichever worker the load balancer picks, so
+    the keys a worker records have to be seen by the others.
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the request_keys table in the database at the given path."""
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+
+    def claim(self, keys: List[Tuple[str, float]]) -> Optional[str]:
+        """Record (key, ttl) pairs, unless one is already recorded and not expired.
+
+        Returns the first key already recorded, in which case none are
+        recorded, or None when the request is new.
+        """
+        now = time.time()
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.execute(DELETE_EXPIRED_KEYS, (now,))
+                for key, ttl in keys:
+                    if self.connection.execute(INSERT_KEY, (key, now + ttl)).rowcount == 0:
+                        self.connection.execute("ROLLBACK")
+                        return key
+            except sqlite3.Error:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+        return None
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self.connection.close()
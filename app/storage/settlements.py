@@ -0,0 +1,203 @@
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.models.settlement import Settlement, Transfer
+
+
+class SettlementStore(ABC):
+    """Storage for settlement plans.
+
+    Each channel has at most one plan in effect: adding a plan replaces the
+    channel's previous one. Marking a transfer as paid is atomic, so when
+    two clicks on the same button race only one of them wins.
+    """
+
+    @abstractmethod
+    def add(self, settlement: Settlement) -> None:
+        """Store a new plan, replacing the channel's previous one."""
+
+    @abstractmethod
+    def get(self, settlement_id: str) -> Optional[Settlement]:
+        """Load a plan by ID, with the transfers paid so far."""
+
+    @abstractmethod
+    def get_latest(self, channel_id: str) -> Optional[Settlement]:
+        """Load the channel's plan that has not been replaced, if any."""
+
+    @abstractmethod
+    def mark_transfer_paid(self, settlement_id: str, transfer_index: int, paid_timestamp: datetime) -> bool:
+        """Mark a transfer of a plan in effect as paid, returning False if it already was."""
+
+    def close(self) -> None:
+        """Release any resources."""
+
+
+class InMemorySettlementStore(SettlementStore):
+    """Settlement plans kept in the process heap, for when no database is configured."""
+
+    def __init__(self):
+        """Initialize an empty store."""
+        self._settlements: Dict[str, Settlement] = {}
+        self._latest_by_channel: Dict[str, str] = {}
+
+    def add(self, settlement: Settlement) -> None:
+        """Store a new plan, replacing the channel's previous one."""
+        previous = self.get_latest(settlement.channel_id)
+        if previous:
+            previous.is_replaced = True
+        self._settlements[settlement.id] = settlement
+        self._latest_by_channel[settlement.channel_id] = settlement.id
+
+    def get(self, settlement_id: str) -> Optional[Settlement]:
+        """Load a plan by ID, with the transfers paid so far."""
+        return self._settlements.get(settlement_id)
+
+    def get_latest(self, channel_id: str) -> Optional[Settlement]:
+        """Load the channel's plan that has not been replaced, if any."""
+        settlement_id = self._latest_by_channel.get(channel_id)
+        return self._settlements.get(settlement_id) if settlement_id else None
+
+    def mark_transfer_paid(self, settlement_id: str, transfer_index: int, paid_timestamp: datetime) -> bool:
+        """Mark a transfer of a plan in effect as paid, returning False if it already was."""
+        settlement = self._settlements.get(settlement_id)
+        if settlement is None or settlement.is_replaced:
+            return False
+        transfer = settlement.transfers[transfer_index]
+        if transfer.is_paid:
+            return False
+        transfer.is_paid = True
+        transfer.paid_timestamp = paid_timestamp
+        return True
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settlements (
+    id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    created_by TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    debt_keys TEXT NOT NULL,
+    is_replaced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_settlements_channel ON settlements (channel_id, is_replaced);
+CREATE TABLE IF NOT EXISTS settlement_transfers (
+    settlement_id TEXT NOT NULL REFERENCES settlements (id),
+    position INTEGER NOT NULL,
+    debtor_id TEXT NOT NULL,
+    payer_id TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    is_paid INTEGER NOT NULL DEFAULT 0,
+    paid_timestamp TEXT,
+    PRIMARY KEY (settlement_id, position)
+);
+"""
+
+REPLACE_SETTLEMENTS = "UPDATE settlements SET is_replaced = 1 WHERE channel_id = ? AND is_replaced = 0"
+INSERT_SETTLEMENT = """
+INSERT INTO settlements (id, channel_id, created_by, created_at, debt_keys)
+VALUES (?, ?, ?, ?, ?)
+"""
+INSERT_TRANSFER = """
+INSERT INTO settlement_transfers (settlement_id, position, debtor_id, payer_id, amount)
+VALUES (?, ?, ?, ?, ?)
+"""
+SELECT_SETTLEMENT = "SELECT * FROM settlements WHERE id = ?"
+SELECT_LATEST_SETTLEMENT = "SELECT * FROM settlements WHERE channel_id = ? AND is_replaced = 0"
+SELECT_TRANSFERS = "SELECT * FROM settlement_transfers WHERE settlement_id = ? ORDER BY position"
+# Only the first click on a transfer of a plan in effect updates a row
+MARK_TRANSFER_PAID = """
+UPDATE settlement_transfers SET is_paid = 1, paid_timestamp = ?
+WHERE settlement_id = ? AND position = ? AND is_paid = 0
+AND settlement_id IN (SELECT id FROM settlements WHERE id = ? AND is_replaced = 0)
+"""
+
+
+class SQLiteSettlementStore(SettlementStore):
+    """Settlement plans kept in SQLite, so every worker sharing the database can act on them.
+
+    Plans are read from the database on every lookup, so a worker sees the
+    transfers other workers marked as paid.
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the settlement tables in the database at the given path."""
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+
+    def add(self, settlement: Settlement) -> None:
+        """Store a new plan, replacing the channel's previous one."""
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.execute(REPLACE_SETTLEMENTS, (settlement.channel_id,))
+                self.connection.execute(INSERT_SETTLEMENT, (
+                    settlement.id,
+                    settlement.channel_id,
+                    settlement.created_by,
+                    settlement.created_at.isoformat(),
+                    json.dumps(settlement.debt_keys)
+                ))
+                self.connection.executemany(INSERT_TRANSFER, [
+                    (settlement.id, position, transfer.debtor_id, transfer.payer_id, transfer.amount)
+                    for position, transfer in enumerate(settlement.transfers)
+                ])
+            except sqlite3.Error:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def get(self, settlement_id: str) -> Optional[Settlement]:
+        """Load a plan by ID, with the transfers paid so far."""
+        with self._lock:
+            row = self.connection.execute(SELECT_SETTLEMENT, (settlement_id,)).fetchone()
+            return self._build_settlement(row) if row else None
+
+    def get_latest(self, channel_id: str) -> Optional[Settlement]:
+        """Load the channel's plan that has not been replaced, if any."""
+        with self._lock:
+            row = self.connection.execute(SELECT_LATEST_SETTLEMENT, (channel_id,)).fetchone()
+            return self._build_settlement(row) if row else None
+
+    def mark_transfer_paid(self, settlement_id: str, transfer_index: int, paid_timestamp: datetime) -> bool:
+        """Mark a transfer of a plan in effect as paid, returning False if it already was."""
+        with self._lock:
+            cursor = self.connection.execute(MARK_TRANSFER_PAID, (
+                paid_timestamp.isoformat(), settlement_id, transfer_index, settlement_id
+            ))
+            return cursor.rowcount == 1
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self.connection.close()
+
+    def _build_settlement(self, row: sqlite3.Row) -> Settlement:
+        """Build a Settlement and its transfers from a database row."""
+        transfers = [
+            Transfer(
+                debtor_id=transfer["debtor_id"],
+                payer_id=transfer["payer_id"],
+                amount=transfer["amount"],
+                is_paid=bool(transfer["is_paid"]),
+                paid_timestamp=datetime.fromisoformat(transfer["paid_timestamp"]) if transfer["paid_timestamp"] else None
+            )
+            for transfer in self.connection.execute(SELECT_TRANSFERS, (row["id"],))
+        ]
+        return Settlement(
+            id=row["id"],
+            channel_id=row["channel_id"],
+            created_by=row["created_by"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            transfers=transfers,
+            debt_keys=[tuple(key) for key in json.loads(row["debt_keys"])],
+            is_replaced=bool(row["is_replaced"])
+        )
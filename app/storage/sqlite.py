@@ -0,0 +1,506 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.models.expense import Expense, Payment, Debt
+from app.storage.base import ExpenseStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id TEXT PRIMARY KEY,
+    total_amount INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    created_by TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    attendees TEXT NOT NULL,
+    payers TEXT NOT NULL,
+    summary_ts TEXT
+);
+CREATE TABLE IF NOT EXISTS debts (
+    expense_id TEXT NOT NULL REFERENCES expenses (id),
+    debtor_id TEXT NOT NULL,
+    payer_id TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    is_paid INTEGER NOT NULL DEFAULT 0,
+    paid_timestamp TEXT,
+    last_reminder_sent TEXT,
+    PRIMARY KEY (expense_id, debtor_id, payer_id)
+);
+CREATE INDEX IF NOT EXISTS idx_debts_debtor ON debts (debtor_id);
+CREATE INDEX IF NOT EXISTS idx_debts_payer ON debts (payer_id);
+CREATE INDEX IF NOT EXISTS idx_debts_is_paid ON debts (is_paid, expense_id);
+CREATE INDEX IF NOT EXISTS idx_expenses_created_at ON expenses (created_at);
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version (id, version) VALUES (0, 0);
+CREATE TABLE IF NOT EXISTS store_changes (
+    version INTEGER NOT NULL,
+    expense_id TEXT NOT NULL,
+    writer TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_store_changes_version ON store_changes (version);
+"""
+
+# Statements are kept as module constants so sqlite3's statement cache can reuse them
+INSERT_EXPENSE = """
+INSERT INTO expenses (id, total_amount, description, channel_id, created_by, created_at, attendees, payers, summary_ts)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_DEBT = """
+INSERT INTO debts (expense_id, debtor_id, payer_id, amount, is_paid, paid_timestamp, last_reminder_sent)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+MARK_DEBT_PAID = """
+UPDATE debts SET is_paid = 1, paid_timestamp = ?
+WHERE expense_id = ? AND debtor_id = ? AND payer_id = ?
+"""
+UPDATE_REMINDER = """
+UPDATE debts SET last_reminder_sent = ?
+WHERE expense_id = ? AND debtor_id = ? AND payer_id = ?
+"""
+UPDATE_SUMMARY_TS = "UPDATE expenses SET summary_ts = ? WHERE id = ?"
+# Bumped by every committed batch, so each process can tell when another one wrote
+BUMP_VERSION = "UPDATE store_version SET version = version + 1 WHERE id = 0"
+SELECT_VERSION = "SELECT version FROM store_version WHERE id = 0"
+# Each batch also logs the expenses it changed under its version, so the other processes
+# reload only those. The log keeps the last change_log_size versions.
+INSERT_CHANGE = "INSERT INTO store_changes (version, expense_id, writer) VALUES (?, ?, ?)"
+SELECT_EXTERNAL_CHANGES = "SELECT DISTINCT expense_id FROM store_changes WHERE version > ? AND writer != ?"
+PRUNE_CHANGES = "DELETE FROM store_changes WHERE version <= ?"
+SELECT_EXPENSE = "SELECT * FROM expenses WHERE id = ?"
+SELECT_ALL_EXPENSES = "SELECT * FROM expenses ORDER BY created_at"
+SELECT_PENDING_EXPENSES = """
+SELECT * FROM expenses WHERE id IN (SELECT DISTINCT expense_id FROM debts WHERE is_paid = 0)
+ORDER BY created_at
+"""
+SELECT_SETTLED_EXPENSES = """
+SELECT * FROM expenses e WHERE NOT EXISTS (SELECT 1 FROM debts d WHERE d.expense_id = e.id AND d.is_paid = 0)
+ORDER BY created_at LIMIT ?
+"""
+DELETE_DEBTS = "DELETE FROM debts WHERE expense_id = ?"
+DELETE_EXPENSE = "DELETE FROM expenses WHERE id = ?"
+SELECT_DEBTS = "SELECT * FROM debts WHERE expense_id = ? ORDER BY rowid"
+COUNT_DEBTS = "SELECT is_paid, COUNT(*) FROM debts GROUP BY is_paid"
+# iter_debt_rows adds its filters as a WHERE clause between these two parts. CROSS JOIN
+# makes SQLite walk expenses in created_at index order and look up each one's debts, so
+# rows stream out as they are found rather than after sorting the whole ledger.
+SELECT_DEBT_ROWS = """
+SELECT e.id AS expense_id, e.created_at, e.channel_id, e.description, e.created_by, e.total_amount,
+       d.debtor_id, d.payer_id, d.amount, d.is_paid, d.paid_timestamp
+FROM expenses e CROSS JOIN debts d ON d.expense_id = e.id
+"""
+ORDER_DEBT_ROWS = "ORDER BY e.created_at, e.id"
+
+# Where each write keeps the ID of the expense it changes among its parameters
+EXPENSE_ID_PARAM = {
+    INSERT_EXPENSE: 0,
+    INSERT_DEBT: 0,
+    MARK_DEBT_PAID: 1,
+    UPDATE_REMINDER: 1,
+    UPDATE_SUMMARY_TS: 1,
+    DELETE_DEBTS: 0,
+    DELETE_EXPENSE: 0
+}
+
+
+def _format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Convert a datetime to the text stored in SQLite."""
+    return value.isoformat() if value else None
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Convert stored text back to a datetime."""
+    return datetime.fromisoformat(value) if value else None
+
+
+class WriteBatcher:
+    """Buffer writes and commit them as one transaction.
+
+    A batch is committed once it holds max_batch_size statements, or
+    max_delay seconds after its first statement was queued, whichever
+    comes first.
+
+    A batch that fails with an OperationalError, such as "database is
+    locked", stays queued ahead of later writes and is retried by the next
+    flush; a background flush that fails tries again max_delay later. The
+    error is kept in error until a flush succeeds, and the next submit
+    flushes straight away so its caller sees whether the database is still
+    failing. A batch failing with any other error, e.g. a constraint
+    violation, would fail again and is dropped.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, lock: threading.RLock,
+                 max_batch_size: int = 500, max_delay: float = 0.05,
+                 before_commit: Optional[Callable[[List[Tuple[str, Tuple[Any, ...]]]], None]] = None):
+        """Initialize the batcher.
+
+        before_commit, if given, is called with every batch's statements
+        inside its transaction, after running them.
+        """
+        self.connection = connection
+        self.lock = lock
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.before_commit = before_commit
+        self.error: Optional[sqlite3.Error] = None
+        self._pending: List[Tuple[str, Tuple[Any, ...]]] = []
+        self._timer: Optional[threading.Timer] = None
+
+    def submit(self, sql: str, params: Tuple[Any, ...]) -> None:
+        """Queue a statement for the next batch."""
+        self.submit_all([(sql, params)])
+
+    def submit_all(self, statements: List[Tuple[str, Tuple[Any, ...]]]) -> None:
+        """Queue several statements that must be committed in the same batch."""
+        with self.lock:
+            self._pending.extend(statements)
+
+            if self.error is not None or len(self._pending) >= self.max_batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._start_timer()
+
+    def submit_many(self, sql: str, params: List[Tuple[Any, ...]]) -> None:
+        """Queue one statement run for many parameter sets, like executemany."""
+        self.submit_all([(sql, statement_params) for statement_params in params])
+
+    def flush(self) -> None:
+        """Commit every queued statement in a single transaction."""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self._pending:
+                self.error = None
+                return
+
+            statements = self._pending
+            try:
+                self.connection.execute("BEGIN")
+                for sql, params in statements:
+                    self.connection.execute(sql, params)
+                if self.before_commit:
+                    self.before_commit(statements)
+                self.connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.error(f"Error committing batch of {len(statements)} writes: {e}")
+                if self.connection.in_transaction:
+                    self.connection.execute("ROLLBACK")
+                if isinstance(e, sqlite3.OperationalError):
+                    self.error = e
+                else:
+                    self._pending = []
+                raise
+
+            self._pending = []
+            self.error = None
+
+    def _start_timer(self) -> None:
+        """Flush in the background max_delay seconds from now."""
+        self._timer = threading.Timer(self.max_delay, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_in_background(self) -> None:
+        """Flush from the timer thread, trying again later if the batch is still queued."""
+        try:
+            self.flush()
+        except sqlite3.Error:
+            with self.lock:
+                if self._pending and self._timer is None:
+                    self._start_timer()
+
+
+class SQLiteExpenseStore(ExpenseStore):
+    """Expense store backed by a SQLite database in WAL mode.
+
+    Several processes can share the database; use max_batch_size=1 so each
+    write is committed, and visible to the others, straight away. Each
+    process finds the expenses the others changed in a change log, which
+    keeps the last change_log_size committed batches.
+    """
+
+    def __init__(self, path: str, max_batch_size: int = 500, max_delay: float = 0.05,
+                 change_log_size: int = 10000):
+        """Open (or create) the database at the given path."""
+        self.path = path
+        self.change_log_size = change_log_size
+        self._writer = uuid.uuid4().hex  # Tells this connection's changes from the others' in the log
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+            self._migrate()
+            self._checked_version = self.connection.execute(SELECT_VERSION).fetchone()[0]
+
+        self.batcher = WriteBatcher(
+            self.connection, self._lock, max_batch_size, max_delay, before_commit=self._bump_version
+        )
+
+    def save_expense(self, expense: Expense) -> None:
+        """Persist a new expense together with its debts."""
+        # The expense and its debts go in the same batch, so no reader sees one without the other
+        self.batcher.submit_all(self._expense_statements(expense))
+
+    def save_expenses(self, expenses: List[Expense]) -> None:
+        """Persist many new expenses with their debts, committed in one transaction."""
+        with self._lock:
+            self.batcher.submit_all([
+                statement for expense in expenses for statement in self._expense_statements(expense)
+            ])
+            self.batcher.flush()
+
+    def _expense_statements(self, expense: Expense) -> List[Tuple[str, Tuple[Any, ...]]]:
+        """Build the statements inserting an expense and its debts."""
+        payers = json.dumps([
+            {
+                "user_id": payment.user_id,
+                "amount": payment.amount,
+                "timestamp": _format_timestamp(payment.timestamp)
+            }
+            for payment in expense.payers
+        ])
+
+        statements = [(INSERT_EXPENSE, (
+            expense.id,
+            expense.total_amount,
+            expense.description,
+            expense.channel_id,
+            expense.created_by,
+            _format_timestamp(expense.created_at),
+            json.dumps(expense.attendees),
+            payers,
+            expense.summary_ts
+        ))]
+        statements.extend(
+            (INSERT_DEBT, (
+                expense.id,
+                debt.debtor_id,
+                debt.payer_id,
+                debt.amount,
+                int(debt.is_paid),
+                _format_timestamp(debt.paid_timestamp),
+                _format_timestamp(debt.last_reminder_sent)
+            ))
+            for debt in expense.debts
+        )
+        return statements
+
+    def load_expense(self, expense_id: str) -> Optional[Expense]:
+        """Load an expense by ID."""
+        with self._lock:
+            self.batcher.flush()
+            row = self.connection.execute(SELECT_EXPENSE, (expense_id,)).fetchone()
+            return self._build_expense(row) if row else None
+
+    def iter_expenses(self) -> Iterator[Expense]:
+        """Iterate over every stored expense."""
+        return self._iter_query(SELECT_ALL_EXPENSES)
+
+    def iter_pending_expenses(self) -> Iterator[Expense]:
+        """Iterate over the expenses that still have at least one unpaid debt."""
+        return self._iter_query(SELECT_PENDING_EXPENSES)
+
+    def iter_settled_expenses(self, limit: Optional[int] = None) -> Iterator[Expense]:
+        """Iterate over the expenses whose debts are all paid, oldest first, at most limit of them."""
+        return self._iter_query(SELECT_SETTLED_EXPENSES, (-1 if limit is None else limit,))
+
+    def delete_expense(self, expense_id: str) -> None:
+        """Remove an expense and its debts, e.g. once it has been archived."""
+        self.batcher.submit_all([(DELETE_DEBTS, (expense_id,)), (DELETE_EXPENSE, (expense_id,))])
+
+    def iter_debt_rows(
+        self,
+        channel_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        is_paid: Optional[bool] = None,
+        fetch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over the debts matching the filters as debt_row rows, oldest expense first.
+
+        The rows are read fetch_size at a time through a connection of their
+        own, so memory stays flat however many debts match, writes are not
+        blocked meanwhile, and the rows come from one consistent snapshot.
+        """
+        clauses, params = [], []
+        if channel_id is not None:
+            clauses.append("e.channel_id = ?")
+            params.append(channel_id)
+        if since is not None:
+            clauses.append("e.created_at >= ?")
+            params.append(_format_timestamp(since))
+        if until is not None:
+            clauses.append("e.created_at < ?")
+            params.append(_format_timestamp(until))
+        if is_paid is not None:
+            clauses.append("d.is_paid = ?")
+            params.append(int(is_paid))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        self.flush()
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        try:
+            cursor = connection.execute(f"{SELECT_DEBT_ROWS} {where} {ORDER_DEBT_ROWS}", params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield {
+                        **dict(row),
+                        "created_at": _parse_timestamp(row["created_at"]),
+                        "is_paid": bool(row["is_paid"]),
+                        "paid_timestamp": _parse_timestamp(row["paid_timestamp"])
+                    }
+        finally:
+            connection.close()
+
+    def mark_debt_paid(
+        self, expense_id: str, debtor_id: str, payer_id: str, paid_timestamp: datetime
+    ) -> None:
+        """Persist that a debt has been paid."""
+        self.batcher.submit(MARK_DEBT_PAID, (
+            _format_timestamp(paid_timestamp), expense_id, debtor_id, payer_id
+        ))
+
+    def update_reminder_timestamp(
+        self, expense_id: str, debtor_id: str, payer_id: str, sent_at: datetime
+    ) -> None:
+        """Persist when the last reminder for a debt was sent."""
+        self.batcher.submit(UPDATE_REMINDER, (
+            _format_timestamp(sent_at), expense_id, debtor_id, payer_id
+        ))
+
+    def update_reminder_timestamps(
+        self, keys: List[Tuple[str, str, str]], sent_at: datetime
+    ) -> None:
+        """Persist the same reminder time for many (expense_id, debtor_id, payer_id) debts."""
+        sent_at = _format_timestamp(sent_at)
+        self.batcher.submit_many(UPDATE_REMINDER, [(sent_at, *key) for key in keys])
+
+    def set_summary_ts(self, expense_id: str, summary_ts: str) -> None:
+        """Persist the ts of the channel message summarizing an expense."""
+        self.batcher.submit(UPDATE_SUMMARY_TS, (summary_ts, expense_id))
+
+    def count_debts(self) -> Dict[str, int]:
+        """Count the stored debts that are still open and those that are settled."""
+        counts = {"open": 0, "settled": 0}
+        with self._lock:
+            self.batcher.flush()
+            for is_paid, count in self.connection.execute(COUNT_DEBTS):
+                counts["settled" if is_paid else "open"] = count
+        return counts
+
+    def external_changes(self) -> Optional[Set[str]]:
+        """The IDs of the expenses other connections changed since the last check.
+
+        Returns None when more batches were committed since then than the
+        change log keeps.
+        """
+        with self._lock:
+            # Read the version and the log from one snapshot
+            self.connection.execute("BEGIN")
+            try:
+                version = self.connection.execute(SELECT_VERSION).fetchone()[0]
+                if version == self._checked_version:
+                    return set()
+                if version - self._checked_version > self.change_log_size:
+                    changed = None
+                else:
+                    changed = {
+                        row[0] for row in
+                        self.connection.execute(SELECT_EXTERNAL_CHANGES, (self._checked_version, self._writer))
+                    }
+            finally:
+                self.connection.execute("COMMIT")
+            self._checked_version = version
+            return changed
+
+    def flush(self) -> None:
+        """Write any buffered changes."""
+        self.batcher.flush()
+
+    def close(self) -> None:
+        """Flush buffered changes and close the database."""
+        with self._lock:
+            self.batcher.flush()
+            self.connection.close()
+
+    def _bump_version(self, statements: List[Tuple[str, Tuple[Any, ...]]]) -> None:
+        """Count a committed batch and log the expenses it changed under its version."""
+        self.connection.execute(BUMP_VERSION)
+        version = self.connection.execute(SELECT_VERSION).fetchone()[0]
+        expense_ids = dict.fromkeys(params[EXPENSE_ID_PARAM[sql]] for sql, params in statements)
+        self.connection.executemany(
+            INSERT_CHANGE, [(version, expense_id, self._writer) for expense_id in expense_ids]
+        )
+        self.connection.execute(PRUNE_CHANGES, (version - self.change_log_size,))
+
+    def _migrate(self) -> None:
+        """Add the columns introduced after a database was first created."""
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(expenses)")}
+        if "summary_ts" not in columns:
+            self.connection.execute("ALTER TABLE expenses ADD COLUMN summary_ts TEXT")
+
+    def _iter_query(self, sql: str, params: Tuple[Any, ...] = ()) -> Iterator[Expense]:
+        """Yield the expenses returned by a query one at a time."""
+        with self._lock:
+            self.batcher.flush()
+            rows = self.connection.execute(sql, params).fetchall()
+
+        for row in rows:
+            with self._lock:
+                expense = self._build_expense(row)
+            yield expense
+
+    def _build_expense(self, row: sqlite3.Row) -> Expense:
+        """Build an Expense and its debts from a database row."""
+        debts = [
+            Debt(
+                debtor_id=debt_row["debtor_id"],
+                payer_id=debt_row["payer_id"],
+                amount=debt_row["amount"],
+                is_paid=bool(debt_row["is_paid"]),
+                paid_timestamp=_parse_timestamp(debt_row["paid_timestamp"]),
+                last_reminder_sent=_parse_timestamp(debt_row["last_reminder_sent"])
+            )
+            for debt_row in self.connection.execute(SELECT_DEBTS, (row["id"],))
+        ]
+
+        payers = [
+            Payment(
+                user_id=payer["user_id"],
+                amount=payer["amount"],
+                timestamp=_parse_timestamp(payer["timestamp"])
+            )
+            for payer in json.loads(row["payers"])
+        ]
+
+        return Expense(
+            id=row["id"],
+            total_amount=row["total_amount"],
+            payers=payers,
+            attendees=json.loads(row["attendees"]),
+            description=row["description"],
+            channel_id=row["channel_id"],
+            created_by=row["created_by"],
+            created_at=_parse_timestamp(row["created_at"]),
+            debts=debts,
+            summary_ts=row["summary_ts"]
+        )
@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from app.utils.metrics import Counter, Gauge
+
+CACHE_LOOKUPS = Counter(
+    "splitbot_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"]
+)
+CACHE_ENTRIES = Gauge("splitbot_cache_entries", "Entries held by each cache", ["cache"])
+
+_MISSING = object()
+
+
+class TTLCache:
+    """A mapping whose entries expire after ttl seconds, holding at most max_size of them.
+
+    Entries are kept in least recently used order, so when the cache is full
+    the entry that has gone unread the longest is evicted. Expired entries
+    are dropped when they are read.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int = 10000,
+        name: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize an empty cache.
+
+        A named cache reports its hits, misses and size in the metrics.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+        if name:
+            CACHE_LOOKUPS.labels(name, "hit").set_function(lambda: self.hits)
+            CACHE_LOOKUPS.labels(name, "miss").set_function(lambda: self.misses)
+            CACHE_ENTRIES.labels(name).set_function(lambda: len(self._entries))
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether the key has an unexpired entry, without counting a lookup."""
+        return self._peek(key) is not _MISSING
+
+    def _peek(self, key: Hashable) -> Any:
+        """Get an unexpired value or _MISSING, dropping the entry if it expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return _MISSING
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get the value for a key, counting a hit or a miss."""
+        value = self._peek(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value for ttl seconds (the cache's ttl by default), evicting the oldest entries when full."""
+        self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        """Drop a key's entry if there is one."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
@@ -1,8 +1,183 @@
 import re
-from typing import Dict, List, Tuple, Optional
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.money import is_whole_minor
+
+# A single pattern splits the command into tokens in one pass over the text.
+# Every character except trailing whitespace belongs to some token, so token
+# positions follow from the lengths of the groups and findall can be used.
+TOKEN_PATTERN = re.compile(r"""
+    (\s*)(?:
+        (<@([A-Z0-9]+)(?:\|[^>]*)?>)
+      | (\$?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?)(?![\w@.])
+      | (,)
+      | ([^\s,]+)
+    )
+""", re.VERBOSE)
+
+KEYWORDS = ("total", "paid_by", "attendees", "note")
+
+# A token is a (kind, value, start, end) tuple, where kind is one of
+# "keyword", "mention", "amount", "comma" or "word", value is the keyword,
+# user ID or text, and start/end are character positions in the command
+Token = Tuple[str, str, int, int]
+
+
+class CommandParseError(ValueError):
+    """Raised when a /split command cannot be parsed."""
+    
+    def __init__(self, message: str, position: int):
+        """Initialize the error with the 0-based character position it refers to."""
+        super().__init__(f"{message} (at character {position + 1})")
+        self.position = position
+
+
+def tokenize(command_text: str) -> List[Token]:
+    """Split the command text into keyword, mention, amount, comma and word tokens."""
+    tokens = []
+    append = tokens.append
+    position = 0
+    
+    for space, mention, user_id, amount, comma, word in TOKEN_PATTERN.findall(command_text):
+        start = position + len(space)
+        if mention:
+            position = start + len(mention)
+            append(("mention", user_id, start, position))
+        elif amount:
+            position = start + len(amount)
+            append(("amount", amount, start, position))
+        elif comma:
+            position = start + 1
+            append(("comma", comma, start, position))
+        else:
+            position = start + len(word)
+            keyword = word.lower()
+            if keyword in KEYWORDS:
+                append(("keyword", keyword, start, position))
+            else:
+                append(("word", word, start, position))
+    
+    return tokens
+
+
+def parse_amount(text: str) -> Decimal:
+    """Parse an amount such as "1,250.50" or "$30" into an exact Decimal."""
+    return Decimal(text.lstrip("$").replace(",", ""))
+
+
+def _parse_amount_token(token: Token) -> Decimal:
+    """Parse an amount token, rejecting fractions of a cent, which could not be stored."""
+    _, text, start, _ = token
+    amount = parse_amount(text)
+    if not is_whole_minor(amount):
+        raise CommandParseError(f"Amount '{text}' has fractions of a cent", start)
+    return amount
+
+
+def _starts_section(tokens: List[Token], index: int, sections: Dict) -> bool:
+    """Whether a keyword token starts a section not given yet, which parses up to the next keyword.
+    
+    This lets a note contain words like "attendees" or "total 30" without
+    ending it.
+    """
+    token = tokens[index]
+    kind, value, _, _ = token
+    if kind != "keyword" or value == "note" or value in sections:
+        return False
+    
+    try:
+        end, _ = SECTION_PARSERS[value](tokens, index + 1, token)
+    except CommandParseError:
+        return False
+    return end == len(tokens) or tokens[end][0] == "keyword"
+
+
+def _parse_total(tokens: List[Token], index: int, keyword: Token) -> Tuple[int, Decimal]:
+    """Parse "total <amount>" and return the index after it with the amount."""
+    if index >= len(tokens) or tokens[index][0] != "amount":
+        position = tokens[index][2] if index < len(tokens) else keyword[3]
+        raise CommandParseError("Expected an amount after 'total'", position)
+    
+    return index + 1, _parse_amount_token(tokens[index])
+
+
+def _parse_payers(tokens: List[Token], index: int, keyword: Token) -> Tuple[int, List[Tuple[Token, Optional[Decimal]]]]:
+    """Parse "paid_by <@user> [amount] ..." and return the index after it with the payers."""
+    payers = []
+    
+    while index < len(tokens) and tokens[index][0] != "keyword":
+        token = tokens[index]
+        kind, value, start, _ = token
+        if kind == "mention":
+            amount = None
+            if index + 1 < len(tokens) and tokens[index + 1][0] == "amount":
+                index += 1
+                amount = _parse_amount_token(tokens[index])
+            payers.append((token, amount))
+        elif kind != "comma":
+            raise CommandParseError(f"Expected a payer mention but found '{value}'", start)
+        index += 1
+    
+    if not payers:
+        raise CommandParseError("Expected at least one payer after 'paid_by'", keyword[3])
+    
+    return index, payers
+
+
+def _parse_attendees(tokens: List[Token], index: int, keyword: Token) -> Tuple[int, List[str]]:
+    """Parse "attendees <@user> ..." and return the index after it with the user IDs."""
+    attendees = []
+    
+    for index in range(index, len(tokens)):
+        kind, value, start, _ = tokens[index]
+        if kind == "mention":
+            attendees.append(value)
+        elif kind == "keyword":
+            break
+        elif kind != "comma":
+            raise CommandParseError(f"Expected an attendee mention but found '{value}'", start)
+    else:
+        index = len(tokens)
+    
+    if not attendees:
+        raise CommandParseError("Expected at least one attendee after 'attendees'", keyword[3])
+    
+    return index, attendees
+
+
+def _parse_note(tokens: List[Token], index: int, keyword: Token, sections: Dict) -> Tuple[int, Tuple[int, int]]:
+    """Parse "note <description>" and return the index after it with the note's span.
+    
+    The note runs until the next keyword that starts one of the sections
+    not in sections yet, or the end of the command.
+    """
+    end = index
+    while end < len(tokens) and not _starts_section(tokens, end, sections):
+        end += 1
+    
+    if end == index:
+        raise CommandParseError("Expected a description after 'note'", keyword[3])
+    
+    return end, (tokens[index][2], tokens[end - 1][3])
+
+
+SECTION_PARSERS = {
+    "total": _parse_total,
+    "paid_by": _parse_payers,
+    "attendees": _parse_attendees,
+}
+
 
 def parse_split_command(command_text: str) -> Dict:
-    """Parse the /split command."""
+    """Parse the /split command.
+    
+    The text is tokenized in a single pass and the total, paid_by, attendees
+    and note sections may appear in any order. Amounts are returned as exact
+    Decimals in major units and may use thousands separators ("1,250.50").
+    Raises CommandParseError, with the position of the problem, for
+    malformed commands.
+    """
     # Initialize the result
     result = {
         "total_amount": None,
@@ -11,58 +186,56 @@ def parse_split_command(command_text: str) -> Dict:
         "description": "Expense"
     }
     
-    # Extract the total amount
-    total_match = re.search(r'total\s+(\d+(\.\d+)?)', command_text)
-    if total_match:
-        result["total_amount"] = float(total_match.group(1))
+    # Parse each section once, in whatever order they were given
+    tokens = tokenize(command_text)
+    sections = {}
+    index = 0
     
-    # Extract the payers
-    paid_by_section = re.search(r'paid_by\s+(.*?)(?=attendees|note|$)', command_text)
-    if paid_by_section:
-        paid_by_text = paid_by_section.group(1).strip()
-        
-        # Match user IDs with optional amounts
-        # Format: @user1 [amount1] @user2 [amount2] ...
-        payer_matches = re.finditer(r'<@([A-Z0-9]+)>\s*(?:(\d+(\.\d+)?)\s*)?', paid_by_text)
+    while index < len(tokens):
+        token = tokens[index]
+        kind, value, start, _ = token
+        if kind != "keyword":
+            raise CommandParseError(
+                f"Expected one of {', '.join(KEYWORDS)} but found '{value}'", start
+            )
+        if value in sections:
+            raise CommandParseError(f"'{value}' appears more than once", start)
         
-        # If we have a single payer with no amount, assume they paid the total
-        payers = list(payer_matches)
-        if len(payers) == 1 and not payers[0].group(2):
+        if value == "note":
+            index, sections[value] = _parse_note(tokens, index + 1, token, sections)
+        else:
+            index, sections[value] = SECTION_PARSERS[value](tokens, index + 1, token)
+    
+    result["total_amount"] = sections.get("total")
+    result["attendees"] = sections.get("attendees", [])
+    
+    # The description keeps the original spacing of the note
+    if "note" in sections:
+        start, end = sections["note"]
+        result["description"] = command_text[start:end]
+    
+    payers = sections.get("paid_by", [])
+    if len(payers) == 1 and payers[0][1] is None:
+        # A single payer with no amount paid the total
+        result["payers"].append({
+            "user_id": payers[0][0][1],
+            "amount": result["total_amount"]
+        })
+    elif payers:
+        # Process multiple payers, each of which needs an amount
+        total_paid = Decimal(0)
+        for (_, user_id, _, end), amount in payers:
+            if amount is None:
+                raise CommandParseError(f"Expected an amount for payer <@{user_id}>", end)
             result["payers"].append({
-                "user_id": payers[0].group(1),
-                "amount": result["total_amount"]
+                "user_id": user_id,
+                "amount": amount
             })
-        else:
-            # Process multiple payers with specified amounts
-            total_paid = 0
-            for match in payers:
-                user_id = match.group(1)
-                if match.group(2):  # Amount specified
-                    amount = float(match.group(2))
-                    result["payers"].append({
-                        "user_id": user_id,
-                        "amount": amount
-                    })
-                    total_paid += amount
-            
-            # Validate that the sum of paid amounts equals the total
-            if total_paid != result["total_amount"]:
-                raise ValueError(f"Sum of paid amounts ({total_paid}) does not equal total amount ({result['total_amount']})")
-    
-    # Extract the attendees
-    attendees_section = re.search(r'attendees\s+(.*?)(?=note|$)', command_text)
-    if attendees_section:
-        attendees_text = attendees_section.group(1).strip()
+            total_paid += amount
         
-        # Match user IDs
-        attendee_matches = re.finditer(r'<@([A-Z0-9]+)>', attendees_text)
-        for match in attendee_matches:
-            result["attendees"].append(match.group(1))
-    
-    # Extract the description
-    note_match = re.search(r'note\s+(.*?)$', command_text)
-    if note_match:
-        result["description"] = note_match.group(1).strip()
+        # Validate that the sum of paid amounts equals the total
+        if total_paid != result["total_amount"]:
+            raise ValueError(f"Sum of paid amounts ({total_paid}) does not equal total amount ({result['total_amount']})")
     
     return result
 
@@ -76,4 +249,4 @@ def extract_user_ids(text: str) -> List[str]:
     for match in matches:
         user_ids.append(match.group(1))
     
-    return user_ids 
\ No newline at end of file
+    return user_ids
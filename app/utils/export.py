@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from app.utils.money import MINOR_UNITS
+
+# Columns of an export, in order; see app.storage.base.debt_row
+EXPORT_COLUMNS = (
+    "expense_id", "created_at", "channel_id", "description", "created_by", "total_amount",
+    "debtor_id", "payer_id", "amount", "is_paid", "paid_timestamp"
+)
+CHUNK_SIZE = 64 * 1024
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Digits after the decimal point of an amount in major units, 2 for cents
+_DECIMALS = len(str(MINOR_UNITS)) - 1
+
+
+def _format_major(amount: int) -> str:
+    """Format minor units as a plain major-unit amount, e.g. 1250 as "12.50"."""
+    major, minor = divmod(abs(amount), MINOR_UNITS)
+    return f"{'-' if amount < 0 else ''}{major}.{minor:0{_DECIMALS}d}"
+
+
+def _export_values(row: Dict[str, Any]) -> List[Any]:
+    """The values of a ledger row in EXPORT_COLUMNS order, with amounts in major
+    units as text and timestamps in ISO 8601."""
+    paid_timestamp = row["paid_timestamp"]
+    return [
+        row["expense_id"],
+        row["created_at"].isoformat(),
+        row["channel_id"],
+        row["description"],
+        row["created_by"],
+        _format_major(row["total_amount"]),
+        row["debtor_id"],
+        row["payer_id"],
+        _format_major(row["amount"]),
+        row["is_paid"],
+        paid_timestamp.isoformat() if paid_timestamp else None
+    ]
+
+
+def _buffered(lines: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """Join lines into chunks of about chunk_size characters.
+
+    The first line is sent on its own, so the response starts straight away.
+    """
+    lines = iter(lines)
+    for line in lines:
+        yield line
+        break
+
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Serialize ledger rows as newline-delimited JSON, one row at a time."""
+    dumps = json.dumps
+    for row in rows:
+        yield dumps(dict(zip(EXPORT_COLUMNS, _export_values(row)))) + "\n"
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Serialize ledger rows as CSV with a header row, one row at a time.
+
+    Booleans are written as true or false.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    paid_column = EXPORT_COLUMNS.index("is_paid")
+
+    def line(values) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(EXPORT_COLUMNS)
+    for row in rows:
+        values = _export_values(row)
+        values[paid_column] = "true" if values[paid_column] else "false"
+        yield line(values)
+
+
+def export_ledger(rows: Iterable[Dict[str, Any]], format: str, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Serialize ledger rows as "ndjson" or "csv", in chunks of about chunk_size characters."""
+    if format not in MEDIA_TYPES:
+        raise ValueError(f"Unknown export format {format}, expected ndjson or csv")
+    serialize = iter_ndjson if format == "ndjson" else iter_csv
+    return _buffered(serialize(rows), chunk_size)
+
+
+def parse_time_bound(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """Parse a since/until filter given as an ISO 8601 date or datetime.
+
+    A date given as the end of a range includes the whole day. A datetime
+    with a UTC offset is converted to naive local time, like the stored
+    created_at values it is compared with.
+    """
+    if not value:
+        return None
+    bound = datetime.fromisoformat(value)
+    if bound.tzinfo is not None:
+        bound = bound.astimezone().replace(tzinfo=None)
+    if end and len(value) == 10:
+        bound += timedelta(days=1)
+    return bound
@@ -0,0 +1,217 @@
+import codecs
+import csv
+import json
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.utils.money import is_whole_minor
+
+# Columns of an import, as CSV headers or JSON keys. total, paid_by and
+# attendees are required; channel_id and created_by fall back to defaults
+# given with the import, and created_by to the first payer.
+COLUMNS = ("total", "paid_by", "attendees", "description", "channel_id", "created_by", "date", "settled")
+
+# A user is an ID like U123 or a mention like <@U123>, optionally followed by :amount in paid_by
+USER_PATTERN = re.compile(r"^(?:<@)?([A-Z0-9]+)(?:\|[^>]*)?>?$")
+LIST_SEPARATORS = re.compile(r"[\s,;]+")
+PAYER_SEPARATORS = re.compile(r"[\s;]+")
+
+TRUE_VALUES = ("1", "true", "yes", "y", "paid")
+FALSE_VALUES = ("", "0", "false", "no", "n")
+
+
+class ImportRowError(ValueError):
+    """Raised when a row of an import cannot be turned into an expense."""
+
+    def __init__(self, message: str, line: int):
+        """Initialize the error with the 1-based line the row starts on."""
+        super().__init__(f"{message} (line {line})")
+        self.message = message
+        self.line = line
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a stream of UTF-8 byte chunks into lines, without their line endings.
+
+    Only the current partial line is held in memory, however large the stream.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    partial = ""
+    async for chunk in chunks:
+        partial += decoder.decode(chunk)
+        *lines, partial = partial.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    partial += decoder.decode(b"", final=True)
+    if partial:
+        yield partial.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[str], format: str) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line, record) for each row of a CSV or JSONL stream, skipping blank lines.
+
+    CSV needs a header row naming the columns; a quoted field may span
+    several lines. Malformed rows are yielded as ImportRowError records
+    so the import can report them and carry on.
+    """
+    if format not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown import format {format}, expected csv or jsonl")
+
+    header: Optional[List[str]] = None
+    buffered: List[str] = []
+    start = 0
+    line_number = 0
+
+    async for line in lines:
+        line_number += 1
+        if format == "jsonl":
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield line_number, ImportRowError(f"Invalid JSON: {e}", line_number)
+                    continue
+                if not isinstance(record, dict):
+                    record = ImportRowError("Expected a JSON object", line_number)
+                yield line_number, record
+            continue
+
+        # Join lines while a quoted field is still open
+        if not buffered:
+            start = line_number
+        buffered.append(line)
+        text = "\n".join(buffered)
+        if text.count('"') % 2:
+            continue
+        buffered = []
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            missing = [name for name in ("total", "paid_by", "attendees") if name not in header]
+            if missing:
+                raise ImportRowError(f"Missing columns {', '.join(missing)} in the header", start)
+            continue
+        yield start, dict(zip(header, values))
+
+    if buffered:
+        yield start, ImportRowError("Unterminated quoted field", start)
+
+
+def _parse_amount(value: Any, line: int, name: str) -> Decimal:
+    """Parse an amount like 1250.5, "1,250.50" or "$12"."""
+    try:
+        amount = Decimal(str(value).strip().lstrip("$").replace(",", ""))
+    except InvalidOperation:
+        raise ImportRowError(f"Invalid {name} amount '{value}'", line)
+    if not amount.is_finite() or amount <= 0:
+        raise ImportRowError(f"The {name} amount must be positive, got '{value}'", line)
+    if not is_whole_minor(amount):
+        raise ImportRowError(f"The {name} amount '{value}' has fractions of a cent", line)
+    return amount
+
+
+def _parse_user(value: str, line: int) -> str:
+    """Parse a user ID or mention."""
+    match = USER_PATTERN.match(value.strip())
+    if not match:
+        raise ImportRowError(f"Invalid user '{value}'", line)
+    return match.group(1)
+
+
+def _parse_payers(value: Any, total: Decimal, line: int) -> List[Dict[str, Any]]:
+    """Parse paid_by: "U1", "U1:60 U2:30" or a JSON list of {"user_id", "amount"}."""
+    if isinstance(value, list):
+        payers = [
+            (str(payer.get("user_id", "")), payer.get("amount")) if isinstance(payer, dict) else (str(payer), None)
+            for payer in value
+        ]
+    else:
+        payers = [
+            tuple(item.split(":", 1)) if ":" in item else (item, None)
+            for item in PAYER_SEPARATORS.split(str(value or "").strip()) if item
+        ]
+
+    if not payers:
+        raise ImportRowError("At least one payer is required", line)
+    if len(payers) == 1 and payers[0][1] is None:
+        return [{"user_id": _parse_user(payers[0][0], line), "amount": total}]
+
+    result = []
+    for user, amount in payers:
+        if amount is None:
+            raise ImportRowError(f"Expected an amount for payer {user}", line)
+        result.append({"user_id": _parse_user(user, line), "amount": _parse_amount(amount, line, "paid")})
+
+    total_paid = sum(payer["amount"] for payer in result)
+    if total_paid != total:
+        raise ImportRowError(f"Sum of paid amounts ({total_paid}) does not equal total amount ({total})", line)
+    return result
+
+
+def _parse_flag(value: Any, line: int) -> bool:
+    """Parse a yes/no column."""
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else "").strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ImportRowError(f"Expected yes or no for settled, got '{value}'", line)
+
+
+def _parse_date(value: Any, line: int) -> Optional[datetime]:
+    """Parse an ISO 8601 date or datetime, if there is one.
+
+    A datetime with a UTC offset is converted to naive local time, like
+    every other datetime in the app.
+    """
+    if value in (None, ""):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ImportRowError(f"Invalid date '{value}', expected YYYY-MM-DD", line)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def parse_import_row(record: Dict[str, Any], line: int, defaults: Dict[str, str]) -> Dict[str, Any]:
+    """Validate one imported record and return the item to pass to ExpenseService.create_expenses.
+
+    defaults may give the channel_id and created_by of rows without them.
+    Raises ImportRowError for invalid rows.
+    """
+    if record.get("total") in (None, ""):
+        raise ImportRowError("Total amount is required", line)
+    total = _parse_amount(record["total"], line, "total")
+    payers = _parse_payers(record.get("paid_by"), total, line)
+
+    attendees = record.get("attendees")
+    if not isinstance(attendees, list):
+        attendees = LIST_SEPARATORS.split(str(attendees or "").strip())
+    attendees = [_parse_user(str(attendee), line) for attendee in attendees if attendee]
+    if not attendees:
+        raise ImportRowError("At least one attendee is required", line)
+
+    channel_id = str(record.get("channel_id") or defaults.get("channel_id") or "").strip()
+    if not channel_id:
+        raise ImportRowError("A channel_id is required", line)
+
+    return {
+        "total_amount": total,
+        "payers": payers,
+        "attendees": attendees,
+        "description": str(record.get("description") or "").strip() or "Imported expense",
+        "channel_id": channel_id,
+        "created_by": str(record.get("created_by") or defaults.get("created_by") or payers[0]["user_id"]).strip(),
+        "created_at": _parse_date(record.get("date"), line),
+        "settled": _parse_flag(record.get("settled"), line)
+    }
@@ -1,17 +1,28 @@
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
 
 from app.models.expense import Expense, Debt
+from app.models.settlement import Settlement
+from app.utils.money import allocate, format_amount
 
+# Slack rejects messages with more than 50 blocks
+MAX_BLOCKS = 50
 
-def format_currency(amount: float) -> str:
-    """Format a currency amount."""
-    return f"${amount:,.0f}"
+# Debts listed on each page of /split status, well within MAX_BLOCKS
+STATUS_PAGE_SIZE = 20
+
+
+def format_currency(amount: int) -> str:
+    """Format a currency amount given in minor units."""
+    return format_amount(amount)
 
 
 def build_expense_summary_message(expense: Expense) -> List[Dict]:
     """Build a message summarizing an expense."""
-    # Calculate the share per person
-    share_per_person = expense.total_amount / len(expense.attendees)
+    # Calculate the share per person, which differs by a cent when the total does not divide evenly
+    shares = allocate(expense.total_amount, len(expense.attendees))
+    share_per_person = format_currency(shares[-1])
+    if shares[0] != shares[-1]:
+        share_per_person += f" to {format_currency(shares[0])}"
     
     # Group debts by payer
     debts_by_payer = {}
@@ -33,7 +44,7 @@ def build_expense_summary_message(expense: Expense) -> List[Dict]:
             "type": "section",
             "text": {
                 "type": "mrkdwn",
-                "text": f"*Total:* {format_currency(expense.total_amount)}\n*Attendees:* {len(expense.attendees)} people\n*Each person owes:* {format_currency(share_per_person)}"
+                "text": f"*Total:* {format_currency(expense.total_amount)}\n*Attendees:* {len(expense.attendees)} people\n*Each person owes:* {share_per_person}"
             }
         },
         {
@@ -41,21 +52,53 @@ def build_expense_summary_message(expense: Expense) -> List[Dict]:
         }
     ]
     
-    # Add payment summary
+    # Add payment summary, one section per payer so a payment only changes its payer's block
     for payer_id, payer_debts in debts_by_payer.items():
-        debtor_text = ""
-        for debt in payer_debts:
-            paid_status = ":white_check_mark:" if debt.is_paid else ":hourglass_flowing_sand:"
-            debtor_text += f"{paid_status} <@{debt.debtor_id}> owes <@{debt.payer_id}> {format_currency(debt.amount)}\n"
-        
-        if debtor_text:
-            blocks.append({
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": debtor_text
-                }
-            })
+        blocks.append(build_payer_summary_block(payer_id, payer_debts))
+    
+    return blocks
+
+
+def build_payer_summary_block(payer_id: str, payer_debts: List[Debt]) -> Dict:
+    """Build the summary section listing the debts owed to one payer."""
+    debtor_text = ""
+    for debt in payer_debts:
+        paid_status = ":white_check_mark:" if debt.is_paid else ":hourglass_flowing_sand:"
+        debtor_text += f"{paid_status} <@{debt.debtor_id}> owes <@{debt.payer_id}> {format_currency(debt.amount)}\n"
+    
+    return {
+        "type": "section",
+        "block_id": f"payer|{payer_id}",
+        "text": {
+            "type": "mrkdwn",
+            "text": debtor_text
+        }
+    }
+
+
+def update_expense_summary_message(
+    expense: Expense,
+    payer_ids: Iterable[str],
+    previous_blocks: Optional[List[Dict]] = None
+) -> List[Dict]:
+    """Rebuild an expense's summary after payments to the given payers.
+    
+    Only the sections of those payers are re-rendered; the rest of
+    previous_blocks, the last rendered summary, is reused. Without
+    previous_blocks the whole summary is rendered.
+    """
+    if previous_blocks is None:
+        return build_expense_summary_message(expense)
+    
+    block_ids = {f"payer|{payer_id}": payer_id for payer_id in payer_ids}
+    blocks = []
+    for block in previous_blocks:
+        payer_id = block_ids.get(block.get("block_id"))
+        if payer_id is not None:
+            block = build_payer_summary_block(
+                payer_id, [debt for debt in expense.debts if debt.payer_id == payer_id]
+            )
+        blocks.append(block)
     
     return blocks
 
@@ -129,6 +172,77 @@ def build_reminder_message(expense: Expense, debt: Debt) -> List[Dict]:
     return blocks
 
 
+def build_consolidated_reminder_message(pending_debts: List[Dict]) -> List[Dict]:
+    """Build one reminder message listing every pending debt of a debtor.
+    
+    Each item of pending_debts is a dictionary with "expense" and "debt" keys,
+    as returned by ExpenseService.get_pending_debts.
+    """
+    total = sum(pending_debt["debt"].amount for pending_debt in pending_debts)
+    
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"Hey! You have {len(pending_debts)} unpaid shares adding up to {format_currency(total)} 😄"
+            }
+        },
+        {
+            "type": "divider"
+        }
+    ]
+    
+    # Slack allows 50 blocks per message, so list as many debts as fit
+    shown = pending_debts[:MAX_BLOCKS - len(blocks) - 1]
+    for pending_debt in shown:
+        expense = pending_debt["expense"]
+        debt = pending_debt["debt"]
+        blocks.append({
+            "type": "section",
+            "block_id": f"debt|{expense.id}|{debt.debtor_id}|{debt.payer_id}",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*{expense.description}*\nYou owe <@{debt.payer_id}> {format_currency(debt.amount)}"
+            },
+            "accessory": {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "I've paid now",
+                    "emoji": True
+                },
+                "style": "primary",
+                "value": f"{expense.id}|{debt.debtor_id}|{debt.payer_id}",
+                "action_id": "confirm_payment"
+            }
+        })
+    
+    if len(pending_debts) > len(shown):
+        blocks.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"...and {len(pending_debts) - len(shown)} more"
+                }
+            ]
+        })
+    
+    return blocks
+
+
+def build_debt_paid_block(expense: Expense, debt: Debt) -> Dict:
+    """Build the block that replaces a payment button once the debt is paid."""
+    return {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": f"You have paid <@{debt.payer_id}> {format_currency(debt.amount)} for *{expense.description}*. Thank you! :tada:"
+        }
+    }
+
+
 def build_payment_notification_message(expense: Expense, debt: Debt) -> List[Dict]:
     """Build a notification message for a payer when a debtor has paid."""
     blocks = [
@@ -144,16 +258,230 @@ def build_payment_notification_message(expense: Expense, debt: Debt) -> List[Dic
     return blocks
 
 
+def build_payments_notification_message(paid_debts: List[Dict]) -> List[Dict]:
+    """Build one notification telling a payer about several payments.
+    
+    Each item of paid_debts is a dictionary with "expense" and "debt" keys.
+    """
+    total = sum(paid_debt["debt"].amount for paid_debt in paid_debts)
+    
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"Good news! {len(paid_debts)} payments adding up to {format_currency(total)} have been confirmed."
+            }
+        }
+    ]
+    
+    # Slack allows 50 blocks per message, so list as many payments as fit
+    shown = paid_debts[:MAX_BLOCKS - len(blocks) - 1]
+    for paid_debt in shown:
+        expense = paid_debt["expense"]
+        debt = paid_debt["debt"]
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"<@{debt.debtor_id}> paid {format_currency(debt.amount)} for *{expense.description}*"
+            }
+        })
+    
+    if len(paid_debts) > len(shown):
+        blocks.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"...and {len(paid_debts) - len(shown)} more"
+                }
+            ]
+        })
+    
+    return blocks
+
+
+def build_status_message(ledger: Dict[str, List[Dict]], page: int = 0, page_size: int = STATUS_PAGE_SIZE) -> List[Dict]:
+    """Build one page of a user's ledger, as returned by ExpenseService.get_user_ledger.
+    
+    The debts the user owes are listed first, then those owed to them, with
+    buttons to the previous and next pages.
+    """
+    owes, owed = ledger["owes"], ledger["owed"]
+    if not owes and not owed:
+        return [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "You're all settled up, nobody owes anything :tada:"
+                }
+            }
+        ]
+    
+    owes_total = sum(pending_debt["debt"].amount for pending_debt in owes)
+    owed_total = sum(pending_debt["debt"].amount for pending_debt in owed)
+    entries = [(True, pending_debt) for pending_debt in owes] + [(False, pending_debt) for pending_debt in owed]
+    pages = (len(entries) + page_size - 1) // page_size
+    page = min(max(page, 0), pages - 1)
+    
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*Your balance*\nYou owe {format_currency(owes_total)} ({len(owes)} debts)\nYou are owed {format_currency(owed_total)} ({len(owed)} debts)"
+            }
+        },
+        {
+            "type": "divider"
+        }
+    ]
+    
+    for is_debtor, pending_debt in entries[page * page_size:(page + 1) * page_size]:
+        expense = pending_debt["expense"]
+        debt = pending_debt["debt"]
+        if is_debtor:
+            text = f"You owe <@{debt.payer_id}> {format_currency(debt.amount)} for *{expense.description}*"
+        else:
+            text = f"<@{debt.debtor_id}> owes you {format_currency(debt.amount)} for *{expense.description}*"
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": text
+            }
+        })
+    
+    if pages > 1:
+        blocks.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"Page {page + 1} of {pages}"
+                }
+            ]
+        })
+        
+        buttons = []
+        if page > 0:
+            buttons.append({
+                "type": "button",
+                "text": {"type": "plain_text", "text": "Previous page"},
+                "value": str(page - 1),
+                "action_id": "status_previous_page"
+            })
+        if page < pages - 1:
+            buttons.append({
+                "type": "button",
+                "text": {"type": "plain_text", "text": "Next page"},
+                "value": str(page + 1),
+                "action_id": "status_next_page"
+            })
+        blocks.append({
+            "type": "actions",
+            "elements": buttons
+        })
+    
+    return blocks
+
+
 def build_manual_reminder_summary(result: Dict) -> List[Dict]:
-    """Build a summary message for manual reminders."""
+    """Build a summary message for manual reminders, or their progress so far."""
+    done = result['sent'] + result['failed']
+    title = "Reminder Summary" if done >= result['total'] else f"Sending reminders... {done}/{result['total']}"
+    
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*{title}*\nSent: {result['sent']}\nFailed: {result['failed']}\nTotal: {result['total']}"
+            }
+        }
+    ]
+    
+    return blocks 
+
+
+def build_settlement_message(settlement: Settlement) -> List[Dict]:
+    """Build a message listing the netted transfers that settle a channel."""
+    if not settlement.transfers:
+        return [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*Settle up*\nThe {len(settlement.debt_keys)} pending debts in this channel cancel each other out, so they have all been marked as paid :tada:"
+                }
+            }
+        ]
+    
     blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": "Settle up"
+            }
+        },
         {
             "type": "section",
             "text": {
                 "type": "mrkdwn",
-                "text": f"*Reminder Summary*\nSent: {result['sent']}\nFailed: {result['failed']}\nTotal: {result['total']}"
+                "text": f"{len(settlement.debt_keys)} pending debts can be settled with {len(settlement.transfers)} payments:"
             }
+        },
+        {
+            "type": "divider"
         }
     ]
     
-    return blocks 
\ No newline at end of file
+    # Unpaid transfers come first, so one left out for lack of room gets its
+    # button once earlier ones are paid and the message is updated
+    order = sorted(range(len(settlement.transfers)), key=lambda index: settlement.transfers[index].is_paid)
+    shown = order[:MAX_BLOCKS - len(blocks) - 1]
+    for index in shown:
+        transfer = settlement.transfers[index]
+        block = {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"{':white_check_mark:' if transfer.is_paid else ':hourglass_flowing_sand:'} <@{transfer.debtor_id}> pays <@{transfer.payer_id}> {format_currency(transfer.amount)}"
+            }
+        }
+        
+        if not transfer.is_paid and not settlement.is_replaced:
+            block["accessory"] = {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Mark as paid",
+                    "emoji": True
+                },
+                "style": "primary",
+                "value": f"{settlement.id}|{index}",
+                "action_id": "settle_transfer"
+            }
+        
+        blocks.append(block)
+    
+    hidden = [settlement.transfers[index] for index in order[len(shown):]]
+    if hidden:
+        unpaid = sum(1 for transfer in hidden if not transfer.is_paid)
+        text = f"...and {len(hidden)} more"
+        if unpaid:
+            text += f", {unpaid} of them unpaid; they are listed here as the payments above are marked as paid"
+        blocks.append({
+            "type": "context",
+            "elements": [
+                {
+                    "type": "mrkdwn",
+                    "text": text
+                }
+            ]
+        })
+    
+    return blocks
\ No newline at end of file
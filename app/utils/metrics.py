@@ -0,0 +1,254 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from 5ms to 10s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Format label pairs as {name="value",...}, or nothing without labels."""
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """Base for metrics with optional labels.
+
+    Each distinct set of label values gets a child holding its own value.
+    Children are cached, so recording is a dict lookup and an addition,
+    without locks: updates happen on the event loop.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        """Initialize the metric and register it."""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values: str):
+        """Get the child for a set of label values, e.g. labels("chat_postMessage")."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _default(self):
+        """The child of a metric without labels."""
+        return self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """Create the object holding one child's value."""
+
+    def render(self) -> List[str]:
+        """Render the metric in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(_format_labels(self.labelnames, values), values, child))
+        return lines
+
+    def _render_child(self, labels: str, values: Tuple[str, ...], child) -> List[str]:
+        """Render the samples of one child."""
+        return [f"{self.name}{labels} {_format_value(child.get())}"]
+
+
+class _Value:
+    """A single number, or a function computing it when metrics are collected."""
+
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Add to the value."""
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Subtract from the value."""
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        """Replace the value."""
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the value with function at collection time instead."""
+        self.function = function
+
+    def get(self) -> float:
+        """Get the current value."""
+        return self.function() if self.function else self.value
+
+
+class Counter(_Metric):
+    """A value that only goes up, like the number of Slack calls made."""
+
+    type_name = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Add to the counter of a metric without labels."""
+        self._default().inc(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read a metric without labels from a count kept elsewhere, e.g. coalescer.calls_saved."""
+        self._default().set_function(function)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, like the number of open debts."""
+
+    type_name = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def set(self, value: float) -> None:
+        """Set a metric without labels."""
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Add to a metric without labels."""
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Subtract from a metric without labels."""
+        self._default().dec(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute a metric without labels when metrics are collected."""
+        self._default().set_function(function)
+
+
+class _Timer:
+    """Context manager observing the time spent in its block."""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: "_HistogramValue"):
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class _HistogramValue:
+    """Bucket counts, sum and count of one histogram child."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        """Time a block: with histogram.labels("split").time(): ..."""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, like request latencies, in cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Optional["Registry"] = None
+    ):
+        """Initialize the histogram with sorted bucket upper bounds."""
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value: float) -> None:
+        """Record an observation on a metric without labels."""
+        self._default().observe(value)
+
+    def time(self) -> _Timer:
+        """Time a block on a metric without labels."""
+        return self._default().time()
+
+    def _render_child(self, labels: str, values: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        """Render the cumulative buckets, sum and count of one child."""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+            cumulative += count
+            bucket_labels = _format_labels(self.labelnames + ("le",), values + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """The set of metrics rendered by the /metrics endpoint."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        """Add a metric, refusing a second metric with the same name."""
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Get a registered metric by name."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Metrics register here unless given another registry
+REGISTRY = Registry()
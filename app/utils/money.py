@@ -0,0 +1,84 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+from app.utils.settlement import minimize_transfers
+
+# Amounts are stored as integers in the currency's minor unit (cents)
+MINOR_UNITS = 100
+CURRENCY_SYMBOL = "$"
+
+Amount = Union[int, float, str, Decimal]
+
+
+def to_minor(amount: Amount) -> int:
+    """Convert an amount in major units (e.g. "12.50") to integer minor units (1250).
+
+    Floats go through their shortest repr so 0.1 becomes exactly 10, and
+    fractions of a minor unit are rounded half up.
+    """
+    if isinstance(amount, float):
+        amount = repr(amount)
+    value = Decimal(amount) * MINOR_UNITS
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def is_whole_minor(amount: Decimal) -> bool:
+    """Whether an exact amount in major units is a whole number of minor units (no fractions of a cent)."""
+    return (amount * MINOR_UNITS) % 1 == 0
+
+
+def to_major(amount_minor: int) -> Decimal:
+    """Convert integer minor units back to an exact Decimal in major units."""
+    return Decimal(amount_minor) / MINOR_UNITS
+
+
+def format_amount(amount_minor: int) -> str:
+    """Format minor units for display, showing cents only when there are any."""
+    major, minor = divmod(abs(amount_minor), MINOR_UNITS)
+    sign = "-" if amount_minor < 0 else ""
+    if minor:
+        return f"{sign}{CURRENCY_SYMBOL}{major:,}.{minor:02d}"
+    return f"{sign}{CURRENCY_SYMBOL}{major:,}"
+
+
+def allocate(total_minor: int, count: int) -> List[int]:
+    """Split an amount into count integer parts that add up to it exactly.
+
+    The remainder is spread one minor unit at a time over the first parts,
+    so the same inputs always give the same split.
+    """
+    base, remainder = divmod(total_minor, count)
+    return [base + 1] * remainder + [base] * (count - remainder)
+
+
+def compute_debts(
+    total_minor: int,
+    payers: Sequence[Tuple[str, int]],
+    attendees: Sequence[str]
+) -> List[Tuple[str, str, int]]:
+    """Compute the (debtor_id, payer_id, amount) debts of one expense.
+
+    Every attendee owes an equal share of the total, with any remainder going
+    to the first attendees, minus what they paid.
+    """
+    if not attendees:
+        return []
+
+    # Positive balances owe money, negative balances are owed money
+    balances: Dict[str, int] = {}
+    for attendee, share in zip(attendees, allocate(total_minor, len(attendees))):
+        balances[attendee] = balances.get(attendee, 0) + share
+    for user_id, paid in payers:
+        balances[user_id] = balances.get(user_id, 0) - paid
+
+    return minimize_transfers(balances)
+
+
+def compute_debts_batch(
+    expenses: Iterable[Tuple[int, Sequence[Tuple[str, int]], Sequence[str]]]
+) -> List[List[Tuple[str, str, int]]]:
+    """Compute the debts of many (total_minor, payers, attendees) expenses in one call."""
+    return [
+        compute_debts(total_minor, payers, attendees)
+        for total_minor, payers, attendees in expenses
+    ]
@@ -0,0 +1,54 @@
+from typing import Dict, Iterable, List, Tuple
+
+
+def net_balances(debts: Iterable[Tuple[str, str, int]]) -> Dict[str, int]:
+    """Compute each user's net balance from (debtor_id, payer_id, amount) debts.
+    
+    Amounts are in minor units. A positive balance means the user owes money,
+    a negative one that they are owed.
+    """
+    balances: Dict[str, int] = {}
+    
+    for debtor_id, payer_id, amount in debts:
+        balances[debtor_id] = balances.get(debtor_id, 0) + amount
+        balances[payer_id] = balances.get(payer_id, 0) - amount
+    
+    return balances
+
+
+def minimize_transfers(balances: Dict[str, int]) -> List[Tuple[str, str, int]]:
+    """Compute a minimal set of (debtor_id, payer_id, amount) transfers that settles the balances.
+    
+    Debtors and creditors are sorted by amount and matched with two pointers:
+    each transfer settles at least one of the two users, so there are at most
+    n - 1 transfers and the matching itself is linear after the O(n log n) sort.
+    Users with equal balances keep their original order.
+    """
+    debtors = sorted(
+        ((user_id, amount) for user_id, amount in balances.items() if amount > 0),
+        key=lambda item: -item[1]
+    )
+    creditors = sorted(
+        ((user_id, -amount) for user_id, amount in balances.items() if amount < 0),
+        key=lambda item: -item[1]
+    )
+    
+    transfers = []
+    i = j = 0
+    owed = debtors[0][1] if debtors else 0
+    credit = creditors[0][1] if creditors else 0
+    
+    while i < len(debtors) and j < len(creditors):
+        amount = min(owed, credit)
+        transfers.append((debtors[i][0], creditors[j][0], amount))
+        owed -= amount
+        credit -= amount
+        
+        if not owed:
+            i += 1
+            owed = debtors[i][1] if i < len(debtors) else 0
+        if not credit:
+            j += 1
+            credit = creditors[j][1] if j < len(creditors) else 0
+    
+    return transfers
@@ -0,0 +1,78 @@
+"""Benchmark Expense.calculate_shares as the number of attendees grows.
+
+Compares the two-pointer settlement with the previous nested loop over
+attendees and payers.
+
+Run with: python -m benchmarks.bench_calculate_shares [attendee_count ...]
+"""
+import sys
+import time
+
+from app.models.expense import Expense, Payment, Debt
+
+PAYER_COUNT = 5
+
+
+def legacy_calculate_shares(expense: Expense) -> None:
+    """The nested-loop share calculation calculate_shares used to do."""
+    share_per_person = expense.total_amount / len(expense.attendees)
+    payer_amounts = {payment.user_id: payment.amount for payment in expense.payers}
+    debts = []
+    
+    for attendee in expense.attendees:
+        remaining_to_pay = share_per_person - payer_amounts.get(attendee, 0)
+        if remaining_to_pay > 0:
+            for payer_id, payer_amount in payer_amounts.items():
+                payer_excess = payer_amount - share_per_person
+                if payer_excess > 0 and payer_id != attendee:
+                    amount_to_pay = min(remaining_to_pay, payer_excess)
+                    debts.append(Debt(debtor_id=attendee, payer_id=payer_id, amount=amount_to_pay))
+                    remaining_to_pay -= amount_to_pay
+                    if remaining_to_pay <= 0:
+                        break
+    
+    expense.debts = debts
+
+
+def build_expense(attendee_count: int) -> Expense:
+    """Build an all-hands expense paid by a few attendees."""
+    attendees = [f"U{i}" for i in range(attendee_count)]
+    payer_count = min(PAYER_COUNT, attendee_count)
+    total = 100.0 * attendee_count
+    return Expense(
+        id="E1",
+        total_amount=total,
+        payers=[Payment(user_id=attendees[i], amount=total / payer_count) for i in range(payer_count)],
+        attendees=attendees,
+        description="All hands",
+        channel_id="C1",
+        created_by="U0"
+    )
+
+
+def time_call(func, expense: Expense, repeat: int) -> float:
+    """Return the average duration of a call in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(expense)
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000, 10000]
+    
+    for size in sizes:
+        expense = build_expense(size)
+        repeat = max(1, 10000 // size)
+        current = time_call(Expense.calculate_shares, expense, repeat)
+        debt_count = len(expense.debts)
+        legacy = time_call(legacy_calculate_shares, expense, repeat)
+        
+        print(
+            f"{size:>6} attendees: calculate_shares {current:8.3f}ms ({debt_count} debts)  "
+            f"legacy {legacy:8.3f}ms ({len(expense.debts)} debts)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Cold-start benchmark: how soon a fresh process serves requests.
+
+Each run starts a new interpreter and measures:
+
+- import: the time to import app.main, and whether that imported the Slack stack
+- health: the time from spawning uvicorn until GET /health answers
+- ready: the time until GET /ready answers 200 (services up, token verified)
+- command: the time until the first signed /split command is acknowledged
+
+uvicorn runs the app on a local port, against tests.fake_slack.FakeSlackServer
+served from this process. With --eager, every client and service is built
+before uvicorn starts, as when app.main built them at import time.
+
+Run with: python -m benchmarks.bench_cold_start [--runs 5] [--eager]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+from typing import Dict, List
+from urllib.parse import urlencode
+
+import aiohttp
+
+from tests.fake_slack import FakeSlackServer, signed_headers
+
+SIGNING_SECRET = "bench-secret"
+
+MEASURE_IMPORT = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({
+    "import_s": time.perf_counter() - started,
+    "slack_imported": "slack_bolt" in sys.modules or "slack_sdk" in sys.modules
+}))
+"""
+
+SERVE = """
+import sys, uvicorn
+import app.main
+if "--eager" in sys.argv:
+    app.main.components()
+uvicorn.run(app.main.app, host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def free_port() -> int:
+    """Pick a free local port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def child_env(slack_url: str) -> Dict[str, str]:
+    """The environment of the app's process, with an in-memory store."""
+    env = {
+        **os.environ,
+        "SLACK_BOT_TOKEN": "xoxb-bench",
+        "SLACK_SIGNING_SECRET": SIGNING_SECRET,
+        "SLACK_API_URL": slack_url,
+    }
+    env.pop("SPLITBOT_DB_PATH", None)
+    return env
+
+
+async def measure_import(env: Dict[str, str]) -> Dict:
+    """Import app.main in a fresh interpreter and return its timing."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", MEASURE_IMPORT, env=env, stdout=asyncio.subprocess.PIPE
+    )
+    stdout, _ = await process.communicate()
+    return json.loads(stdout)
+
+
+async def wait_for(session: aiohttp.ClientSession, url: str, started: float, timeout: float = 30) -> float:
+    """Poll a URL until it answers 200 and return the seconds since started."""
+    while time.perf_counter() - started < timeout:
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except aiohttp.ClientConnectionError:
+            pass  # Not listening yet
+        await asyncio.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+
+async def measure_serving(env: Dict[str, str], eager: bool) -> Dict[str, float]:
+    """Start uvicorn and time the first /health, /ready and /split responses."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    body = urlencode({
+        "command": "/split",
+        "text": "total 30 paid_by <@U1> attendees <@U1> <@U2> <@U3> note Lunch",
+        "channel_id": "C1",
+        "user_id": "U1",
+        "team_id": "T1",
+        "trigger_id": "trigger-cold-start",
+    })
+
+    started = time.perf_counter()
+    args = [sys.executable, "-c", SERVE, str(port)] + (["--eager"] if eager else [])
+    process = await asyncio.create_subprocess_exec(*args, env=env)
+    try:
+        async with aiohttp.ClientSession() as session:
+            health = await wait_for(session, f"{base}/health", started)
+            ready = await wait_for(session, f"{base}/ready", started)
+            headers = {name.decode(): value.decode() for name, value in signed_headers(SIGNING_SECRET, body)}
+            async with session.post(f"{base}/slack/commands", data=body, headers=headers) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"/slack/commands answered {response.status}")
+            command = time.perf_counter() - started
+    finally:
+        process.terminate()
+        await process.wait()
+
+    return {"health_s": health, "ready_s": ready, "command_s": command}
+
+
+async def run(args) -> None:
+    """Serve the fake Slack API and measure each run in a fresh process."""
+    server = FakeSlackServer()
+    env = child_env(await server.start())
+    results: List[Dict] = []
+    try:
+        for _ in range(args.runs):
+            result = await measure_import(env)
+            result.update(await measure_serving(env, args.eager))
+            results.append(result)
+    finally:
+        await server.stop()
+
+    mode = "eager" if args.eager else "lazy"
+    print(f"{mode} start, median of {args.runs} runs "
+          f"(Slack stack imported with app.main: {results[0]['slack_imported']})")
+    for key, label in (("import_s", "import app.main"), ("health_s", "first /health"),
+                       ("ready_s", "/ready"), ("command_s", "first /split ack")):
+        values = [result[key] for result in results]
+        print(f"  {label:<18} {statistics.median(values) * 1000:8.1f}ms  "
+              f"(min {min(values) * 1000:.1f}ms, max {max(values) * 1000:.1f}ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to measure")
+    parser.add_argument("--eager", action="store_true", help="build every component before serving")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark parse_split_command against the previous regex-based parser.
+
+Run with: python -m benchmarks.bench_command_parser [mention_count ...]
+"""
+import re
+import sys
+import timeit
+from decimal import Decimal
+from typing import Dict
+
+from app.utils.command_parser import parse_split_command
+
+
+def legacy_parse_split_command(command_text: str) -> Dict:
+    """The regex-based parser parse_split_command replaced."""
+    # Initialize the result
+    result = {
+        "total_amount": None,
+        "payers": [],
+        "attendees": [],
+        "description": "Expense"
+    }
+    
+    # Extract the total amount
+    total_match = re.search(r'total\s+(\d+(\.\d+)?)', command_text)
+    if total_match:
+        result["total_amount"] = Decimal(total_match.group(1))
+    
+    # Extract the payers
+    paid_by_section = re.search(r'paid_by\s+(.*?)(?=attendees|note|$)', command_text)
+    if paid_by_section:
+        paid_by_text = paid_by_section.group(1).strip()
+        
+        # Match user IDs with optional amounts
+        # Format: @user1 [amount1] @user2 [amount2] ...
+        payer_matches = re.finditer(r'<@([A-Z0-9]+)>\s*(?:(\d+(\.\d+)?)\s*)?', paid_by_text)
+        
+        # If we have a single payer with no amount, assume they paid the total
+        payers = list(payer_matches)
+        if len(payers) == 1 and not payers[0].group(2):
+            result["payers"].append({
+                "user_id": payers[0].group(1),
+                "amount": result["total_amount"]
+            })
+        else:
+            # Process multiple payers with specified amounts
+            total_paid = Decimal(0)
+            for match in payers:
+                user_id = match.group(1)
+                if match.group(2):  # Amount specified
+                    amount = Decimal(match.group(2))
+                    result["payers"].append({
+                        "user_id": user_id,
+                        "amount": amount
+                    })
+                    total_paid += amount
+            
+            # Validate that the sum of paid amounts equals the total
+            if total_paid != result["total_amount"]:
+                raise ValueError(f"Sum of paid amounts ({total_paid}) does not equal total amount ({result['total_amount']})")
+    
+    # Extract the attendees
+    attendees_section = re.search(r'attendees\s+(.*?)(?=note|$)', command_text)
+    if attendees_section:
+        attendees_text = attendees_section.group(1).strip()
+        
+        # Match user IDs
+        attendee_matches = re.finditer(r'<@([A-Z0-9]+)>', attendees_text)
+        for match in attendee_matches:
+            result["attendees"].append(match.group(1))
+    
+    # Extract the description
+    note_match = re.search(r'note\s+(.*?)$', command_text)
+    if note_match:
+        result["description"] = note_match.group(1).strip()
+    
+    return result
+
+
+def build_command(mention_count: int) -> str:
+    """Build a command with one payer and mention_count attendees."""
+    attendees = " ".join(f"<@U{i:08d}>" for i in range(mention_count))
+    return f"total 1000 paid_by <@U00000000> attendees {attendees} note Team dinner"
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [5, 50, 500]
+    
+    for size in sizes:
+        command = build_command(size)
+        number = max(10, 20000 // size)
+        current = min(timeit.repeat(lambda: parse_split_command(command), number=number, repeat=5))
+        legacy = min(timeit.repeat(lambda: legacy_parse_split_command(command), number=number, repeat=5))
+        
+        print(
+            f"{size:>4} mentions: parse_split_command {current / number * 1e6:8.1f}us  "
+            f"legacy {legacy / number * 1e6:8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
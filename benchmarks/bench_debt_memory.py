@@ -0,0 +1,54 @@
+"""Benchmark the memory and construction cost of debts.
+
+Compares the slotted Debt record with DebtModel, the pydantic model debts
+used to be.
+
+Run with: python -m benchmarks.bench_debt_memory [debt_count]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from app.models.expense import Debt, DebtModel
+
+
+def build(cls, count: int, user_ids):
+    """Build count debts between a fixed pool of users."""
+    return [
+        cls(debtor_id=user_ids[i % len(user_ids)], payer_id=user_ids[0], amount=i % 10000)
+        for i in range(count)
+    ]
+
+
+def measure(cls, count: int):
+    """Return (bytes per debt, debts per second) for building count debts."""
+    # The user IDs are shared, so only the debts themselves are counted
+    user_ids = [f"U{i}" for i in range(1000)]
+    
+    gc.collect()
+    start = time.perf_counter()
+    debts = build(cls, count, user_ids)
+    elapsed = time.perf_counter() - start
+    del debts
+    
+    gc.collect()
+    tracemalloc.start()
+    debts = build(cls, count, user_ids)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del debts
+    
+    return size / count, count / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    
+    for cls in (Debt, DebtModel):
+        bytes_per_debt, per_second = measure(cls, count)
+        print(f"{cls.__name__:>9}: {bytes_per_debt:6.0f} bytes/debt  {per_second:10.0f} debts/s  ({count} debts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark debt lookups on a large expense store.
+
+Run with: python -m benchmarks.bench_expense_service [expense_count]
+"""
+import random
+import sys
+import time
+
+from app.services.expense_service import ExpenseService
+
+
+def build_store(expense_count: int) -> ExpenseService:
+    """Build a store where all but the last 100 expenses are fully settled."""
+    service = ExpenseService()
+    
+    for i in range(expense_count):
+        expense = service.create_expense(
+            total_amount=300,
+            payers=[{"user_id": f"U{i % 50}", "amount": 300}],
+            attendees=[f"U{i % 50}", f"U{(i + 1) % 50}", f"U{(i + 2) % 50}"],
+            description=f"Expense {i}",
+            channel_id="C1",
+            created_by=f"U{i % 50}"
+        )
+        if i < expense_count - 100:
+            for debt in expense.debts:
+                service.mark_debt_as_paid(expense.id, debt.debtor_id, debt.payer_id)
+    
+    return service
+
+
+def time_per_call(func, repeat: int = 1000) -> float:
+    """Return the average duration of a call in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    
+    for size in sizes:
+        service = build_store(size)
+        expense_ids = list(service.expenses)
+        expense = service.get_expense(random.choice(expense_ids[-100:]))
+        debt = expense.debts[0]
+        
+        pending = time_per_call(service.get_pending_debts, repeat=100)
+        lookup = time_per_call(
+            lambda: service.get_pending_debt(expense.id, debt.debtor_id, debt.payer_id)
+        )
+        reminder = time_per_call(
+            lambda: service.update_reminder_timestamp(expense.id, debt.debtor_id, debt.payer_id)
+        )
+        
+        print(
+            f"{size:>7} expenses: get_pending_debts {pending:8.1f}us  "
+            f"get_pending_debt {lookup:6.2f}us  update_reminder_timestamp {reminder:6.2f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""End-to-end load test of the Slack endpoints against a local fake Slack API.
+
+Signed /split commands are sent to /slack/commands, then a confirm_payment
+click for every debt they created to /slack/events, through the FastAPI app
+in-process. The bot's Web API calls go to tests.fake_slack.FakeSlackServer.
+
+For each phase this reports the latency until Slack gets its response
+(p50/p95/p99), commands per second until every resulting Slack call was
+made, and Slack calls per command.
+
+Run with: python -m benchmarks.bench_load [--commands 500] [--concurrency 50]
+    [--attendees 4] [--slack-latency 0.02] [--slack-rate-limit N]
+    [--client-rate-limits] [--coalesce-window 0.05] [--db splitbot.db]
+
+SlackDelivery's own token buckets, which pace calls at Slack's published
+limits, are lifted unless --client-rate-limits is given.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+from urllib.parse import urlencode
+
+from tests.fake_slack import FakeSlackServer, call_asgi, signed_headers
+
+SIGNING_SECRET = "bench-secret"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of values."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def split_body(n: int, attendees: int) -> str:
+    """Build the form body of the nth /split command."""
+    users = [f"<@U{(n + i) % 1000}>" for i in range(attendees)]
+    return urlencode({
+        "command": "/split",
+        "text": f"total {attendees * 25} paid_by {users[0]} attendees {' '.join(users)} note Lunch {n}",
+        "channel_id": f"C{n % 20}",
+        "user_id": f"U{n % 1000}",
+        "team_id": "T1",
+        "trigger_id": f"trigger-{n}",
+    })
+
+
+def confirm_payment_body(expense_id: str, debtor_id: str, payer_id: str) -> str:
+    """Build the form body of a click on a debtor's "Yes, I've paid" button."""
+    value = f"{expense_id}|{debtor_id}|{payer_id}"
+    payload = {
+        "type": "block_actions",
+        "team": {"id": "T1"},
+        "user": {"id": debtor_id},
+        "channel": {"id": f"D{debtor_id}"},
+        "trigger_id": f"trigger-{value}",
+        "message": {"ts": "1.000000", "blocks": []},
+        "actions": [{
+            "type": "button",
+            "action_id": "confirm_payment",
+            "block_id": "confirm",
+            "value": value,
+            "action_ts": "1.000000",
+        }],
+    }
+    return urlencode({"payload": json.dumps(payload)})
+
+
+async def run_phase(
+    name: str,
+    main,
+    server: FakeSlackServer,
+    path: str,
+    bodies: List[str],
+    concurrency: int,
+    settled: Callable[[], Awaitable[None]]
+) -> Dict[str, float]:
+    """Send bodies with at most concurrency requests in flight and measure the phase."""
+    calls_before = len(server.calls)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def send(body: str) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            status, _ = await call_asgi(main.app, path, body, headers=signed_headers(SIGNING_SECRET, body))
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                raise RuntimeError(f"{path} answered {status}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(body) for body in bodies))
+    acked = time.perf_counter() - started
+    await settled()
+    elapsed = time.perf_counter() - started
+
+    slack_calls = len(server.calls) - calls_before
+    result = {
+        "requests": len(bodies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "acked_per_second": len(bodies) / acked,
+        "commands_per_second": len(bodies) / elapsed,
+        "slack_calls_per_command": slack_calls / len(bodies),
+    }
+    print(
+        f"{name:<16} {result['requests']:>6} requests  "
+        f"p50 {result['p50_ms']:7.2f}ms  p95 {result['p95_ms']:7.2f}ms  p99 {result['p99_ms']:7.2f}ms  "
+        f"{result['commands_per_second']:8.1f} commands/s ({result['acked_per_second']:.0f} acked/s)  "
+        f"{result['slack_calls_per_command']:5.2f} Slack calls/command"
+    )
+    return result
+
+
+async def run(args) -> None:
+    """Start the fake Slack server and the app, then run both phases."""
+    server = FakeSlackServer(latency=args.slack_latency, rate_limit=args.slack_rate_limit)
+    url = await server.start()
+
+    os.environ.update({
+        "SLACK_BOT_TOKEN": "xoxb-bench",
+        "SLACK_SIGNING_SECRET": SIGNING_SECRET,
+        "SLACK_API_URL": url + "/",
+        "SPLITBOT_COALESCE_WINDOW": str(args.coalesce_window),
+    })
+    if args.db:
+        os.environ["SPLITBOT_DB_PATH"] = args.db
+    else:
+        os.environ.pop("SPLITBOT_DB_PATH", None)
+    main = importlib.import_module("app.main")
+    if not args.client_rate_limits:
+        # Leave rate limiting to the fake server, so what is measured is the bot itself
+        main.delivery.rate_limits = {method: (1e9, 10 ** 6) for method in main.delivery.rate_limits}
+
+    async def outbox_drained() -> None:
+        """Wait until the coalescers are flushed and the outbox is empty."""
+        await main.slack_commands.summary_refreshes.drain()
+        await main.slack_commands.payment_notifications.drain()
+        while main.outbox.count():
+            await asyncio.sleep(0.005)
+        # Messages in flight have left the outbox once their call returned
+        await asyncio.sleep(0)
+
+    try:
+        async with main.lifespan(main.app):
+            # Wait for the background startup, which verifies the token with the fake server
+            while (await call_asgi(main.app, "/ready", method="GET"))[0] != 200:
+                await asyncio.sleep(0.01)
+
+            await run_phase(
+                "split", main, server, "/slack/commands",
+                [split_body(n, args.attendees) for n in range(args.commands)],
+                args.concurrency, outbox_drained
+            )
+
+            expense_service = main.slack_commands.expense_service
+            bodies = [
+                confirm_payment_body(entry["expense_id"], entry["debt"].debtor_id, entry["debt"].payer_id)
+                for entry in expense_service.get_pending_debts()
+            ]
+            await run_phase(
+                "confirm_payment", main, server, "/slack/events",
+                bodies, args.concurrency, outbox_drained
+            )
+    finally:
+        await server.stop()
+
+    limited = sum(server.rate_limited.values())
+    if limited:
+        print(f"Slack answered {limited} calls with 429")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=500, help="number of /split commands")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at once")
+    parser.add_argument("--attendees", type=int, default=4, help="attendees per expense")
+    parser.add_argument("--slack-latency", type=float, default=0.02, help="fake Slack latency in seconds")
+    parser.add_argument("--slack-rate-limit", type=int, default=None, help="fake Slack calls per method per second")
+    parser.add_argument("--client-rate-limits", action="store_true",
+                        help="keep SlackDelivery's per-method token buckets at Slack's published limits")
+    parser.add_argument("--coalesce-window", type=float, default=0.05, help="SPLITBOT_COALESCE_WINDOW")
+    parser.add_argument("--db", default=None, help="SPLITBOT_DB_PATH, to measure the SQLite store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark creating many expenses one at a time versus in one batch.
+
+Run with: python -m benchmarks.bench_money [expense_count ...]
+"""
+import sys
+import time
+
+from app.services.expense_service import ExpenseService
+
+
+def build_items(count: int):
+    """Build create_expense arguments for a run of team lunches."""
+    return [
+        {
+            "total_amount": f"{100 + i % 50}.{i % 100:02d}",
+            "payers": [{"user_id": f"U{i % 7}", "amount": f"{100 + i % 50}.{i % 100:02d}"}],
+            "attendees": [f"U{(i + j) % 20}" for j in range(6)],
+            "description": f"Lunch {i}",
+            "channel_id": "C1",
+            "created_by": f"U{i % 7}"
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000]
+    
+    for size in sizes:
+        items = build_items(size)
+        
+        service = ExpenseService()
+        start = time.perf_counter()
+        for item in items:
+            service.create_expense(**item)
+        single = time.perf_counter() - start
+        
+        service = ExpenseService()
+        start = time.perf_counter()
+        service.create_expenses(items)
+        batch = time.perf_counter() - start
+        
+        print(
+            f"{size:>6} expenses: create_expense {size / single:9.0f}/s  "
+            f"create_expenses {size / batch:9.0f}/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
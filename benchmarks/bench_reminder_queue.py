@@ -0,0 +1,53 @@
+"""Benchmark the cost of one reminder tick as the number of open debts grows.
+
+Compares popping the due debts from ReminderQueue with the previous
+approach of scanning every pending debt on each tick.
+
+Run with: python -m benchmarks.bench_reminder_queue [open_debt_count ...]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app.services.reminder_queue import ReminderQueue
+
+DUE_PER_TICK = 10
+INTERVAL = timedelta(hours=24)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 1000000]
+    start = datetime(2024, 1, 1)
+    
+    for size in sizes:
+        due_times = [start + timedelta(seconds=random.uniform(0, 86400)) for _ in range(size)]
+        keys = [(f"E{i}", f"D{i}", "P") for i in range(size)]
+        
+        queue = ReminderQueue()
+        for key, due_at in zip(keys, due_times):
+            queue.push(key, due_at)
+        
+        # Each tick wakes up exactly when the next DUE_PER_TICK debts are due
+        ticks = min(100, size // DUE_PER_TICK)
+        tick_times = sorted(due_times)[DUE_PER_TICK - 1::DUE_PER_TICK]
+        elapsed = 0.0
+        for now in tick_times[:ticks]:
+            tick_start = time.perf_counter()
+            for key in queue.pop_due(now):
+                queue.push(key, now + INTERVAL)
+            elapsed += time.perf_counter() - tick_start
+        heap_tick = elapsed / ticks * 1e6
+        
+        # The previous scheduler compared every pending debt on each tick
+        pending = list(zip(keys, due_times))
+        now = start + timedelta(hours=12)
+        scan_start = time.perf_counter()
+        due = [key for key, due_at in pending if due_at <= now]
+        scan_tick = (time.perf_counter() - scan_start) * 1e6
+        
+        print(f"{size:>8} open debts: queue tick {heap_tick:8.1f}us  full scan tick {scan_tick:10.1f}us")
+
+
+if __name__ == "__main__":
+    main()
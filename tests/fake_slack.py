@@ -0,0 +1,168 @@
+"""A local fake of the Slack Web API, and of Slack's signed requests, for tests and benchmarks."""
+import asyncio
+import hashlib
+import hmac
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+
+def signed_headers(signing_secret: str, body: str) -> List[Tuple[bytes, bytes]]:
+    """Build the headers Slack sends with a form-encoded request body, signed with v0."""
+    timestamp = str(int(time.time()))
+    signature = "v0=" + hmac.new(
+        signing_secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256
+    ).hexdigest()
+    return [
+        (b"content-type", b"application/x-www-form-urlencoded"),
+        (b"x-slack-request-timestamp", timestamp.encode()),
+        (b"x-slack-signature", signature.encode()),
+    ]
+
+
+async def call_asgi(
+    app, path: str, body: str = "", method: str = "POST", headers: List[Tuple[bytes, bytes]] = ()
+) -> Tuple[int, bytes]:
+    """Send one HTTP request through an ASGI app in-process and return its status and body."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "server": ("test", 80),
+        "client": ("127.0.0.1", 1234),
+        "headers": list(headers),
+    }
+    messages = [{"type": "http.request", "body": body.encode(), "more_body": False}]
+    sent = []
+    finished = asyncio.Event()
+    
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # The client stays connected until the response is complete, as streaming responses expect
+        await finished.wait()
+        return {"type": "http.disconnect"}
+    
+    async def send(message):
+        sent.append(message)
+    
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    status = next(message["status"] for message in sent if message["type"] == "http.response.start")
+    return status, b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+
+
+class FakeSlackServer:
+    """Serve /api/<method> like Slack, with optional latency and rate limits.
+    
+    rate_limit is the number of calls allowed per method in each one-second
+    window; inject_429_every makes every Nth call fail with a 429 regardless.
+    Rate-limited calls answer with a Retry-After of retry_after seconds.
+    """
+    
+    def __init__(
+        self,
+        latency: float = 0.0,
+        rate_limit: Optional[int] = None,
+        inject_429_every: Optional[int] = None,
+        retry_after: int = 1
+    ):
+        """Initialize the server configuration."""
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.inject_429_every = inject_429_every
+        self.retry_after = retry_after
+        self.calls: List[Dict] = []
+        self.rate_limited: Dict[str, int] = defaultdict(int)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url: Optional[str] = None
+        self._windows: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+        self._attempts = 0
+        self._runner: Optional[web.AppRunner] = None
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL to give the Web client."""
+        app = web.Application()
+        app.router.add_post("/api/{method}", self._handle)
+        app.router.add_get("/api/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/api/"
+        return self.url
+    
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner:
+            await self._runner.cleanup()
+    
+    def calls_to(self, method: str) -> List[Dict]:
+        """Return the successful calls made to a method, e.g. "chat.postMessage"."""
+        return [call["args"] for call in self.calls if call["method"] == method]
+    
+    def _is_rate_limited(self, method: str) -> bool:
+        """Decide whether this call should get a 429."""
+        self._attempts += 1
+        if self.inject_429_every and self._attempts % self.inject_429_every == 0:
+            return True
+        
+        if self.rate_limit is None:
+            return False
+        
+        window = self._windows[method]
+        now = time.monotonic()
+        if now - window[0] >= 1:
+            window[0], window[1] = now, 0
+        window[1] += 1
+        return window[1] > self.rate_limit
+    
+    async def _handle(self, request: web.Request) -> web.Response:
+        """Answer a Web API call."""
+        method = request.match_info["method"]
+        args = dict(request.query)  # Methods like users.info send their arguments as params
+        if request.content_type == "application/json":
+            args.update(await request.json())
+        elif request.method == "POST":
+            args.update(await request.post())
+        
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            
+            if self._is_rate_limited(method):
+                self.rate_limited[method] += 1
+                return web.json_response(
+                    {"ok": False, "error": "ratelimited"},
+                    status=429,
+                    headers={"Retry-After": str(self.retry_after)}
+                )
+            
+            self.calls.append({"method": method, "args": args})
+            body = {"ok": True}
+            if method in ("chat.postMessage", "chat.update"):
+                body.update(channel=args.get("channel"), ts=f"{time.time():.6f}")
+            elif method == "conversations.open":
+                body["channel"] = {"id": "D" + str(args.get("users", "")).split(",")[0]}
+            elif method == "auth.test":
+                body.update(team_id="T1", user_id="UBOT", bot_id="BBOT", team="Test", user="splitbot")
+            elif method == "users.info":
+                body["user"] = {"id": args.get("user"), "tz": "UTC", "profile": {}}
+            return web.json_response(body)
+        finally:
+            self.in_flight -= 1
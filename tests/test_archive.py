@@ -0,0 +1,129 @@
+import os
+from datetime import datetime
+from app.services.expense_service import ExpenseService
+from app.storage.archive import ExpenseArchive
+from app.storage.sqlite import SQLiteExpenseStore
+
+
+def create_lunch(service, description="Lunch"):
+    """Create an expense paid by USER1 and shared by three."""
+    return service.create_expense(
+        total_amount=90,
+        payers=[{"user_id": "USER1", "amount": 90}],
+        attendees=["USER1", "USER2", "USER3"],
+        description=description,
+        channel_id="C1",
+        created_by="USER1"
+    )
+
+
+def settle(service, expense):
+    """Mark every debt of an expense as paid."""
+    for debt in expense.debts:
+        service.mark_debt_as_paid(expense.id, debt.debtor_id, debt.payer_id)
+
+
+def test_settled_expenses_move_to_the_archive(tmp_path):
+    """Test that a settled expense leaves the store and the cache but can still be read."""
+    store = SQLiteExpenseStore(str(tmp_path / "splitbot.db"))
+    service = ExpenseService(store, archive=ExpenseArchive(str(tmp_path / "splitbot.archive")))
+    paid = create_lunch(service)
+    pending = create_lunch(service, "Dinner")
+    
+    service.mark_debt_as_paid(paid.id, "USER2", "USER1")
+    assert paid.id not in service.archive
+    settle(service, paid)
+    
+    assert paid.id in service.archive
+    assert list(service.expenses) == [pending.id]
+    assert all(key[0] == pending.id for key in service._debts)
+    assert store.load_expense(paid.id) is None
+    
+    archived = service.get_expense(paid.id)
+    assert archived == paid
+    assert service.get_debt(paid.id, "USER3", "USER1").is_paid
+    assert not service.mark_debt_as_paid(paid.id, "USER3", "USER1")
+    assert service.count_debts() == {"open": 2, "settled": 2}
+    assert [expense.id for expense in service.get_all_expenses()] == [paid.id, pending.id]
+    service.close()
+
+
+def test_archive_is_reindexed_on_open(tmp_path):
+    """Test that archived expenses are found after a restart and a torn record is cut off."""
+    db_path, archive_path = str(tmp_path / "splitbot.db"), str(tmp_path / "splitbot.archive")
+    service = ExpenseService(SQLiteExpenseStore(db_path), archive=ExpenseArchive(archive_path))
+    expenses = [create_lunch(service, f"Lunch {n}") for n in range(3)]
+    for expense in expenses:
+        settle(service, expense)
+    service.close()
+    
+    size = os.path.getsize(archive_path)
+    with open(archive_path, "ab") as file:
+        file.write(b"\x05\x00torn")
+    
+    archive = ExpenseArchive(archive_path)
+    assert os.path.getsize(archive_path) == size
+    assert len(archive) == 3
+    assert archive.settled_debts == 6
+    assert archive.get(expenses[1].id).description == "Lunch 1"
+    assert archive.get("missing") is None
+    archive.close()
+
+
+def test_archive_finds_records_appended_by_another_process(tmp_path):
+    """Test that a miss picks up records another writer appended since the file was indexed."""
+    path = str(tmp_path / "splitbot.archive")
+    reader, writer = ExpenseArchive(path), ExpenseArchive(path)
+    expense = create_lunch(ExpenseService())
+    
+    writer.append([expense])
+    
+    assert reader.get(expense.id) == expense
+    reader.close()
+    writer.close()
+
+
+def test_archiving_waits_for_the_grace_period(tmp_path):
+    """Test that settled expenses stay in the store for archive_after seconds, until closed."""
+    path = str(tmp_path / "splitbot.db")
+    service = ExpenseService(
+        SQLiteExpenseStore(path), archive=ExpenseArchive(str(tmp_path / "splitbot.archive")), archive_after=60
+    )
+    expense = create_lunch(service)
+    settle(service, expense)
+    
+    assert expense.id not in service.archive
+    assert service.archive_settled() == 0
+    assert service.archive_settled(grace=0) == 1
+    assert service.get_expense(expense.id) == expense
+
+
+def test_compact_archives_expenses_settled_before_the_archive(tmp_path):
+    """Test that settled expenses already in the store are archived in batches."""
+    path = str(tmp_path / "splitbot.db")
+    service = ExpenseService(SQLiteExpenseStore(path))
+    service.create_expenses([
+        {
+            "total_amount": 20,
+            "payers": [{"user_id": "U1", "amount": 20}],
+            "attendees": ["U1", "U2"],
+            "description": f"Coffee {n}",
+            "channel_id": "C1",
+            "created_by": "U1",
+            "created_at": datetime(2024, 1, 1 + n),
+            "settled": n < 3
+        }
+        for n in range(4)
+    ])
+    service.close()
+    
+    service = ExpenseService(SQLiteExpenseStore(path), archive=ExpenseArchive(str(tmp_path / "splitbot.archive")))
+    assert service.compact(limit=2) == 2
+    assert service.compact(limit=2) == 1
+    assert service.compact(limit=2) == 0
+    
+    assert service.count_debts() == {"open": 1, "settled": 3}
+    rows = list(service.iter_debt_rows())
+    assert [row["description"] for row in rows] == [f"Coffee {n}" for n in range(4)]
+    assert len(list(service.iter_debt_rows(is_paid=False))) == 1
+    service.close()
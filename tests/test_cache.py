@@ -0,0 +1,38 @@
+from app.utils.cache import TTLCache
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_the_ttl():
+    """Test that an entry is served until its ttl passes, then counted as a miss."""
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set("U1", "D1")
+    
+    clock.now = 9.9
+    assert cache.get("U1") == "D1"
+    clock.now = 10
+    assert cache.get("U1") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses, cache.hit_rate) == (1, 1, 0.5)
+
+
+def test_least_recently_used_entry_is_evicted():
+    """Test that a full cache evicts the entry read longest ago."""
+    cache = TTLCache(ttl=60, max_size=2)
+    cache.set("U1", "D1")
+    cache.set("U2", "D2")
+    cache.get("U1")
+    cache.set("U3", "D3")
+    
+    assert "U1" in cache
+    assert "U2" not in cache
+    assert "U3" in cache
@@ -0,0 +1,37 @@
+import asyncio
+from app.services.coalescer import Coalescer
+
+
+async def submit_burst(window, items, then_wait):
+    """Submit items as one burst and return what was flushed."""
+    flushed = []
+    
+    async def flush(key, batch):
+        flushed.append((key, batch))
+    
+    coalescer = Coalescer(flush, window=window)
+    for key, item in items:
+        coalescer.submit(key, item)
+    if then_wait:
+        await asyncio.sleep(window * 2)
+    else:
+        await coalescer.drain()
+    return flushed, coalescer
+
+
+def test_burst_is_flushed_once_per_key():
+    """Test that items submitted within the window share one flush per key."""
+    items = [("E1", "USER1"), ("E1", "USER2"), ("E2", "USER1"), ("E1", "USER1")]
+    flushed, coalescer = asyncio.run(submit_burst(0.01, items, then_wait=True))
+    
+    assert sorted(flushed) == [("E1", ["USER1", "USER2", "USER1"]), ("E2", ["USER1"])]
+    assert coalescer.flushes == 2
+    assert coalescer.calls_saved == 2
+
+
+def test_drain_flushes_open_windows():
+    """Test that draining flushes items without waiting for the window to close."""
+    flushed, coalescer = asyncio.run(submit_burst(60, [("E1", "USER1")], then_wait=False))
+    
+    assert flushed == [("E1", ["USER1"])]
+    assert coalescer.calls_saved == 0
@@ -1,5 +1,6 @@
 import pytest
-from app.utils.command_parser import parse_split_command, extract_user_ids
+from decimal import Decimal
+from app.utils.command_parser import CommandParseError, parse_split_command, extract_user_ids
 
 
 def test_parse_split_command_single_payer():
@@ -40,4 +41,78 @@ def test_extract_user_ids():
     
     assert len(result) == 2
     assert "USER1" in result
-    assert "USER2" in result 
\ No newline at end of file
+    assert "USER2" in result 
+
+def test_parse_split_command_decimal_amounts_sum_exactly():
+    """Test that decimal payer amounts are compared with the total exactly."""
+    command = "total 0.3 paid_by <@USER1> 0.1 <@USER2> 0.2 attendees <@USER1> <@USER2> <@USER3>"
+    result = parse_split_command(command)
+    
+    assert result["total_amount"] == Decimal("0.3")
+    assert [payer["amount"] for payer in result["payers"]] == [Decimal("0.1"), Decimal("0.2")]
+
+
+def test_parse_split_command_sections_in_any_order():
+    """Test that sections can be given in any order."""
+    command = "attendees <@USER1> <@USER2> note Team lunch paid_by <@USER1> total 1,250.50"
+    result = parse_split_command(command)
+    
+    assert result["total_amount"] == Decimal("1250.50")
+    assert result["payers"] == [{"user_id": "USER1", "amount": Decimal("1250.50")}]
+    assert result["attendees"] == ["USER1", "USER2"]
+    assert result["description"] == "Team lunch"
+
+
+def test_parse_split_command_note_mentioning_a_keyword():
+    """Test that keywords inside a note do not end it unless a section follows."""
+    command = "total 30 paid_by <@USER1> note thanks to all attendees and the total crew attendees <@USER1> <@USER2>"
+    result = parse_split_command(command)
+    
+    assert result["description"] == "thanks to all attendees and the total crew"
+    assert result["attendees"] == ["USER1", "USER2"]
+
+
+def test_parse_split_command_note_mentioning_a_keyword_and_an_amount():
+    """Test that a keyword followed by its argument inside a note does not end it."""
+    command = "total 30 paid_by <@USER1> attendees <@USER1> <@USER2> note split the total 30 with tip"
+    result = parse_split_command(command)
+    
+    assert result["description"] == "split the total 30 with tip"
+    assert result["total_amount"] == Decimal("30")
+    
+    command = "note split the total 30 with tip total 30 paid_by <@USER1> attendees <@USER1>"
+    result = parse_split_command(command)
+    
+    assert result["description"] == "split the total 30 with tip"
+    assert result["attendees"] == ["USER1"]
+
+
+def test_parse_split_command_payer_without_amount():
+    """Test that a payer without an amount among several payers is an error."""
+    command = "total 100 paid_by <@USER1> 50 <@USER2> attendees <@USER1> <@USER2>"
+    
+    with pytest.raises(CommandParseError) as error:
+        parse_split_command(command)
+    
+    assert error.value.position == command.index("<@USER2>") + len("<@USER2>")
+
+
+def test_parse_split_command_reports_position_of_unexpected_text():
+    """Test that unexpected text is reported with its position."""
+    command = "total 100 paid_by <@USER1> attendees <@USER1> bob"
+    
+    with pytest.raises(CommandParseError) as error:
+        parse_split_command(command)
+    
+    assert error.value.position == command.index("bob")
+    assert "bob" in str(error.value)
+
+
+def test_parse_split_command_rejects_fractions_of_a_cent():
+    """Test that an amount that cannot be stored in whole cents is an error."""
+    command = "total 0.01 paid_by <@U1> 0.005 <@U2> 0.005 attendees <@U1> <@U2> <@U3>"
+    
+    with pytest.raises(CommandParseError) as error:
+        parse_split_command(command)
+    
+    assert error.value.position == command.index("0.005")
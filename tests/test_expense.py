@@ -0,0 +1,81 @@
+import pytest
+from app.models.expense import Debt, Expense, Payment
+
+
+def build_expense(total_amount, payers, attendees):
+    """Build an expense and calculate its shares."""
+    expense = Expense(
+        id="E1",
+        total_amount=total_amount,
+        payers=[Payment(user_id=user_id, amount=amount) for user_id, amount in payers],
+        attendees=attendees,
+        description="Dinner",
+        channel_id="C1",
+        created_by="USER1"
+    )
+    expense.calculate_shares()
+    return expense
+
+
+def owed_to(expense):
+    """Sum the debts owed to each payer."""
+    totals = {}
+    for debt in expense.debts:
+        totals[debt.payer_id] = totals.get(debt.payer_id, 0) + debt.amount
+    return totals
+
+
+def test_calculate_shares_single_payer():
+    """Test that every other attendee owes the payer their share."""
+    expense = build_expense(300, [("USER1", 300)], ["USER1", "USER2", "USER3"])
+    
+    assert [(d.debtor_id, d.payer_id, d.amount) for d in expense.debts] == [
+        ("USER2", "USER1", 100),
+        ("USER3", "USER1", 100)
+    ]
+
+
+def test_calculate_shares_does_not_over_assign_a_payer():
+    """Test that each payer is owed exactly what they paid beyond their share."""
+    expense = build_expense(
+        400, [("USER1", 250), ("USER2", 150)], ["USER1", "USER2", "USER3", "USER4"]
+    )
+    
+    assert owed_to(expense) == {"USER1": 150, "USER2": 50}
+    assert len(expense.debts) == 3
+
+
+def test_calculate_shares_payer_who_did_not_attend():
+    """Test that a payer who did not attend is owed the whole amount."""
+    expense = build_expense(200, [("USER9", 200)], ["USER1", "USER2"])
+    
+    assert owed_to(expense) == {"USER9": 200}
+    assert {debt.debtor_id for debt in expense.debts} == {"USER1", "USER2"}
+
+
+def test_debts_validate_and_serialize_at_the_edges():
+    """Test that debts given as dictionaries are validated and dumped back as dictionaries."""
+    expense = Expense(
+        id="E1",
+        total_amount=200,
+        payers=[{"user_id": "USER1", "amount": "200"}],
+        attendees=["USER1", "USER2"],
+        description="Dinner",
+        channel_id="C1",
+        created_by="USER1",
+        debts=[{"debtor_id": "USER2", "payer_id": "USER1", "amount": 100}]
+    )
+    
+    assert isinstance(expense.debts[0], Debt)
+    assert expense.payers[0].amount == 200
+    assert expense.model_dump()["debts"] == [{
+        "debtor_id": "USER2",
+        "payer_id": "USER1",
+        "amount": 100,
+        "is_paid": False,
+        "paid_timestamp": None,
+        "last_reminder_sent": None
+    }]
+    
+    with pytest.raises(ValueError):
+        Expense(**{**expense.model_dump(), "debts": [{"debtor_id": "USER2"}]})
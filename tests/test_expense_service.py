@@ -0,0 +1,67 @@
+import pytest
+from app.services.expense_service import ExpenseService
+
+
+def create_dinner(service, channel_id="C1"):
+    """Create an expense paid by USER1 and shared by three users."""
+    return service.create_expense(
+        total_amount=300,
+        payers=[{"user_id": "USER1", "amount": 300}],
+        attendees=["USER1", "USER2", "USER3"],
+        description="Dinner",
+        channel_id=channel_id,
+        created_by="USER1"
+    )
+
+
+def test_pending_debts_are_indexed_on_create():
+    """Test that new debts show up in the pending and per-user indexes."""
+    service = ExpenseService()
+    expense = create_dinner(service)
+    
+    assert service.count_pending_debts() == 2
+    assert len(service.get_pending_debts_for_payer("USER1")) == 2
+    assert len(service.get_pending_debts_for_debtor("USER2")) == 1
+    assert service.get_debt(expense.id, "USER2", "USER1").amount == 10000
+
+
+def test_mark_debt_as_paid_removes_it_from_pending():
+    """Test that paying a debt drops it from the pending indexes."""
+    service = ExpenseService()
+    expense = create_dinner(service)
+    
+    assert service.mark_debt_as_paid(expense.id, "USER2", "USER1")
+    assert not service.mark_debt_as_paid(expense.id, "USER2", "USER1")
+    
+    assert service.count_pending_debts() == 1
+    assert service.get_pending_debt(expense.id, "USER2", "USER1") is None
+    assert service.get_debt(expense.id, "USER2", "USER1").is_paid
+    assert service.get_pending_debts_for_debtor("USER2") == []
+    assert [entry["debt"].debtor_id for entry in service.get_pending_debts()] == ["USER3"]
+
+
+def test_update_reminder_timestamp_ignores_paid_debts():
+    """Test that reminder timestamps are only updated on pending debts."""
+    service = ExpenseService()
+    expense = create_dinner(service)
+    service.mark_debt_as_paid(expense.id, "USER2", "USER1")
+    
+    assert not service.update_reminder_timestamp(expense.id, "USER2", "USER1")
+    assert service.update_reminder_timestamp(expense.id, "USER3", "USER1")
+    assert service.get_debt(expense.id, "USER3", "USER1").last_reminder_sent is not None
+
+
+def test_payments_must_add_up_in_whole_cents():
+    """Test that payments adding up only before rounding to cents are rejected, and nothing is stored."""
+    service = ExpenseService()
+    payers = [{"user_id": "USER1", "amount": "0.005"}, {"user_id": "USER2", "amount": "0.005"}]
+    
+    with pytest.raises(ValueError):
+        service.create_expense("0.01", payers, ["USER1", "USER2", "USER3"], "Gum", "C1", "USER1")
+    with pytest.raises(ValueError):
+        service.create_expenses([{
+            "total_amount": "0.01", "payers": payers, "attendees": ["USER1", "USER2"],
+            "description": "Gum", "channel_id": "C1", "created_by": "USER1"
+        }])
+    
+    assert service.get_all_expenses() == []
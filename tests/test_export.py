@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import datetime
+import pytest
+from app.services.expense_service import ExpenseService
+from app.storage.archive import ExpenseArchive
+from app.storage.memory import InMemoryExpenseStore
+from app.storage.sqlite import SQLiteExpenseStore
+from app.utils.export import export_ledger, parse_time_bound
+
+
+def local_iso(value):
+    """A naive local time as ISO 8601 with its UTC offset."""
+    return value.astimezone().isoformat()
+
+
+def create_ledger(service):
+    """Create a dinner in C1 on March 1st and a paid lunch in C2 on March 2nd."""
+    dinner, lunch = service.create_expenses([
+        {
+            "total_amount": "30.30",
+            "payers": [{"user_id": "U1", "amount": "30.30"}],
+            "attendees": ["U1", "U2", "U3"],
+            "description": "Dinner, \"the good one\"",
+            "channel_id": "C1",
+            "created_by": "U1",
+            "created_at": datetime(2024, 3, 1, 20)
+        },
+        {
+            "total_amount": 20,
+            "payers": [{"user_id": "U2", "amount": 20}],
+            "attendees": ["U1", "U2"],
+            "description": "Lunch",
+            "channel_id": "C2",
+            "created_by": "U2",
+            "created_at": datetime(2024, 3, 2, 12)
+        }
+    ])
+    service.mark_debt_as_paid(lunch.id, "U1", "U2")
+    return dinner, lunch
+
+
+@pytest.fixture(params=["memory", "sqlite", "archived"])
+def service(request, tmp_path):
+    """An expense service over each kind of store, and one archiving settled expenses."""
+    if request.param == "memory":
+        return ExpenseService(InMemoryExpenseStore())
+    if request.param == "archived":
+        return ExpenseService(
+            SQLiteExpenseStore(str(tmp_path / "splitbot.db")),
+            archive=ExpenseArchive(str(tmp_path / "splitbot.archive"))
+        )
+    return ExpenseService(SQLiteExpenseStore(str(tmp_path / "splitbot.db")))
+
+
+def test_ndjson_export_filters_the_ledger(service):
+    """Test that the export has one row per debt, oldest first, and honours the filters."""
+    create_ledger(service)
+    
+    def export(**filters):
+        text = "".join(export_ledger(service.iter_debt_rows(**filters), "ndjson", chunk_size=10))
+        return [json.loads(line) for line in text.splitlines()]
+    
+    rows = export()
+    assert [(row["channel_id"], row["debtor_id"], row["amount"], row["is_paid"]) for row in rows] == [
+        ("C1", "U2", "10.10", False), ("C1", "U3", "10.10", False), ("C2", "U1", "10.00", True)
+    ]
+    assert rows[2]["paid_timestamp"] is not None
+    assert len(export(channel_id="C2")) == 1
+    assert len(export(is_paid=False)) == 2
+    assert len(export(since=parse_time_bound("2024-03-02"))) == 1
+    assert len(export(until=parse_time_bound("2024-03-01", end=True))) == 2
+    assert len(export(since=parse_time_bound(local_iso(datetime(2024, 3, 2))))) == 1
+
+
+def test_csv_export_quotes_and_formats_values(service):
+    """Test that the CSV export has a header and survives commas and quotes in descriptions."""
+    create_ledger(service)
+    
+    rows = list(csv.DictReader(io.StringIO("".join(export_ledger(service.iter_debt_rows(), "csv")))))
+    
+    assert rows[0]["description"] == "Dinner, \"the good one\""
+    assert rows[0]["total_amount"] == "30.30"
+    assert rows[0]["created_at"] == "2024-03-01T20:00:00"
+    assert [row["is_paid"] for row in rows] == ["false", "false", "true"]
+
+
+def test_unknown_format_is_rejected():
+    """Test that only ndjson and csv can be exported."""
+    with pytest.raises(ValueError):
+        export_ledger([], "xlsx")
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+from slack_bolt.request.async_request import AsyncBoltRequest
+from slack_bolt.response import BoltResponse
+from app.services.idempotency import DUPLICATE_REQUESTS, IdempotencyGuard
+from app.storage.request_keys import SQLiteRequestKeys
+
+
+def command_body(trigger_id):
+    """The form body of a /split command."""
+    return urlencode({"command": "/split", "text": "total 20", "user_id": "U1", "trigger_id": trigger_id})
+
+
+def click_body(trigger_id, value="E1|U2|U1"):
+    """The form body of a click on a "Yes, I've paid" button."""
+    return urlencode({"payload": json.dumps({
+        "type": "block_actions",
+        "trigger_id": trigger_id,
+        "team": {"id": "T1"},
+        "user": {"id": "U2", "team_id": "T1"},
+        "message": {"ts": "1.000000"},
+        "actions": [{"action_id": "confirm_payment", "value": value}]
+    })})
+
+
+def process(guard, body, headers=None):
+    """Run a request through the guard and return whether it reached the listeners."""
+    handled = []
+    
+    async def next():
+        handled.append(True)
+        return BoltResponse(status=200, body="handled")
+    
+    request = AsyncBoltRequest(body=body, headers=headers or {})
+    response = asyncio.run(guard.async_process(req=request, resp=BoltResponse(status=200), next=next))
+    assert response.status == 200
+    return bool(handled)
+
+
+def test_retries_of_a_command_are_dropped():
+    """Test that a retried command is acknowledged without reaching the listeners."""
+    guard = IdempotencyGuard()
+    retries = DUPLICATE_REQUESTS.labels("retry").get()
+    
+    assert process(guard, command_body("T-1"))
+    assert not process(guard, command_body("T-1"), {"X-Slack-Retry-Num": "1"})
+    assert process(guard, command_body("T-2"))
+    
+    assert DUPLICATE_REQUESTS.labels("retry").get() == retries + 1
+    assert guard.seen.hits == 1
+
+
+def test_double_clicks_on_stateful_actions_are_dropped():
+    """Test that a second click on the same button within the window is dropped."""
+    guard = IdempotencyGuard(action_window=5)
+    
+    assert process(guard, click_body("T-1"))
+    assert not process(guard, click_body("T-2"))
+    assert process(guard, click_body("T-3", value="E1|U3|U1"))
+
+
+def test_keys_expire_after_their_ttl():
+    """Test that an action is handled again once its window has passed."""
+    now = [0.0]
+    guard = IdempotencyGuard(ttl=600, action_window=5)
+    guard.seen.clock = lambda: now[0]
+    
+    assert process(guard, click_body("T-1"))
+    now[0] = 10
+    assert process(guard, click_body("T-2"))
+    assert not process(guard, click_body("T-1"))
+
+
+def test_requests_without_keys_are_always_handled():
+    """Test that requests with nothing to identify them by pass through."""
+    guard = IdempotencyGuard()
+    body = urlencode({"command": "/split", "text": "status", "user_id": "U1"})
+    
+    assert process(guard, body)
+    assert process(guard, body)
+
+
+def test_workers_sharing_a_database_drop_each_others_retries(tmp_path):
+    """Test that a retry sent to another worker is dropped when keys are shared."""
+    path = str(tmp_path / "splitbot.db")
+    first = IdempotencyGuard(shared_keys=SQLiteRequestKeys(path))
+    second = IdempotencyGuard(shared_keys=SQLiteRequestKeys(path))
+    
+    assert process(first, command_body("T-1"))
+    assert not process(second, command_body("T-1"), {"X-Slack-Retry-Num": "1"})
+    assert process(second, click_body("T-2"))
+    assert not process(first, click_body("T-3"))
+    first.shared_keys.close()
+    second.shared_keys.close()
+
+
+def test_shared_keys_expire_after_their_ttl(tmp_path):
+    """Test that a shared key is claimed again once it has expired."""
+    keys = SQLiteRequestKeys(str(tmp_path / "splitbot.db"))
+    
+    assert keys.claim([("trigger", 0.05), ("action", 0.05)]) is None
+    assert keys.claim([("other", 600), ("action", 600)]) == "action"
+    assert keys.claim([("other", 600)]) is None  # Not recorded by the rejected claim
+    time.sleep(0.1)
+    assert keys.claim([("action", 600)]) is None
+    keys.close()
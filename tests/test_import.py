@@ -0,0 +1,109 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from app.services.expense_service import ExpenseService
+from app.services.import_service import ExpenseImporter
+from app.storage.sqlite import SQLiteExpenseStore
+from tests.test_message_builder import FakeWorker
+
+CSV = (
+    "total,paid_by,attendees,description,date,settled\n"
+    '"1,250.50",U1,U1 U2,"Team\n€ dinner",2024-03-01,no\n'
+    "90,U1:60 U2:30,<@U1> <@U2> <@U3>,Taxi,,yes\n"
+    "20,U1,,Coffee,,\n"
+    "abc,U1,U1 U2,Snacks,,\n"
+    "30,U3,U3 U2,Lunch,2024-03-02,\n"
+)
+
+
+async def chunked(data: bytes, size: int):
+    """Stream data in small chunks, splitting lines and multi-byte characters."""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def run_import(service, data, format="csv", notify=False, batch_size=2):
+    """Import data into the service and return the report and the queued messages."""
+    worker = FakeWorker()
+    importer = ExpenseImporter(service, worker, batch_size=batch_size)
+    report = asyncio.run(importer.import_stream(
+        chunked(data.encode(), 7), format, {"channel_id": "C1"}, notify=notify
+    ))
+    return report, worker.queued
+
+
+def test_csv_rows_are_imported_in_batches(tmp_path):
+    """Test that valid rows become expenses a batch at a time and invalid rows are reported by line."""
+    service = ExpenseService(SQLiteExpenseStore(str(tmp_path / "splitbot.db")))
+    
+    report, queued = run_import(service, CSV)
+    
+    assert (report["imported"], report["failed"], report["batches"]) == (3, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [5, 6]
+    assert queued == []
+    
+    expenses = {expense.description: expense for expense in service.get_all_expenses()}
+    assert expenses["Team\n€ dinner"].total_amount == 125050
+    assert expenses["Team\n€ dinner"].created_at.day == 1
+    assert all(debt.is_paid for debt in expenses["Taxi"].debts)
+    assert service.count_debts() == {"open": 2, "settled": 1}
+    assert "Taxi" not in {entry["expense"].description for entry in service.get_pending_debts()}
+
+
+def test_imported_expenses_are_not_cached_until_pending_debts_are_loaded(tmp_path):
+    """Test that an import does not fill the cache, and the open debts are still found afterwards."""
+    service = ExpenseService(SQLiteExpenseStore(str(tmp_path / "splitbot.db")))
+    
+    run_import(service, CSV)
+    
+    assert service.expenses == {}
+    assert len(service.get_pending_debts()) == 2
+    
+    run_import(service, "total,paid_by,attendees\n40,U4,U4 U5\n")
+    assert len(service.get_pending_debts()) == 3  # Tracked once pending debts are loaded
+
+def test_notifications_are_consolidated_per_debtor():
+    """Test that each debtor gets one DM for all of their imported debts."""
+    rows = [
+        {"total": 20, "paid_by": "U1", "attendees": ["U1", "U2"], "description": f"Coffee {n}"}
+        for n in range(3)
+    ]
+    rows.append({"total": "40", "paid_by": [{"user_id": "U3", "amount": 40}], "attendees": "U3 U4"})
+    data = "\n".join(json.dumps(row) for row in rows) + "\n\nnot json\n"
+    service = ExpenseService()
+    
+    report, queued = run_import(service, data, format="jsonl", notify=True)
+    
+    assert (report["imported"], report["failed"], report["notified"]) == (4, 1, 2)
+    assert [message.kwargs["channel"] for message in queued] == ["U2", "U4"]
+    assert queued[0].kwargs["text"] == "You have 3 unpaid debts"
+    assert all(entry["debt"].last_reminder_sent for entry in service.get_pending_debts())
+    assert service.get_user_ledger("U4")["owes"][0]["debt"].amount == 2000
+    assert sum(entry["debt"].amount for entry in service.get_user_ledger("U1")["owed"]) == 3000
+
+
+def test_dates_with_an_offset_are_stored_as_local_time():
+    """Test that an imported datetime with a UTC offset is stored naive, next to the app's own dates."""
+    rows = [
+        {"total": 20, "paid_by": "U1", "attendees": "U1 U2", "description": "Breakfast", "date": "2024-03-01T10:00+02:00"},
+        {"total": 20, "paid_by": "U1", "attendees": "U1 U2", "description": "Lunch"}
+    ]
+    service = ExpenseService()
+    
+    report, _ = run_import(service, "\n".join(json.dumps(row) for row in rows), format="jsonl")
+    
+    assert report["imported"] == 2
+    breakfast = service.get_user_ledger("U2")["owes"][-1]["expense"]
+    assert breakfast.created_at.tzinfo is None
+    assert breakfast.created_at == datetime(2024, 3, 1, 8, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def test_fractions_of_a_cent_are_rejected():
+    """Test that a row whose amounts cannot be stored in whole cents is reported, not imported."""
+    row = {"total": "0.01", "paid_by": "U1:0.005 U2:0.005", "attendees": "U1 U2 U3"}
+    service = ExpenseService()
+    
+    report, _ = run_import(service, json.dumps(row), format="jsonl")
+    
+    assert (report["imported"], report["failed"]) == (0, 1)
+    assert "fractions of a cent" in report["errors"][0]["error"]
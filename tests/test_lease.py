@@ -0,0 +1,33 @@
+import time
+from app.storage.lease import SQLiteLease
+
+
+def test_only_one_holder_at_a_time(tmp_path):
+    """Test that a lease is held by one process until it is released."""
+    path = str(tmp_path / "splitbot.db")
+    leader = SQLiteLease(path, "scheduler", holder="worker-1")
+    follower = SQLiteLease(path, "scheduler", holder="worker-2")
+    
+    assert leader.acquire()
+    assert not follower.acquire()
+    assert leader.acquire()  # Renewing
+    
+    leader.release()
+    assert follower.acquire()
+    assert not leader.acquire()
+    leader.close()
+    follower.close()
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    """Test that another process takes over when the holder stops renewing."""
+    path = str(tmp_path / "splitbot.db")
+    leader = SQLiteLease(path, "scheduler", ttl=0.05, holder="worker-1")
+    follower = SQLiteLease(path, "scheduler", ttl=0.05, holder="worker-2")
+    
+    assert leader.acquire()
+    assert not follower.acquire()
+    time.sleep(0.1)
+    assert follower.acquire()
+    leader.close()
+    follower.close()
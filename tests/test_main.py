@@ -0,0 +1,194 @@
+import asyncio
+import importlib
+import json
+from urllib.parse import urlencode
+from app.services.idempotency import DUPLICATE_REQUESTS
+from tests.fake_slack import FakeSlackServer, call_asgi, signed_headers
+
+SIGNING_SECRET = "test-secret"
+
+
+async def call_app(app, path, body, method="POST"):
+    """Send a signed Slack request through the ASGI app and return the response status and body."""
+    return await call_asgi(app, path, body, method, signed_headers(SIGNING_SECRET, body))
+
+
+async def wait_until_ready(app):
+    """Poll /ready until the app reports it is ready."""
+    for _ in range(200):
+        status, _ = await call_asgi(app, "/ready", method="GET")
+        if status == 200:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("The app never became ready")
+
+
+async def run_split_command(monkeypatch):
+    """Start the app against the fake Slack server and run five /split commands at once."""
+    server = FakeSlackServer()
+    url = await server.start()
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-test")
+    monkeypatch.setenv("SLACK_SIGNING_SECRET", SIGNING_SECRET)
+    monkeypatch.setenv("SLACK_API_URL", url + "/")
+    monkeypatch.delenv("SPLITBOT_DB_PATH", raising=False)
+    main = importlib.reload(importlib.import_module("app.main"))
+    
+    async with main.lifespan(main.app):
+        # Startup runs in the background; /health answers at once, /ready once it is done
+        assert (await call_app(main.app, "/health", "", method="GET"))[0] == 200
+        await wait_until_ready(main.app)
+        await asyncio.sleep(0)  # Let the scheduler task start
+        assert main.reminder_service._running
+        body = urlencode({
+            "command": "/split",
+            "text": "total 90 paid_by <@U1> attendees <@U1> <@U2> <@U3> note Dinner",
+            "channel_id": "C1",
+            "user_id": "U1",
+            "team_id": "T1",
+        })
+        responses = await asyncio.gather(*(call_app(main.app, "/slack/commands", body) for _ in range(5)))
+        
+        # Each command posts a summary and DMs its two debtors
+        for _ in range(200):
+            if len(server.calls_to("chat.postMessage")) >= 15:
+                break
+            await asyncio.sleep(0.01)
+        
+        # /split status is answered in the response to the command
+        _, ledger = await call_app(main.app, "/slack/commands", urlencode({
+            "command": "/split", "text": "status", "channel_id": "C1", "user_id": "U2", "team_id": "T1"
+        }))
+        _, metrics = await call_app(main.app, "/metrics", "", method="GET")
+    
+    await server.stop()
+    return main, server, [status for status, _ in responses], metrics.decode(), ledger.decode()
+
+
+def test_slash_commands_are_handled_asynchronously(monkeypatch):
+    """Test that concurrent commands are acknowledged and their messages sent through the async stack."""
+    main, server, status, metrics, ledger = asyncio.run(run_split_command(monkeypatch))
+    
+    assert status == [200] * 5
+    assert len(server.calls_to("chat.postMessage")) == 15
+    assert server.calls_to("users.info") == []  # Only DM channels are prefetched
+    assert len(main.slack_commands.expense_service.get_all_expenses()) == 5
+    assert all(expense.summary_ts for expense in main.slack_commands.expense_service.get_all_expenses())
+    assert not main.reminder_service._running
+    
+    assert "You owe $150 (5 debts)" in ledger
+    assert 'splitbot_command_duration_seconds_count{command="split"} 5' in metrics
+    assert 'splitbot_debts{state="open"} 10.0' in metrics
+    assert 'splitbot_slack_api_calls_total{method="chat_postMessage",outcome="ok"}' in metrics
+
+
+async def run_import_and_export(monkeypatch):
+    """Post a CSV import to the app, without and with the import token, then export it."""
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-test")
+    monkeypatch.setenv("SLACK_SIGNING_SECRET", SIGNING_SECRET)
+    monkeypatch.setenv("SPLITBOT_IMPORT_TOKEN", "import-secret")
+    monkeypatch.setenv("SPLITBOT_EXPORT_TOKEN", "export-secret")
+    monkeypatch.delenv("SPLITBOT_DB_PATH", raising=False)
+    main = importlib.reload(importlib.import_module("app.main"))
+    body = "total,paid_by,attendees\n30,U1,U1 U2 U3\n"
+    
+    unauthorized = await call_asgi(main.app, "/import", body)
+    authorized = await call_asgi(
+        main.app, "/import?channel_id=C9", body, headers=[(b"authorization", b"Bearer import-secret")]
+    )
+    exported = await call_asgi(
+        main.app, "/export?format=csv&channel_id=C9", method="GET",
+        headers=[(b"authorization", b"Bearer export-secret")]
+    )
+    # A bound with a UTC offset is compared with the stored naive times
+    offset_export = await call_asgi(
+        main.app, "/export?format=ndjson&channel_id=C9&since=2020-01-01T00:00:00%2B02:00&until=2999-01-01T00:00:00Z",
+        method="GET", headers=[(b"authorization", b"Bearer export-secret")]
+    )
+    return main, unauthorized, authorized, exported, offset_export
+
+
+def test_import_and_export_endpoints_require_their_tokens(monkeypatch):
+    """Test that /import and /export only accept requests bearing their tokens."""
+    main, unauthorized, (status, body), (export_status, export), (offset_status, offset_export) = asyncio.run(
+        run_import_and_export(monkeypatch)
+    )
+    
+    assert unauthorized[0] == 401
+    assert status == 200
+    assert json.loads(body)["imported"] == 1
+    assert main.slack_commands.expense_service.get_all_expenses()[-1].channel_id == "C9"
+    assert export_status == 200
+    lines = export.decode().splitlines()
+    assert lines[0].startswith("expense_id,created_at,channel_id")
+    assert len(lines) == 3 and all(",C9," in line for line in lines[1:])
+    assert offset_status == 200
+    assert [json.loads(line)["channel_id"] for line in offset_export.decode().splitlines()] == ["C9", "C9"]
+
+
+async def run_retried_command(monkeypatch):
+    """Send a /split command, then Slack's retry of it, through the app."""
+    server = FakeSlackServer()
+    url = await server.start()
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-test")
+    monkeypatch.setenv("SLACK_SIGNING_SECRET", SIGNING_SECRET)
+    monkeypatch.setenv("SLACK_API_URL", url + "/")
+    monkeypatch.delenv("SPLITBOT_DB_PATH", raising=False)
+    main = importlib.reload(importlib.import_module("app.main"))
+    expenses_before = len(main.slack_commands.expense_service.get_all_expenses())
+    retries_before = DUPLICATE_REQUESTS.labels("retry").get()
+    body = urlencode({
+        "command": "/split",
+        "text": "total 40 paid_by <@U1> attendees <@U1> <@U2> note Taxi",
+        "channel_id": "C1",
+        "user_id": "U1",
+        "team_id": "T1",
+        "trigger_id": "trigger-taxi",
+    })
+    
+    statuses = []
+    for retry_headers in ([], [(b"x-slack-retry-num", b"1"), (b"x-slack-retry-reason", b"http_timeout")]):
+        status, _ = await call_asgi(
+            main.app, "/slack/commands", body, headers=signed_headers(SIGNING_SECRET, body) + retry_headers
+        )
+        statuses.append(status)
+    await asyncio.sleep(0.05)  # Let the listener finish
+    await server.stop()
+    
+    expenses = len(main.slack_commands.expense_service.get_all_expenses()) - expenses_before
+    return statuses, expenses, DUPLICATE_REQUESTS.labels("retry").get() - retries_before
+
+
+def test_retried_commands_are_handled_once(monkeypatch):
+    """Test that Slack's retry of a command is acknowledged without creating the expense again."""
+    statuses, expenses, retries = asyncio.run(run_retried_command(monkeypatch))
+    
+    assert statuses == [200, 200]
+    assert expenses == 1
+    assert retries == 1
+
+
+async def run_without_slack(monkeypatch):
+    """Start the app with the Slack API unreachable and probe it."""
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-test")
+    monkeypatch.setenv("SLACK_SIGNING_SECRET", SIGNING_SECRET)
+    monkeypatch.setenv("SLACK_API_URL", "http://127.0.0.1:9/api/")
+    monkeypatch.delenv("SPLITBOT_DB_PATH", raising=False)
+    main = importlib.reload(importlib.import_module("app.main"))
+    built_on_import = main._components is not None
+    
+    async with main.lifespan(main.app):
+        health = await call_asgi(main.app, "/health", method="GET")
+        await main._startup
+        await asyncio.sleep(0.05)  # Let the token verification fail
+        ready = await call_asgi(main.app, "/ready", method="GET")
+    return built_on_import, health, ready
+
+
+def test_app_is_live_but_not_ready_without_slack(monkeypatch):
+    """Test that startup makes no Slack call, and /ready waits for the token to be verified."""
+    built_on_import, (health_status, _), (ready_status, ready) = asyncio.run(run_without_slack(monkeypatch))
+    
+    assert not built_on_import
+    assert health_status == 200
+    assert ready_status == 503
+    assert json.loads(ready)["checks"] == {"services": True, "slack_auth": False}
@@ -0,0 +1,144 @@
+import asyncio
+from app.routes.slack_commands import (
+    expense_service,
+    post_expense_summary,
+    refresh_expense_summary,
+    report_in_steps,
+    summary_blocks,
+    summary_sent
+)
+from app.storage.outbox import OutboxMessage
+from app.utils.message_builder import (
+    MAX_BLOCKS,
+    build_expense_summary_message,
+    build_status_message,
+    update_expense_summary_message
+)
+
+
+def create_dinner():
+    """Create an expense with two payers."""
+    return expense_service.create_expense(
+        total_amount=90,
+        payers=[{"user_id": "USER1", "amount": 60}, {"user_id": "USER2", "amount": 30}],
+        attendees=["USER1", "USER2", "USER3", "USER4"],
+        description="Dinner",
+        channel_id="C1",
+        created_by="USER1"
+    )
+
+
+class FakeWorker:
+    """Records the calls queued in the outbox."""
+    
+    def __init__(self):
+        self.queued = []
+    
+    def enqueue(self, method, kwargs, callback=None, context=None):
+        self.queued.append(OutboxMessage(len(self.queued) + 1, method, kwargs, callback, context))
+        return len(self.queued)
+
+
+def test_update_only_rerenders_the_paid_payers_section():
+    """Test that a payment only replaces the section of the payer who was paid."""
+    expense = create_dinner()
+    blocks = build_expense_summary_message(expense)
+    debt = next(debt for debt in expense.debts if debt.payer_id == "USER1")
+    expense_service.mark_debt_as_paid(expense.id, debt.debtor_id, debt.payer_id)
+    
+    updated = update_expense_summary_message(expense, ["USER1"], blocks)
+    
+    changed = [new for old, new in zip(blocks, updated) if old is not new]
+    assert [block["block_id"] for block in changed] == ["payer|USER1"]
+    assert ":white_check_mark:" in changed[0]["text"]["text"]
+    assert updated == build_expense_summary_message(expense)
+
+
+def test_refresh_edits_the_summary_in_place():
+    """Test that the summary message is updated rather than reposted."""
+    expense = create_dinner()
+    blocks = build_expense_summary_message(expense)
+    summary_blocks.set(expense.id, blocks)
+    expense_service.set_summary_ts(expense.id, "1.0")
+    worker = FakeWorker()
+    
+    refresh_expense_summary(worker, expense, ["USER1"])
+    
+    assert [message.method for message in worker.queued] == ["chat_update"]
+    assert worker.queued[0].kwargs["ts"] == "1.0"
+    # The blocks of other payers are reused from the last rendered summary
+    assert worker.queued[0].kwargs["blocks"][0] is blocks[0]
+    assert summary_blocks.get(expense.id) is worker.queued[0].kwargs["blocks"]
+
+
+def test_failed_summary_update_posts_a_new_summary():
+    """Test the fallback to posting a new summary and keeping its ts."""
+    expense = create_dinner()
+    expense_service.set_summary_ts(expense.id, "1.0")
+    worker = FakeWorker()
+    refresh_expense_summary(worker, expense, ["USER1"])
+    
+    asyncio.run(summary_sent(worker, worker.queued[0], None))
+    assert [message.method for message in worker.queued] == ["chat_update", "chat_postMessage"]
+    assert "ts" not in worker.queued[1].kwargs
+    
+    asyncio.run(summary_sent(worker, worker.queued[1], {"ok": True, "ts": "2.0"}))
+    assert expense.summary_ts == "2.0"
+
+
+def test_refresh_before_the_first_summary_is_posted_edits_it_afterwards():
+    """Test that a payment made while the first summary is queued does not post a second one."""
+    worker = FakeWorker()
+    expense = create_dinner()
+    post_expense_summary(worker, expense)
+    
+    expense_service.mark_debt_as_paid(expense.id, "USER3", "USER1")
+    refresh_expense_summary(worker, expense, ["USER1"])
+    assert [message.method for message in worker.queued] == ["chat_postMessage"]
+    
+    asyncio.run(summary_sent(worker, worker.queued[0], {"ok": True, "ts": "1.0"}))
+    assert [message.method for message in worker.queued] == ["chat_postMessage", "chat_update"]
+    assert worker.queued[1].kwargs["ts"] == "1.0"
+    assert worker.queued[1].kwargs["blocks"] == build_expense_summary_message(expense)
+    
+    # Later payments edit the posted summary directly
+    refresh_expense_summary(worker, expense, ["USER1"])
+    assert worker.queued[2].method == "chat_update"
+
+def test_status_pages_through_a_heavy_users_ledger():
+    """Test that /split status lists debts a page at a time with buttons between pages."""
+    for n in range(25):
+        expense_service.create_expense(
+            total_amount=20,
+            payers=[{"user_id": f"FRIEND{n}", "amount": 20}],
+            attendees=[f"FRIEND{n}", "HEAVY"],
+            description=f"Coffee {n}",
+            channel_id="C1",
+            created_by="HEAVY"
+        )
+    ledger = expense_service.get_user_ledger("HEAVY")
+    
+    first, last = build_status_message(ledger, 0), build_status_message(ledger, 1)
+    
+    assert len(ledger["owes"]) == 25 and ledger["owed"] == []
+    assert "Coffee 24" in first[2]["text"]["text"]  # Newest first
+    assert all(len(blocks) <= MAX_BLOCKS for blocks in (first, last))
+    assert [button["action_id"] for button in first[-1]["elements"]] == ["status_next_page"]
+    assert [button["action_id"] for button in last[-1]["elements"]] == ["status_previous_page"]
+    assert sum(block["type"] == "section" for block in last) == 1 + 5
+
+
+def test_remind_progress_leaves_a_response_url_use_for_the_summary():
+    """Test that progress is reported at most three times however often it is offered."""
+    reported = []
+    
+    async def report(progress):
+        reported.append(progress["sent"])
+    
+    async def deliver():
+        report_progress = report_in_steps(report)
+        for sent in range(1, 2001):
+            await report_progress({"sent": sent, "failed": 0, "total": 2000})
+    
+    asyncio.run(deliver())
+    assert reported == [500, 1000, 1500]
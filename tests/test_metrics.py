@@ -0,0 +1,52 @@
+import pytest
+from app.utils.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counters_and_gauges_render_per_label():
+    """Test the text format of labelled counters and function-backed gauges."""
+    registry = Registry()
+    calls = Counter("calls_total", "Calls made", ["method"], registry=registry)
+    queued = Gauge("queued", "Queued messages", registry=registry)
+    
+    calls.labels("chat_postMessage").inc()
+    calls.labels("chat_postMessage").inc(2)
+    calls.labels("chat_update").inc()
+    queued.set_function(lambda: 7)
+    
+    assert registry.render().splitlines() == [
+        "# HELP calls_total Calls made",
+        "# TYPE calls_total counter",
+        'calls_total{method="chat_postMessage"} 3.0',
+        'calls_total{method="chat_update"} 1.0',
+        "# HELP queued Queued messages",
+        "# TYPE queued gauge",
+        "queued 7.0",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test that observations land in every bucket at or above them."""
+    registry = Registry()
+    latency = Histogram("latency_seconds", "Latency", ["command"], buckets=[0.1, 1], registry=registry)
+    
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.labels("split").observe(value)
+    
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{command="split",le="0.1"} 2',
+        'latency_seconds_bucket{command="split",le="1.0"} 3',
+        'latency_seconds_bucket{command="split",le="+Inf"} 4',
+        'latency_seconds_sum{command="split"} 3.65',
+        'latency_seconds_count{command="split"} 4',
+    ]
+
+
+def test_names_and_labels_are_checked():
+    """Test that duplicate names and wrong label counts are refused."""
+    registry = Registry()
+    calls = Counter("calls_total", "Calls made", ["method"], registry=registry)
+    
+    with pytest.raises(ValueError):
+        Counter("calls_total", "Calls made", registry=registry)
+    with pytest.raises(ValueError):
+        calls.labels("chat_postMessage", "extra")
@@ -0,0 +1,40 @@
+from decimal import Decimal
+from app.utils.money import allocate, compute_debts, compute_debts_batch, format_amount, to_minor
+
+
+def test_to_minor_is_exact():
+    """Test converting major units to integer minor units."""
+    assert to_minor("12.50") == 1250
+    assert to_minor(0.1) == 10
+    assert to_minor(Decimal("100000")) == 10000000
+    assert to_minor("0.005") == 1
+
+
+def test_allocate_spreads_the_remainder_deterministically():
+    """Test that shares add up to the total and differ by at most one cent."""
+    assert allocate(10000, 3) == [3334, 3333, 3333]
+    assert sum(allocate(10001, 7)) == 10001
+
+
+def test_format_amount():
+    """Test that cents are only shown when there are any."""
+    assert format_amount(3333333) == "$33,333.33"
+    assert format_amount(10000000) == "$100,000"
+    assert format_amount(5) == "$0.05"
+
+
+def test_compute_debts_adds_up_to_the_total():
+    """Test that an uneven split still owes the payer exactly what they are owed."""
+    debts = compute_debts(10000, [("USER1", 10000)], ["USER1", "USER2", "USER3"])
+    
+    assert debts == [("USER2", "USER1", 3333), ("USER3", "USER1", 3333)]
+
+
+def test_compute_debts_batch_matches_single_calls():
+    """Test that the batch path gives the same debts as one expense at a time."""
+    expenses = [
+        (9000, [("USER1", 6000), ("USER2", 3000)], ["USER1", "USER2", "USER3"]),
+        (500, [("USER4", 500)], ["USER4", "USER5"])
+    ]
+    
+    assert compute_debts_batch(expenses) == [compute_debts(*expense) for expense in expenses]
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from slack_sdk.web.async_client import AsyncWebClient
+from app.services.outbox_worker import OutboxWorker
+from app.services.slack_delivery import SlackDelivery
+from app.storage.outbox import InMemoryOutbox, SQLiteOutbox
+from tests.fake_slack import FakeSlackServer
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def outbox(request, tmp_path):
+    """Provide each outbox implementation."""
+    outbox = InMemoryOutbox() if request.param == "memory" else SQLiteOutbox(str(tmp_path / "outbox.db"))
+    yield outbox
+    outbox.close()
+
+
+def post(outbox, channel, text):
+    """Queue a chat_postMessage call."""
+    return outbox.enqueue("chat_postMessage", {"channel": channel, "text": text})
+
+
+def test_messages_are_claimed_in_order_one_per_channel(outbox):
+    """Test that a channel's next message is only handed out after the previous one."""
+    first = post(outbox, "C1", "first")
+    post(outbox, "C1", "second")
+    other = post(outbox, "C2", "other")
+    
+    assert [message.id for message in outbox.claim("worker-a", 10, 60)] == [first, other]
+    assert outbox.claim("worker-b", 10, 60) == []
+    
+    outbox.complete(first)
+    assert [message.kwargs["text"] for message in outbox.claim("worker-b", 10, 60)] == ["second"]
+
+
+def test_retried_messages_wait_for_their_backoff(outbox):
+    """Test that a retried message is not claimed again until its delay has passed."""
+    message_id = post(outbox, "C1", "hello")
+    outbox.claim("worker-a", 1, 60)
+    
+    outbox.retry(message_id, 60, "timeout")
+    assert outbox.claim("worker-a", 1, 60) == []
+    
+    outbox.retry(message_id, 0, "timeout")
+    [message] = outbox.claim("worker-a", 1, 60)
+    assert message.attempts == 2
+
+
+def test_released_and_failed_messages(outbox):
+    """Test that released messages are claimable and failed ones unblock their channel."""
+    failed = post(outbox, "C1", "first")
+    post(outbox, "C1", "second")
+    outbox.claim("worker-a", 1, 60)
+    
+    outbox.release("worker-a")
+    assert [message.id for message in outbox.claim("worker-b", 1, 60)] == [failed]
+    
+    outbox.fail(failed, "channel_not_found")
+    assert [message.kwargs["text"] for message in outbox.claim("worker-b", 1, 60)] == ["second"]
+    assert outbox.count() == 1
+
+
+def test_queued_messages_survive_a_restart(tmp_path):
+    """Test that messages claimed by a process that stopped are delivered after it restarts."""
+    path = str(tmp_path / "outbox.db")
+    outbox = SQLiteOutbox(path)
+    post(outbox, "C1", "hello")
+    outbox.claim("crashed-worker", 1, 0)  # Its lease has already run out
+    outbox.close()
+    
+    outbox = SQLiteOutbox(path)
+    [message] = outbox.claim("worker-a", 1, 60)
+    assert message.kwargs == {"channel": "C1", "text": "hello"}
+    outbox.close()
+
+
+async def deliver_outbox(server, outbox):
+    """Run an outbox worker pool against the fake server until the outbox is empty."""
+    url = await server.start()
+    delivery = SlackDelivery(
+        AsyncWebClient(token="xoxb-test", base_url=url),
+        rate_limits={"chat_postMessage": (60000, 100)}
+    )
+    worker = OutboxWorker(outbox, delivery, workers=4, base_delay=0.01, poll_interval=0.01)
+    
+    posted = []
+    async def record_ts(worker, message, response):
+        posted.append((message.context["n"], response["ts"]))
+    worker.register_callback("record_ts", record_ts)
+    
+    worker.start()
+    for n in range(20):
+        worker.enqueue("chat_postMessage", {"channel": f"C{n % 3}", "text": str(n)},
+                       callback="record_ts", context={"n": n})
+    while outbox.count():
+        await asyncio.sleep(0.01)
+    await worker.stop()
+    await server.stop()
+    return worker, posted
+
+
+def test_worker_pool_delivers_in_channel_order():
+    """Test that the worker pool delivers everything, in order within each channel."""
+    server = FakeSlackServer(latency=0.005)
+    worker, posted = asyncio.run(deliver_outbox(server, InMemoryOutbox()))
+    
+    assert worker.sent == 20
+    assert len(posted) == 20
+    for channel in ("C0", "C1", "C2"):
+        texts = [call["text"] for call in server.calls_to("chat.postMessage") if call["channel"] == channel]
+        assert texts == sorted(texts, key=int)
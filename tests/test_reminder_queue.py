@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+from app.services.reminder_queue import ReminderQueue
+
+
+def test_pop_due_returns_only_due_keys_in_order():
+    """Test that only debts due by now are popped, earliest first."""
+    now = datetime(2024, 1, 1, 12)
+    queue = ReminderQueue()
+    queue.push("later", now + timedelta(hours=1))
+    queue.push("second", now - timedelta(minutes=1))
+    queue.push("first", now - timedelta(hours=1))
+    
+    assert queue.pop_due(now) == ["first", "second"]
+    assert queue.next_due_time() == now + timedelta(hours=1)
+    assert len(queue) == 1
+
+
+def test_discard_and_reschedule():
+    """Test that discarded debts are skipped and rescheduled debts move."""
+    now = datetime(2024, 1, 1, 12)
+    queue = ReminderQueue()
+    queue.push("paid", now - timedelta(hours=2))
+    queue.push("moved", now - timedelta(hours=1))
+    
+    queue.discard("paid")
+    assert queue.push("moved", now + timedelta(hours=3))
+    assert queue.push("new", now + timedelta(hours=2))
+    
+    assert "paid" not in queue
+    assert queue.pop_due(now) == []
+    assert queue.next_due_time() == now + timedelta(hours=2)
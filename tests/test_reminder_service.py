@@ -0,0 +1,100 @@
+import asyncio
+from slack_sdk.web.async_client import AsyncWebClient
+from app.services.expense_service import ExpenseService
+from app.services.reminder_service import ReminderService
+from app.services.slack_delivery import SlackDelivery
+from app.storage.lease import SQLiteLease
+from tests.fake_slack import FakeSlackServer
+
+
+def create_expenses(expense_service):
+    """Create three lunches paid by different users that USER2 attended."""
+    for payer_id in ["USER1", "USER3", "USER4"]:
+        expense_service.create_expense(
+            total_amount=40,
+            payers=[{"user_id": payer_id, "amount": 40}],
+            attendees=[payer_id, "USER2"],
+            description=f"Lunch with {payer_id}",
+            channel_id="C1",
+            created_by=payer_id
+        )
+
+
+async def send_manual_reminders(server, batch_reminders):
+    """Run send_manual_reminders against the fake Slack server."""
+    url = await server.start()
+    try:
+        expense_service = ExpenseService()
+        create_expenses(expense_service)
+        
+        delivery = SlackDelivery(AsyncWebClient(token="xoxb-test", base_url=url))
+        reminder_service = ReminderService(None, expense_service, delivery=delivery)
+        reminder_service.batch_reminders = batch_reminders
+        
+        result = await reminder_service.send_manual_reminders()
+        return result, expense_service
+    finally:
+        await server.stop()
+
+
+def test_batched_reminders_send_one_dm_per_debtor():
+    """Test that a debtor with several debts gets a single reminder listing them all."""
+    server = FakeSlackServer()
+    result, expense_service = asyncio.run(send_manual_reminders(server, batch_reminders=True))
+    
+    assert result == {"sent": 1, "failed": 0, "total": 1}
+    assert [call["channel"] for call in server.calls_to("chat.postMessage")] == ["USER2"]
+    assert all(
+        pending_debt["debt"].last_reminder_sent
+        for pending_debt in expense_service.get_pending_debts()
+    )
+
+
+def test_unbatched_reminders_send_one_dm_per_debt():
+    """Test that batching can be turned off."""
+    server = FakeSlackServer()
+    result, _ = asyncio.run(send_manual_reminders(server, batch_reminders=False))
+    
+    assert result == {"sent": 3, "failed": 0, "total": 3}
+    assert len(server.calls_to("chat.postMessage")) == 3
+
+
+def test_only_the_lease_holder_leads(tmp_path):
+    """Test that the scheduler leader is elected through the lease and hands over on stop."""
+    path = str(tmp_path / "splitbot.db")
+    services = [
+        ReminderService(None, ExpenseService(), delivery=SlackDelivery(None),
+                        leader_lease=SQLiteLease(path, "reminder_scheduler", holder=f"worker-{n}"))
+        for n in range(2)
+    ]
+    
+    assert [service._hold_leadership() for service in services] == [True, False]
+    
+    services[0].stop_reminder_scheduler()
+    assert not services[0].is_leader
+    assert services[1]._hold_leadership()
+
+
+def test_shared_changes_reach_the_reminder_queue(tmp_path):
+    """Test that debts created or paid by another worker are scheduled or dropped without a reseed."""
+    from app.storage.sqlite import SQLiteExpenseStore
+    path = str(tmp_path / "splitbot.db")
+    other = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1), shared=True)
+    expense_service = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1), shared=True)
+    service = ReminderService(None, expense_service, delivery=SlackDelivery(None))
+    service._seed_queue()
+    queue = service.queue
+    
+    create_expenses(other)
+    expense_service.sync()
+    assert len(queue) == 3
+    
+    expense = other.get_all_expenses()[0]
+    debt = expense.debts[0]
+    other.mark_debt_as_paid(expense.id, debt.debtor_id, debt.payer_id)
+    expense_service.sync()
+    assert service.queue is queue
+    assert (expense.id, debt.debtor_id, debt.payer_id) not in queue
+    assert len(queue) == 2
+    other.close()
+    expense_service.close()
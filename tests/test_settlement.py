@@ -0,0 +1,143 @@
+from app.services.expense_service import ExpenseService
+from app.services.settlement_service import SettlementService
+from app.storage.settlements import SQLiteSettlementStore
+from app.utils.message_builder import build_settlement_message
+from app.utils.settlement import minimize_transfers, net_balances
+
+
+def create_expense(expense_service, payer_id, debtor_id, amount, channel_id="C1"):
+    """Create an expense where debtor_id owes payer_id the given amount."""
+    return expense_service.create_expense(
+        total_amount=amount * 2,
+        payers=[{"user_id": payer_id, "amount": amount * 2}],
+        attendees=[payer_id, debtor_id],
+        description="Lunch",
+        channel_id=channel_id,
+        created_by=payer_id
+    )
+
+
+def test_minimize_transfers_collapses_a_chain():
+    """Test that A owes B and B owes C becomes a single payment from A to C."""
+    balances = net_balances([("A", "B", 10), ("B", "C", 10)])
+    
+    assert minimize_transfers(balances) == [("A", "C", 10)]
+
+
+def test_minimize_transfers_cancels_a_cycle():
+    """Test that debts going round in a cycle need no payments."""
+    balances = net_balances([("A", "B", 10), ("B", "C", 10), ("C", "A", 10)])
+    
+    assert minimize_transfers(balances) == []
+
+
+def test_minimize_transfers_settles_every_balance():
+    """Test that the transfers bring every balance back to zero."""
+    balances = {"A": 50, "B": 25, "C": -40, "D": -35}
+    transfers = minimize_transfers(balances)
+    
+    assert len(transfers) <= len(balances) - 1
+    for debtor_id, payer_id, amount in transfers:
+        balances[debtor_id] -= amount
+        balances[payer_id] += amount
+    assert all(balance == 0 for balance in balances.values())
+
+
+def test_paying_a_transfer_settles_the_underlying_debts():
+    """Test that a netted payment marks every debt it replaces as paid."""
+    expense_service = ExpenseService()
+    create_expense(expense_service, "B", "A", 10)
+    create_expense(expense_service, "C", "B", 10)
+    create_expense(expense_service, "C", "D", 10, channel_id="C2")
+    settlement_service = SettlementService(expense_service)
+    
+    settlement = settlement_service.create_settlement("C1", "A")
+    assert [(t.debtor_id, t.payer_id, t.amount) for t in settlement.transfers] == [("A", "C", 1000)]
+    assert len(settlement.debt_keys) == 2
+    
+    assert settlement_service.mark_transfer_as_paid(settlement.id, 0)
+    assert not settlement_service.mark_transfer_as_paid(settlement.id, 0)
+    assert expense_service.get_pending_debts_for_channel("C1") == []
+    assert len(expense_service.get_pending_debts_for_channel("C2")) == 1
+    assert settlement_service.get_active_settlement("C1") is None
+
+
+def test_a_debtor_is_settled_once_their_own_transfers_are_paid():
+    """Test that paying a transfer settles the payer's debts while others still owe the same payee."""
+    expense_service = ExpenseService()
+    create_expense(expense_service, "C", "A", 10)
+    create_expense(expense_service, "C", "B", 5)
+    settlement_service = SettlementService(expense_service)
+    settlement = settlement_service.create_settlement("C1", "C")
+    
+    index = next(i for i, t in enumerate(settlement.transfers) if t.debtor_id == "A")
+    assert settlement_service.mark_transfer_as_paid(settlement.id, index)
+    
+    assert expense_service.get_pending_debts_for_debtor("A") == []
+    assert len(expense_service.get_pending_debts_for_debtor("B")) == 1
+
+
+def test_every_unpaid_transfer_gets_a_button_in_turn():
+    """Test that transfers beyond the message's room are listed, with buttons, as earlier ones are paid."""
+    expense_service = ExpenseService()
+    for n in range(60):
+        create_expense(expense_service, "PAYEE", f"U{n}", 10 + n)
+    settlement_service = SettlementService(expense_service)
+    settlement = settlement_service.create_settlement("C1", "PAYEE")
+    
+    def buttons():
+        return {
+            block["accessory"]["value"] for block in build_settlement_message(settlement)
+            if "accessory" in block
+        }
+    
+    first = buttons()
+    assert "14 of them unpaid" in build_settlement_message(settlement)[-1]["elements"][0]["text"]
+    for value in first:
+        settlement_service.mark_transfer_as_paid(settlement.id, int(value.split("|")[1]))
+    
+    assert len(first) + len(buttons()) == 60
+    assert not first & buttons()
+
+
+def test_debts_that_cancel_out_are_settled_immediately():
+    """Test that a plan with no payments marks the debts as paid right away."""
+    expense_service = ExpenseService()
+    create_expense(expense_service, "B", "A", 10)
+    create_expense(expense_service, "A", "B", 10)
+    
+    settlement = SettlementService(expense_service).create_settlement("C1", "A")
+    
+    assert settlement.transfers == []
+    assert expense_service.count_pending_debts() == 0
+
+
+def test_nothing_to_settle_without_pending_debts():
+    """Test that a channel without pending debts gets no settlement plan."""
+    expense_service = ExpenseService()
+    create_expense(expense_service, "B", "A", 10, channel_id="C2")
+    settlement_service = SettlementService(expense_service)
+    
+    assert settlement_service.create_settlement("C1", "A") is None
+    assert settlement_service.store.get_latest("C1") is None
+    assert settlement_service.get_active_settlement("C1") is None
+
+
+def test_settlements_are_shared_through_sqlite(tmp_path):
+    """Test that a plan created by one worker can be paid through another, but only once."""
+    path = str(tmp_path / "splitbot.db")
+    expense_service = ExpenseService()
+    create_expense(expense_service, "C", "A", 10)
+    create_expense(expense_service, "C", "B", 5)
+    workers = [SettlementService(expense_service, SQLiteSettlementStore(path)) for _ in range(2)]
+    settlement = workers[0].create_settlement("C1", "C")
+    
+    assert workers[1].get_active_settlement("C1").id == settlement.id
+    paid = workers[1].mark_transfer_as_paid(settlement.id, 0)
+    assert paid.transfers[0].is_paid and not paid.transfers[1].is_paid
+    assert not workers[0].mark_transfer_as_paid(settlement.id, 0)
+    
+    replacement = workers[0].create_settlement("C1", "C")
+    assert workers[1].get_settlement(settlement.id).is_replaced
+    assert not workers[1].mark_transfer_as_paid(settlement.id, 1)
+    assert workers[1].get_active_settlement("C1").id == replacement.id
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+from app.services.slack_auth import SlackAuth
+from tests.fake_slack import FakeSlackServer
+
+
+async def run_auth(server, checks):
+    """Run checks against a SlackAuth backed by the fake Slack server."""
+    url = await server.start()
+    try:
+        return await checks(SlackAuth(AsyncWebClient(token="xoxb-test", base_url=url)))
+    finally:
+        await server.stop()
+
+
+def test_token_is_verified_once_and_cached():
+    """Test that concurrent verifications and authorizations share one auth.test call."""
+    server = FakeSlackServer(latency=0.01)
+    
+    async def checks(auth):
+        assert not auth.verified
+        await asyncio.gather(auth.verify(), auth.verify())
+        return await auth(context=None, enterprise_id=None, team_id="T1", user_id="U2")
+    
+    result = asyncio.run(run_auth(server, checks))
+    
+    assert len(server.calls_to("auth.test")) == 1
+    assert result.team_id == "T1"
+    assert result.bot_user_id == "UBOT"
+    assert result.bot_token == "xoxb-test"
+    assert result.user_id == "U2"
+
+
+def test_failed_verification_is_retried():
+    """Test that a failed auth.test is not cached, so the next call tries again."""
+    server = FakeSlackServer(inject_429_every=1)
+    
+    async def checks(auth):
+        with pytest.raises(SlackApiError):
+            await auth.verify()
+        assert not auth.verified
+        
+        server.inject_429_every = None
+        await auth.verify_in_background(retry_interval=0.01)
+        return auth
+    
+    auth = asyncio.run(run_auth(server, checks))
+    
+    assert auth.verified
+    assert auth.auth_test["team_id"] == "T1"
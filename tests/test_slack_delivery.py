@@ -0,0 +1,79 @@
+import asyncio
+from slack_sdk.web.async_client import AsyncWebClient
+from app.services.slack_delivery import SlackDelivery
+from tests.fake_slack import FakeSlackServer
+
+
+async def deliver_messages(server, count, **delivery_options):
+    """Send count DMs through a SlackDelivery pointed at the fake server."""
+    url = await server.start()
+    try:
+        client = AsyncWebClient(token="xoxb-test", base_url=url)
+        delivery = SlackDelivery(
+            client, rate_limits={"chat_postMessage": (60000, 100)}, **delivery_options
+        )
+        progress = []
+        
+        async def on_progress(counts):
+            progress.append(counts)
+        
+        calls = [
+            ("chat_postMessage", {"channel": f"USER{i}", "text": "Reminder"})
+            for i in range(count)
+        ]
+        results = await delivery.deliver_all(calls, on_progress=on_progress, progress_interval=0)
+        return results, progress
+    finally:
+        await server.stop()
+
+
+def test_deliver_all_retries_rate_limited_calls():
+    """Test that calls answered with a 429 are retried after Retry-After."""
+    server = FakeSlackServer(inject_429_every=3, retry_after=0)
+    results, progress = asyncio.run(deliver_messages(server, 30))
+    
+    assert all(results)
+    assert server.rate_limited["chat.postMessage"] > 0
+    assert sorted(call["channel"] for call in server.calls_to("chat.postMessage")) == sorted(
+        f"USER{i}" for i in range(30)
+    )
+    assert progress[-1] == {"sent": 30, "failed": 0, "total": 30}
+
+
+def test_deliver_all_respects_concurrency_cap():
+    """Test that no more than max_concurrency calls are in flight at once."""
+    server = FakeSlackServer(latency=0.02)
+    results, _ = asyncio.run(deliver_messages(server, 40, max_concurrency=4))
+    
+    assert all(results)
+    assert server.max_in_flight <= 4
+
+
+def test_deliver_all_reports_failures_after_max_retries():
+    """Test that calls still rate limited after max_retries are counted as failed."""
+    server = FakeSlackServer(inject_429_every=1, retry_after=0)
+    results, progress = asyncio.run(deliver_messages(server, 3, max_retries=1))
+    
+    assert results == [False, False, False]
+    assert progress[-1] == {"sent": 0, "failed": 3, "total": 3}
+
+
+def test_deliver_all_survives_a_failing_progress_callback():
+    """Test that an error reporting progress does not stop the delivery."""
+    server = FakeSlackServer()
+    
+    async def deliver():
+        url = await server.start()
+        try:
+            delivery = SlackDelivery(AsyncWebClient(token="xoxb-test", base_url=url))
+            
+            async def on_progress(counts):
+                raise RuntimeError("response_url used too many times")
+            
+            calls = [("chat_postMessage", {"channel": f"USER{i}", "text": "Reminder"}) for i in range(5)]
+            return await delivery.deliver_all(calls, on_progress=on_progress, progress_interval=0)
+        finally:
+            await server.stop()
+    
+    assert asyncio.run(deliver()) == [True] * 5
+    assert len(server.calls_to("chat.postMessage")) == 5
@@ -0,0 +1,61 @@
+import asyncio
+from slack_sdk.web.async_client import AsyncWebClient
+from app.services.slack_delivery import SlackDelivery
+from app.services.slack_directory import SlackDirectory
+from tests.fake_slack import FakeSlackServer
+
+
+async def run_directory(server, lookups):
+    """Run lookups against a directory backed by the fake Slack server."""
+    url = await server.start()
+    try:
+        directory = SlackDirectory(SlackDelivery(AsyncWebClient(token="xoxb-test", base_url=url)))
+        return await lookups(directory)
+    finally:
+        await server.stop()
+
+
+def test_prefetch_looks_up_each_user_once():
+    """Test that a bulk prefetch opens each DM channel and fetches each profile once."""
+    server = FakeSlackServer()
+    
+    async def lookups(directory):
+        await asyncio.gather(
+            directory.prefetch(["U1", "U2", "U1"]),
+            directory.prefetch(["U2", "U3"], profiles=False)
+        )
+        channels = [directory.channel_for(user_id) for user_id in ["U1", "U2", "U3"]]
+        profile = await directory.user_info("U2")
+        return directory, channels, profile
+    
+    directory, channels, profile = asyncio.run(run_directory(server, lookups))
+    
+    assert channels == ["DU1", "DU2", "DU3"]
+    assert profile["tz"] == "UTC"
+    assert sorted(call["users"] for call in server.calls_to("conversations.open")) == ["U1", "U2", "U3"]
+    assert sorted(call["user"] for call in server.calls_to("users.info")) == ["U1", "U2"]
+    assert directory.channels.hit_rate == 1.0
+
+
+def test_channel_for_falls_back_to_the_user_id():
+    """Test that an uncached user is messaged by user ID while their channel opens in the background."""
+    server = FakeSlackServer()
+    
+    async def lookups(directory):
+        first = directory.channel_for("U1")
+        await directory.drain()
+        return first, directory.channel_for("U1"), directory.channels.hit_rate
+    
+    assert asyncio.run(run_directory(server, lookups)) == ("U1", "DU1", 0.5)
+
+
+def test_failed_lookups_are_not_cached():
+    """Test that a DM channel that cannot be opened falls back to the user ID and is retried later."""
+    server = FakeSlackServer(inject_429_every=1)
+    
+    async def lookups(directory):
+        directory.delivery.max_retries = 0
+        channel = await directory.dm_channel("U1")
+        return channel, "U1" in directory.channels
+    
+    assert asyncio.run(run_directory(server, lookups)) == ("U1", False)
@@ -0,0 +1,217 @@
+import sqlite3
+import threading
+import time
+import pytest
+from app.services.expense_service import ExpenseService
+from app.storage.sqlite import SQLiteExpenseStore, WriteBatcher
+
+
+def create_lunch(service):
+    """Create an expense paid by two users and shared by three."""
+    return service.create_expense(
+        total_amount=90,
+        payers=[{"user_id": "USER1", "amount": 60}, {"user_id": "USER2", "amount": 30}],
+        attendees=["USER1", "USER2", "USER3"],
+        description="Lunch",
+        channel_id="C1",
+        created_by="USER1"
+    )
+
+
+def test_expenses_survive_a_restart(tmp_path):
+    """Test that expenses and paid debts are reloaded from the database."""
+    path = str(tmp_path / "splitbot.db")
+    service = ExpenseService(SQLiteExpenseStore(path))
+    paid = create_lunch(service)
+    pending = create_lunch(service)
+    for debt in paid.debts:
+        service.mark_debt_as_paid(paid.id, debt.debtor_id, debt.payer_id)
+    service.close()
+    
+    service = ExpenseService(SQLiteExpenseStore(path))
+    assert service.expenses == {}
+    
+    pending_ids = {entry["expense_id"] for entry in service.get_pending_debts()}
+    assert pending_ids == {pending.id}
+    
+    reloaded = service.get_expense(paid.id)
+    assert reloaded.description == "Lunch"
+    assert [payer.amount for payer in reloaded.payers] == [6000, 3000]
+    assert all(debt.is_paid and debt.paid_timestamp for debt in reloaded.debts)
+    assert len(service.get_all_expenses()) == 2
+    service.close()
+
+
+def test_writes_are_committed_in_batches(tmp_path):
+    """Test that queued writes only reach the database when the batch is flushed."""
+    store = SQLiteExpenseStore(str(tmp_path / "splitbot.db"), max_batch_size=1000, max_delay=60)
+    service = ExpenseService(store)
+    create_lunch(service)
+    
+    count = store.connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    assert count == 0
+    
+    store.flush()
+    count = store.connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    assert count == 1
+    store.close()
+
+
+def test_summary_ts_survives_a_restart(tmp_path):
+    """Test that the ts of an expense's summary message is persisted."""
+    path = str(tmp_path / "splitbot.db")
+    service = ExpenseService(SQLiteExpenseStore(path))
+    expense = create_lunch(service)
+    assert service.set_summary_ts(expense.id, "1700000000.000100")
+    service.close()
+    
+    service = ExpenseService(SQLiteExpenseStore(path))
+    assert service.get_expense(expense.id).summary_ts == "1700000000.000100"
+    service.close()
+
+
+def test_shared_services_see_each_others_writes(tmp_path):
+    """Test that two services in shared mode on one database stay in step."""
+    path = str(tmp_path / "splitbot.db")
+    first = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1), shared=True)
+    second = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1), shared=True)
+    assert second.count_pending_debts() == 0
+    
+    expense = create_lunch(first)
+    create_lunch(first)
+    assert second.count_pending_debts() == 2
+    
+    debt = expense.debts[0]
+    assert second.mark_debt_as_paid(expense.id, debt.debtor_id, debt.payer_id)
+    assert first.count_pending_debts() == 1
+    assert not first.mark_debt_as_paid(expense.id, debt.debtor_id, debt.payer_id)
+    
+    # A service's own writes do not drop its cache
+    assert not first.sync()
+    first.close()
+    second.close()
+
+
+def create_dinner(service):
+    """Create an expense paid by USER1 and shared by three, so two users owe USER1."""
+    return service.create_expense(
+        total_amount=90,
+        payers=[{"user_id": "USER1", "amount": 90}],
+        attendees=["USER1", "USER2", "USER3"],
+        description="Dinner",
+        channel_id="C1",
+        created_by="USER1"
+    )
+
+
+def test_shared_sync_reloads_only_the_changed_expenses(tmp_path):
+    """Test that another service's write reloads only the expense it changed."""
+    path = str(tmp_path / "splitbot.db")
+    first = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1), shared=True)
+    second = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1), shared=True)
+    expenses = [create_dinner(first) for _ in range(3)]
+    assert second.count_pending_debts() == 6
+    cached = dict(second.expenses)
+    
+    debt = expenses[0].debts[0]
+    first.mark_debt_as_paid(expenses[0].id, debt.debtor_id, debt.payer_id)
+    assert second.sync()
+    assert second.count_pending_debts() == 5
+    assert second.expenses[expenses[0].id] is not cached[expenses[0].id]
+    assert all(second.expenses[expense.id] is cached[expense.id] for expense in expenses[1:])
+    assert not second.get_pending_debt(expenses[0].id, debt.debtor_id, debt.payer_id)
+    first.close()
+    second.close()
+
+
+class RecordingListener:
+    """Listener recording the notifications it gets."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def on_debt_created(self, key, expense, debt):
+        self.calls.append(("created", key))
+    
+    def on_debt_paid(self, key):
+        self.calls.append(("paid", key))
+    
+    def on_store_changed(self):
+        self.calls.append(("store_changed",))
+
+
+def test_shared_sync_notifies_listeners_of_each_change(tmp_path):
+    """Test that listeners get per-debt deltas, and a full reset once the change log was pruned."""
+    path = str(tmp_path / "splitbot.db")
+    first = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1), shared=True)
+    second = ExpenseService(SQLiteExpenseStore(path, max_batch_size=1, change_log_size=3), shared=True)
+    listener = RecordingListener()
+    second.add_listener(listener)
+    second.count_pending_debts()
+    
+    expense = create_dinner(first)
+    debt = expense.debts[0]
+    first.mark_debt_as_paid(expense.id, debt.debtor_id, debt.payer_id)
+    second.sync()
+    other = expense.debts[1]
+    assert listener.calls == [("created", (expense.id, other.debtor_id, other.payer_id))]
+    
+    listener.calls.clear()
+    first.mark_debt_as_paid(expense.id, other.debtor_id, other.payer_id)
+    second.sync()
+    assert listener.calls == [("paid", (expense.id, other.debtor_id, other.payer_id))]
+    
+    listener.calls.clear()
+    for _ in range(4):
+        create_dinner(first)
+    assert second.sync()
+    assert listener.calls == [("store_changed",)]
+    assert second.count_pending_debts() == 8
+    first.close()
+    second.close()
+
+
+def locked_batcher(path, failures, max_delay=0.05):
+    """A batcher whose first failures commits fail as if another process held the lock."""
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    connection.execute("CREATE TABLE items (id INTEGER)")
+    attempts = []
+    
+    def before_commit(statements):
+        attempts.append(len(statements))
+        if len(attempts) <= failures:
+            raise sqlite3.OperationalError("database is locked")
+    
+    batcher = WriteBatcher(connection, threading.RLock(), max_batch_size=10, max_delay=max_delay,
+                           before_commit=before_commit)
+    return connection, batcher, attempts
+
+
+def test_failed_batch_stays_queued(tmp_path):
+    """Test that a batch whose commit fails is retried with the next one instead of dropped."""
+    connection, batcher, attempts = locked_batcher(str(tmp_path / "items.db"), failures=1)
+    batcher.submit("INSERT INTO items VALUES (?)", (1,))
+    
+    with pytest.raises(sqlite3.OperationalError):
+        batcher.flush()
+    assert batcher.error is not None
+    
+    batcher.submit("INSERT INTO items VALUES (?)", (2,))
+    assert attempts == [1, 2]
+    assert batcher.error is None
+    assert [row[0] for row in connection.execute("SELECT id FROM items ORDER BY id")] == [1, 2]
+
+
+def test_background_flush_failures_are_retried(tmp_path):
+    """Test that a batch failing in the timer thread is kept, reported and committed by a later attempt."""
+    connection, batcher, attempts = locked_batcher(str(tmp_path / "items.db"), failures=2, max_delay=0.01)
+    batcher.submit("INSERT INTO items VALUES (?)", (1,))
+    
+    deadline = time.monotonic() + 2
+    while len(attempts) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    
+    with batcher.lock:  # Wait for the last attempt to commit
+        assert attempts == [1, 1, 1]
+        assert batcher.error is None
+        assert connection.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1